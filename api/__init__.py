@@ -5,3 +5,4 @@ from .warehouse import router as warehouse_router
 from .users import router as users_router
 from .partners import router as partners_router
 from .frontend import router as frontend_router
+from .documents import router as documents_router
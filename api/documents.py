@@ -0,0 +1,89 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from auth import get_current_username
+from batch_print import iter_file
+from render_service import RenderQueueFull, render_service
+from prerender import prerenderer
+
+router = APIRouter()
+
+
+def _response(result):
+    if result["status"] != 200:
+        raise HTTPException(status_code=result["status"], detail=result["detail"])
+    if "path" not in result:
+        return Response(content=result["body"], media_type=result["media_type"], headers=result["headers"])
+    try:
+        f = open(result["path"], "rb")
+    except OSError:
+        # Evicted from the document cache between the render and this read
+        raise HTTPException(status_code=503, detail="Document is no longer cached", headers={"Retry-After": "1"})
+    if result.get("temporary"):
+        os.remove(result["path"])  # the open file stays readable until it is streamed
+    return StreamingResponse(iter_file(f), media_type=result["media_type"], headers=result["headers"])
+
+
+async def rendered(kind, *args):
+    """Response of a document built in the render pool; 503 with Retry-After when its queue is full."""
+    try:
+        result = await render_service.render(kind, *args)
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Render queue is full: {e}", headers={"Retry-After": "5"})
+    return _response(result)
+
+
+@router.post("/render/{kind}/{doc_id}", tags=["Documents"])
+async def render_document(
+    kind: str,
+    doc_id: int,
+    request: Request,
+    mode: str = Query("sync", pattern="^(sync|async)$"),
+    username: str = Depends(get_current_username),
+):
+    """Render a document in the worker pool: the PDF itself (sync) or a job to poll (async)."""
+    if kind not in render_service.documents:
+        raise HTTPException(status_code=404, detail=f"Unknown document kind '{kind}'")
+    if mode == "sync":
+        return await rendered(kind, doc_id)
+    try:
+        job_id = render_service.submit(kind, doc_id)
+    except RenderQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Render queue is full: {e}", headers={"Retry-After": "5"})
+    return JSONResponse(status_code=202, content={
+        "job_id": job_id,
+        "status_url": request.url_for("get_render_job", job_id=job_id).path,
+        "download_url": request.url_for("download_render_job", job_id=job_id).path,
+    })
+
+
+@router.get("/render/metrics", tags=["Documents"])
+def get_render_metrics(username: str = Depends(get_current_username)):
+    return dict(render_service.metrics(), prerender=prerenderer.metrics())
+
+
+@router.get("/render/jobs/{job_id}", tags=["Documents"])
+def get_render_job(job_id: str, username: str = Depends(get_current_username)):
+    job = render_service.job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    result = job["result"] or {}
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "doc_id": job["doc_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+        "error": result.get("detail"),
+    }
+
+
+@router.get("/render/jobs/{job_id}/download", tags=["Documents"])
+def download_render_job(job_id: str, username: str = Depends(get_current_username)):
+    job = render_service.job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Render job not found")
+    if job["result"] is None:
+        raise HTTPException(status_code=409, detail=f"Render job is {job['status']}")
+    return _response(job["result"])
@@ -2,9 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from database import get_conn
 from models import PartnerCreate
 from auth import get_current_username
+from listing import Listing, ListParams, list_response
 
 router = APIRouter()
 
+PARTNER_LISTING = Listing("partner")
+
 
 @router.post("/partners", tags=["Partner"])
 def create_partner(data: PartnerCreate):
@@ -22,13 +25,9 @@ def create_partner(data: PartnerCreate):
         return {"id": cur.lastrowid}
     
 @router.get("/partners", tags=["Partners"])
-def get_partners(vendor: int = None, username: str = Depends(get_current_username)):
-    with get_conn() as conn:
-        if vendor:
-            result = conn.execute("SELECT * FROM partner WHERE partner_type = 'vendor'")
-        else:
-            result = conn.execute("SELECT * FROM partner")
-        return [dict(row) for row in result]
+def get_partners(vendor: int = None, params: ListParams = Depends(), username: str = Depends(get_current_username)):
+    filters = [("partner.partner_type = 'vendor'", ())] if vendor else []
+    return list_response(PARTNER_LISTING, params, filters)
 
 @router.get("/partners/warehouse", tags=["Partners"])
 def get_warehouse_partner():
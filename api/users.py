@@ -1,19 +1,50 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from database import get_conn
-from models import LoginRequest
-from auth import create_access_token, get_current_username
-from passlib.context import CryptContext
+from models import LoginRequest, RefreshRequest
+from auth import create_access_token, get_current_user
 from datetime import timedelta
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 from auth import ACCESS_TOKEN_EXPIRE_MINUTES
+from passwords import LoginBusy, password_hasher
+from refresh_tokens import create_refresh_token, revoke_refresh_token, rotate_refresh_token
 
 
 router = APIRouter()
 
 
-@router.post("/users/", tags=["User"])
-def create_user(username: str, password: str, partner_id: int = None, company_id: int = None):
-    password_hash = pwd_context.hash(password)
+def _login_busy(e):
+    return HTTPException(status_code=503, detail=f"Too many logins, try again: {e}", headers={"Retry-After": "2"})
+
+
+def _issue_tokens(conn, user_id, username, refresh_token=None):
+    access_token = create_access_token(
+        data={"sub": username},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token or create_refresh_token(conn, user_id),
+    }
+
+
+def _find_user(username):
+    with get_conn() as conn:
+        return conn.execute("SELECT id, password_hash FROM user WHERE username = ?", (username,)).fetchone()
+
+
+def _finish_login(user_id, username, new_hash):
+    with get_conn() as conn:
+        if new_hash:
+            # Stored with another bcrypt cost: keep the hash made with the current one
+            conn.execute("UPDATE user SET password_hash = ? WHERE id = ?", (new_hash, user_id))
+        tokens = _issue_tokens(conn, user_id, username)
+        conn.commit()
+    return tokens
+
+
+def _create_user(username, password_hash, partner_id, company_id):
     with get_conn() as conn:
         # Check if username already exists
         existing = conn.execute("SELECT id FROM user WHERE username = ?", (username,)).fetchone()
@@ -24,26 +55,53 @@ def create_user(username: str, password: str, partner_id: int = None, company_id
             (username, password_hash, partner_id, company_id)
         )
         conn.commit()
+
+
+@router.post("/users/", tags=["User"])
+async def create_user(username: str, password: str, partner_id: int = None, company_id: int = None):
+    try:
+        password_hash = await password_hasher.hash(password)
+    except LoginBusy as e:
+        raise _login_busy(e)
+    await asyncio.to_thread(_create_user, username, password_hash, partner_id, company_id)
     return {"message": "User created"}
 
 @router.post("/login", tags=["User"])
-def login(data: LoginRequest):
-    username = data.username
-    password = data.password
+async def login(data: LoginRequest):
+    """Check the password in the hashing pool and return an access and a refresh token."""
+    user = await asyncio.to_thread(_find_user, data.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    try:
+        valid, new_hash = await password_hasher.verify(data.password, user["password_hash"])
+    except LoginBusy as e:
+        raise _login_busy(e)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    return await asyncio.to_thread(_finish_login, user["id"], data.username, new_hash)
+
+@router.post("/token/refresh", tags=["User"])
+def refresh_access_token(data: RefreshRequest):
+    """A new access token (and rotated refresh token) without checking the password again."""
     with get_conn() as conn:
-        user = conn.execute(
-            "SELECT * FROM user WHERE username = ?", (username,)
-        ).fetchone()
-        if not user or not pwd_context.verify(password, user["password_hash"]):
-            raise HTTPException(status_code=401, detail="Incorrect username or password")
-    access_token = create_access_token(
-        data={"sub": username},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+        rotated = rotate_refresh_token(conn, data.refresh_token)
+        if not rotated:
+            conn.commit()  # keep a reuse-triggered revocation
+            raise HTTPException(status_code=401, detail="Invalid refresh token")
+        user, refresh_token = rotated
+        tokens = _issue_tokens(conn, user["user_id"], user["username"], refresh_token)
+        conn.commit()
+    return tokens
 
 @router.post("/logout", tags=["User"])
-def logout(username: str = Depends(get_current_username)):
+def logout(data: RefreshRequest = None, user: dict = Depends(get_current_user)):
+    if data:
+        with get_conn() as conn:
+            revoke_refresh_token(conn, data.refresh_token, user["id"])
+            conn.commit()
     # Instruct client to clear credentials (stateless)
-    return {"message": f"Bye {username}! Please clear your credentials in your browser or client."}
+    return {"message": f"Bye {user['username']}! Please clear your credentials in your browser or client."}
 
+@router.get("/users/me", tags=["User"])
+def read_current_user(user: dict = Depends(get_current_user)):
+    return user
@@ -1,26 +1,41 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Response, Query, Body
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Response, Query, Body, Request
 from database import get_conn
 from models import (
     TransferOrderCreate, TransferOrderLineIn,
-    ActionEnum, OperationTypeEnum, StockAdjustmentIn, ManufacturingOrderCreate, LotCreate, CompanyCreate, BookingRequest, ServiceBookingCreate, SubscriptionCreate
+    ActionEnum, OperationTypeEnum, StockAdjustmentIn, ManufacturingOrderCreate, LotCreate, LotGenealogyLink, CompanyCreate, BookingRequest, ServiceBookingCreate, SubscriptionCreate,
+    UnitConversionIn
 )
 from datetime import datetime, timedelta
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import requests
-from auth import get_current_username
-from typing import List
+from auth import get_current_user, get_current_username
+from typing import List, Optional
 import uuid
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from io import BytesIO
-from PIL import Image as PILImage
-from utils import add_page_number_and_qr
+import json
+import sqlite3
+from file_store import (
+    CHUNK_SIZE as FILE_CHUNK_SIZE, LABEL_FETCH_TIMEOUT, attachment_store, content_headers, label_store, serve_file,
+)
+from inventory import apply_stock_adjustments
+from replenishment import plan_replenishment
+from cache import VersionedCache, catalog_version, make_etag, etag_matches
+from pricing import load_price_matrix
+from listing import Listing, ListParams, list_response
+from item_search import search_items
+from reference_data import get_reference_data
+from catalog_io import ENTITIES as CATALOG_ENTITIES, export_rows, import_rows, read_rows
+from units import LINE_MODELS, UnitConversionError, convert_quantities, get_conversion_matrix, line_quantities, stock_quantities
 from run import base_url 
+from .documents import rendered
 
 router = APIRouter()
 
+MOVE_LISTING = Listing("move")
+MOVE_LINE_LISTING = Listing("move_line")
+PICKING_LISTING = Listing("picking", descending=True, columns=["id", "status", "type", "origin", "source_id", "target_id"])
+DEBUG_LOG_LISTING = Listing("debug_log", order_by=("created_at", "id"), descending=True)
+STOCK_ADJUSTMENT_LISTING = Listing("stock_adjustment", order_by=("created_at", "id"), descending=True)
+
 # --- PICKING LIST ENDPOINT ---
 
 @router.post("/move-lines/{move_line_id}/done", tags=["Warehouse"])
@@ -107,6 +122,36 @@ def add_stock_adjustment(
     return {"message": "Stock adjusted"}
 
 
+@router.post("/stock-adjustments/batch", tags=["Warehouse"])
+def add_stock_adjustments_batch(
+    adjustments: List[StockAdjustmentIn],
+    username: str = Depends(get_current_username)
+):
+    if not adjustments:
+        raise HTTPException(status_code=400, detail="No stock adjustments given")
+    with get_conn() as conn:
+        summary = apply_stock_adjustments(conn, [a.dict() for a in adjustments], username=username)
+        conn.commit()
+    return {"message": "Stock adjusted", **summary}
+
+
+# --- REPLENISHMENT ---
+
+@router.get("/replenishment/plan", tags=["Warehouse"])
+def get_replenishment_plan(username: str = Depends(get_current_username)):
+    """Dry run: shortfalls per (item, zone) grouped per source zone and vendor, with compute time."""
+    with get_conn() as conn:
+        return plan_replenishment(conn, dry_run=True)
+
+
+@router.post("/replenishment/run", tags=["Warehouse"])
+def run_replenishment(username: str = Depends(get_current_username)):
+    with get_conn() as conn:
+        plan = plan_replenishment(conn, dry_run=False)
+        conn.commit()
+    return plan
+
+
 @router.get("/stock/{item_id}", tags=["Warehouse"])
 def get_stock_by_item(item_id: int):  # username: str = Depends(get_current_username) # used during quotation and shipping cost calculation.
     with get_conn() as conn:
@@ -195,6 +240,67 @@ def create_lot(data: LotCreate):
         conn.commit()
         return {"id": cur.lastrowid}
 
+
+LOT_TRACE_QUERY = """
+    SELECT
+        l.id,
+        l.item_id,
+        i.sku,
+        l.lot_number,
+        l.origin_model,
+        l.origin_id,
+        l.quality_control_status,
+        c.depth,
+        IFNULL((SELECT SUM(s.quantity) FROM stock s WHERE s.lot_id = l.id), 0) AS on_hand_quantity
+    FROM lot_closure c
+    JOIN lot l ON l.id = c.{other}_lot_id
+    JOIN item i ON i.id = l.item_id
+    WHERE c.{side}_lot_id = ?
+    ORDER BY c.depth, l.id
+"""
+
+
+def _trace_lot(lot_id: int, side: str, other: str):
+    with get_conn() as conn:
+        if not conn.execute("SELECT 1 FROM lot WHERE id = ?", (lot_id,)).fetchone():
+            raise HTTPException(status_code=404, detail="Lot not found")
+        result = conn.execute(LOT_TRACE_QUERY.format(side=side, other=other), (lot_id,)).fetchall()
+        return [dict(row) for row in result]
+
+
+@router.get("/lots/{lot_id}/trace-forward", tags=["Warehouse"])
+def trace_lot_forward(lot_id: int, username: str = Depends(get_current_username)):
+    """All lots made from this lot (recall scope), nearest first."""
+    return _trace_lot(lot_id, side="ancestor", other="descendant")
+
+
+@router.get("/lots/{lot_id}/trace-back", tags=["Warehouse"])
+def trace_lot_back(lot_id: int, username: str = Depends(get_current_username)):
+    """All lots this lot was made from, nearest first."""
+    return _trace_lot(lot_id, side="descendant", other="ancestor")
+
+
+@router.post("/lots/genealogy", tags=["Warehouse"])
+def link_lots(data: LotGenealogyLink, username: str = Depends(get_current_username)):
+    """Record a parent -> child lot link not captured by the MO/return/unbuild triggers (e.g. vendor lots on receipt)."""
+    if data.parent_lot_id == data.child_lot_id:
+        raise HTTPException(status_code=400, detail="A lot cannot be its own parent")
+    with get_conn() as conn:
+        if conn.execute(
+            "SELECT 1 FROM lot_closure WHERE ancestor_lot_id = ? AND descendant_lot_id = ?",
+            (data.child_lot_id, data.parent_lot_id)
+        ).fetchone():
+            raise HTTPException(status_code=400, detail="Link would create a genealogy cycle")
+        try:
+            conn.execute("""
+                INSERT OR IGNORE INTO lot_genealogy (parent_lot_id, child_lot_id, event_model, event_id, quantity)
+                VALUES (?, ?, ?, ?, ?)
+            """, (data.parent_lot_id, data.child_lot_id, data.event_model, data.event_id, data.quantity))
+        except sqlite3.IntegrityError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        conn.commit()
+    return {"message": "Lots linked"}
+
 # --- LOCATION ZONES ---
 @router.get("/location-zones", tags=["Warehouse"])
 def get_location_zones(username: str = Depends(get_current_username)):
@@ -231,10 +337,8 @@ def get_moves_for_origin(origin_model: str, origin_id: int, username: str = Depe
 # --- DEBUG / MONITORING ENDPOINTS ---
 
 @router.get("/debug-log", tags=["Dashboard"])
-def get_debug_log(username: str = Depends(get_current_username)):
-    with get_conn() as conn:
-        result = conn.execute("SELECT * FROM debug_log ORDER BY created_at DESC")
-        return [dict(row) for row in result]
+def get_debug_log(params: ListParams = Depends(), username: str = Depends(get_current_username)):
+    return list_response(DEBUG_LOG_LISTING, params)
 
 
 @router.get("/interventions", tags=["Dashboard"])
@@ -245,29 +349,17 @@ def get_recent_interventions(username: str = Depends(get_current_username)):
 
 
 @router.get("/stock-adjustments", tags=["Dashboard"])
-def get_all_stock_adjustments(username: str = Depends(get_current_username)):
-    with get_conn() as conn:
-        result = conn.execute("SELECT * FROM stock_adjustment ORDER BY created_at DESC")
-        return [dict(row) for row in result]
+def get_all_stock_adjustments(params: ListParams = Depends(), username: str = Depends(get_current_username)):
+    return list_response(STOCK_ADJUSTMENT_LISTING, params)
     
 
 @router.get("/moves", tags=["Debug"])
-def get_all_moves(username: str = Depends(get_current_username)):
-    with get_conn() as conn:
-        result = conn.execute("""
-            SELECT *
-            FROM move
-            ORDER BY id
-        """)
-        return [dict(row) for row in result]
+def get_all_moves(params: ListParams = Depends(), username: str = Depends(get_current_username)):
+    return list_response(MOVE_LISTING, params)
     
 @router.get("/pickings", tags=["Warehouse"])
-def get_pickings(username: str = Depends(get_current_username)):
-    with get_conn() as conn:
-        result = conn.execute("""
-            SELECT id, status, type, origin, source_id, target_id FROM picking ORDER BY id DESC
-        """).fetchall()
-        return [dict(row) for row in result]
+def get_pickings(params: ListParams = Depends(), username: str = Depends(get_current_username)):
+    return list_response(PICKING_LISTING, params)
     
 @router.get("/pickings/{picking_id}/move-lines", tags=["Warehouse"])
 def get_move_lines_by_picking(picking_id: int, username: str = Depends(get_current_username)):
@@ -281,6 +373,16 @@ def get_move_lines_by_picking(picking_id: int, username: str = Depends(get_curre
         """, (picking_id,))
         return [dict(row) for row in result]
     
+@router.get("/pickings/print", tags=["Documents"])
+async def print_picking_wave(picking_ids: List[int] = Query(...), username: str = Depends(get_current_username)):
+    """Picking lists of a wave as one streamed PDF, each picking on its own pages."""
+    return await rendered("picking_wave", picking_ids)
+
+@router.get("/pickings/{picking_id}/print", tags=["Documents"])
+async def print_picking(picking_id: int, username: str = Depends(get_current_username)):
+    """One picking list, usually already pre-rendered into the document cache."""
+    return await rendered("picking_list", picking_id)
+    
 @router.get("/locations/empty", tags=["Warehouse"])
 def get_empty_locations(username: str = Depends(get_current_username)):
     with get_conn() as conn:
@@ -320,14 +422,8 @@ def create_rule(
     return {"message": "Rule created"}
 
 @router.get("/move-lines", tags=["Debug"])
-def get_all_move_lines(username: str = Depends(get_current_username)):
-    with get_conn() as conn:
-        result = conn.execute("""
-            SELECT *
-            FROM move_line
-            ORDER BY id
-        """)
-        return [dict(row) for row in result]
+def get_all_move_lines(params: ListParams = Depends(), username: str = Depends(get_current_username)):
+    return list_response(MOVE_LINE_LISTING, params)
     
 @router.get("/locations", tags=["Debug"])
 def get_locations(username: str = Depends(get_current_username)):
@@ -353,115 +449,116 @@ def get_item_vendor(item_id: int):
             raise HTTPException(status_code=404, detail="Vendor not found for this item")
         return {"vendor_id": row["vendor_id"]}
     
+items_cache = VersionedCache(maxsize=64)
+
+
 @router.get("/items", tags=["Catalog"])
-def get_items(country_code: str = None, currency_code: str = None):
+def get_items(request: Request, country_code: str = None, currency_code: str = None):
+    """Sellable catalog, cached per (country, currency) until the catalog version changes."""
     with get_conn() as conn:
-        # Get all sellable items
-        items = conn.execute("""
-            SELECT 
-                i.id, i.name, i.sku, i.vendor_id, i.cost, i.is_sellable, i.is_digital,
-                i.is_assemblable, i.is_disassemblable, i.description, i.image_url,
-                i.service_window_id, sw.timedelta AS window_period, sw.unit_time AS window_unit
-            FROM item i
-            LEFT JOIN service_window sw ON i.service_window_id = sw.id
-            WHERE i.is_sellable = 1
-            ORDER BY i.id
-        """).fetchall()
+        version = catalog_version(conn)
+        # Price list validity depends on the date, so it is part of the key
+        key = (country_code, currency_code, datetime.utcnow().date().isoformat())
+        cached = items_cache.get(key, version)
+        if cached is None:
+            body = json.dumps(_load_items(conn, country_code, currency_code), separators=(",", ":")).encode("utf-8")
+            cached = (body, make_etag(body))
+            items_cache.set(key, version, cached)
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _load_items(conn, country_code, currency_code):
+    # Get all sellable items
+    items = conn.execute("""
+        SELECT 
+            i.id, i.name, i.sku, i.vendor_id, i.cost, i.is_sellable, i.is_digital,
+            i.is_assemblable, i.is_disassemblable, i.description, i.image_url,
+            i.service_window_id, sw.timedelta AS window_period, sw.unit_time AS window_unit
+        FROM item i
+        LEFT JOIN service_window sw ON i.service_window_id = sw.id
+        WHERE i.is_sellable = 1
+        ORDER BY i.id
+    """).fetchall()
+
+    # Find the latest valid price list for the selected country
+    price_list_row = conn.execute("""
+        SELECT pl.id, pl.currency_id, c.code as price_list_currency_code, co.id as country_id, co.code as origin_country_code
+        FROM price_list pl
+        JOIN currency c ON pl.currency_id = c.id
+        JOIN country co ON pl.country_id = co.id
+        WHERE (? IS NULL OR co.code = ?)
+          AND (pl.valid_from IS NULL OR pl.valid_from <= DATE('now'))
+          AND (pl.valid_to IS NULL OR pl.valid_to >= DATE('now'))
+        ORDER BY pl.valid_from DESC
+        LIMIT 1
+    """, (country_code, country_code)).fetchone()
+    price_list_id = price_list_row["id"] if price_list_row else None
+    country_id = price_list_row["country_id"] if price_list_row else None
+    origin_country_code = price_list_row["origin_country_code"] if price_list_row else None
+    price_list_currency_code = price_list_row["price_list_currency_code"] if price_list_row else None
+
+    # Get conversion rates
+    selected_currency = conn.execute("SELECT id, code, symbol, rel_to_usd FROM currency WHERE code = ?", (currency_code,)).fetchone()
+    price_list_currency = conn.execute("SELECT id, code, symbol, rel_to_usd FROM currency WHERE code = ?", (price_list_currency_code,)).fetchone()
+    conversion_factor = 1.0
+    if selected_currency and price_list_currency and selected_currency["code"] != price_list_currency["code"]:
+        conversion_factor = (selected_currency["rel_to_usd"] or 1.0) / (price_list_currency["rel_to_usd"] or 1.0)
+
+    # Prices and taxes come precomputed from the price matrix
+    item_map = {row["id"]: dict(row) for row in items}
+    matrix = load_price_matrix(conn, price_list_id, country_id) if price_list_id else {}
+
+    for item_id, pm in matrix.items():
+        item = item_map.get(item_id)
+        if not item:
+            continue
+        price = pm["net_price"]
+        if conversion_factor != 1.0:
+            price = round(price * conversion_factor, 2)
+        taxes = pm["taxes"]
+        item["sales_price_incl_tax"] = price + price * pm["tax_percent"] / 100 + pm["tax_fixed_amount"]
+        item["unit_symbol"] = pm["unit_symbol"]
+        item["unit_name"] = pm["unit_name"]
+        item["sales_price"] = price
+        item["sales_currency_code"] = selected_currency["code"] if selected_currency else pm["currency_code"]
+        item["sales_currency_symbol"] = selected_currency["symbol"] if selected_currency else pm["currency_symbol"]
+        # Taxes
+        item["tax_percents"] = [t["percent"] for t in taxes]
+        item["tax_labels"] = [t["label"] for t in taxes if t["label"]]
+        item["tax_fixed_amounts"] = [t["fixed_amount"] for t in taxes if t["fixed_amount"] is not None]
+        item["tax_fixed_currencies"] = [t["fixed_currency_code"] for t in taxes if t["fixed_currency_code"]]
+        item["tax_fixed_units"] = [t["fixed_unit_symbol"] for t in taxes if t["fixed_unit_symbol"]]
+
+    # For items without price list item, set price/tax fields to None/empty
+    for item in item_map.values():
+        if "sales_price" not in item:
+            item["sales_price"] = None
+            item["sales_currency_code"] = None
+            item["sales_currency_symbol"] = None
+            item["tax_percents"] = []
+            item["tax_labels"] = []
+            item["tax_fixed_amounts"] = []
+            item["tax_fixed_currencies"] = []
+            item["tax_fixed_units"] = []
+
+    return list(item_map.values())
+
+
+@router.get("/items/search", tags=["Catalog"])
+def search_catalog_items(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    sellable_only: bool = False,
+):
+    """Prefix search over name, SKU, barcode and description; exact SKU/barcode hits come first."""
+    with get_conn() as conn:
+        return search_items(conn, q, limit, offset, sellable_only)
 
-        # Find the latest valid price list for the selected country
-        price_list_row = conn.execute("""
-            SELECT pl.id, pl.currency_id, c.code as price_list_currency_code, co.id as country_id, co.code as origin_country_code
-            FROM price_list pl
-            JOIN currency c ON pl.currency_id = c.id
-            JOIN country co ON pl.country_id = co.id
-            WHERE (? IS NULL OR co.code = ?)
-              AND (pl.valid_from IS NULL OR pl.valid_from <= DATE('now'))
-              AND (pl.valid_to IS NULL OR pl.valid_to >= DATE('now'))
-            ORDER BY pl.valid_from DESC
-            LIMIT 1
-        """, (country_code, country_code)).fetchone()
-        price_list_id = price_list_row["id"] if price_list_row else None
-        country_id = price_list_row["country_id"] if price_list_row else None
-        origin_country_code = price_list_row["origin_country_code"] if price_list_row else None
-        price_list_currency_code = price_list_row["price_list_currency_code"] if price_list_row else None
-
-        # Get conversion rates
-        selected_currency = conn.execute("SELECT id, code, symbol, rel_to_usd FROM currency WHERE code = ?", (currency_code,)).fetchone()
-        price_list_currency = conn.execute("SELECT id, code, symbol, rel_to_usd FROM currency WHERE code = ?", (price_list_currency_code,)).fetchone()
-        conversion_factor = 1.0
-        if selected_currency and price_list_currency and selected_currency["code"] != price_list_currency["code"]:
-            conversion_factor = (selected_currency["rel_to_usd"] or 1.0) / (price_list_currency["rel_to_usd"] or 1.0)
-
-        # Get price list items and taxes for each item
-        item_map = {row["id"]: dict(row) for row in items}
-        price_items = conn.execute("""
-            SELECT 
-                pli.item_id,
-                pli.price AS sales_price_raw,
-                sales_cur.code AS sales_currency_code,
-                sales_cur.symbol AS sales_currency_symbol,
-                pli.unit_id,
-                u.symbol AS unit_symbol,
-                u.name AS unit_name,
-                GROUP_CONCAT(t.percent) AS tax_percents,
-                GROUP_CONCAT(t.label) AS tax_labels,
-                GROUP_CONCAT(t.fixed_amount) AS tax_fixed_amounts,
-                GROUP_CONCAT(cur.code) AS tax_fixed_currencies,
-                GROUP_CONCAT(u2.symbol) AS tax_fixed_units
-            FROM price_list_item pli
-            JOIN price_list pl ON pli.price_list_id = pl.id
-            JOIN currency sales_cur ON pl.currency_id = sales_cur.id
-            LEFT JOIN unit u ON pli.unit_id = u.id
-            LEFT JOIN hs_country_tax hct ON hct.hs_code_id = (
-                SELECT hs_code_id FROM item_hs_country WHERE item_id = pli.item_id AND country_id = ?
-            ) AND hct.country_id = ?
-            LEFT JOIN tax t ON t.id = hct.tax_id
-            LEFT JOIN currency cur ON t.fixed_currency_id = cur.id
-            LEFT JOIN unit u2 ON t.fixed_unit_id = u2.id
-            WHERE pli.price_list_id = ?
-            GROUP BY pli.item_id
-        """, (country_id, country_id, price_list_id)).fetchall()
-
-        for pi in price_items:
-            item = item_map.get(pi["item_id"])
-            if item:
-                # Set price and currency
-                price = pi["sales_price_raw"]
-                if conversion_factor != 1.0 and price is not None:
-                    price = round(price * conversion_factor, 2)
-                # Calculate taxes
-                tax_percents = [float(x) for x in (pi["tax_percents"] or "").split(",") if x]
-                tax_fixeds = [float(x) for x in (pi["tax_fixed_amounts"] or "").split(",") if x]
-                tax_total = sum(price * (p / 100) for p in tax_percents) + sum(tax_fixeds)
-                price_incl_tax = price + tax_total if price is not None else None
-                item["sales_price_incl_tax"] = price_incl_tax
-                item["unit_symbol"] = pi["unit_symbol"]
-                item["unit_name"] = pi["unit_name"]
-                item["sales_price"] = price
-                item["sales_currency_code"] = selected_currency["code"] if selected_currency else pi["sales_currency_code"]
-                item["sales_currency_symbol"] = selected_currency["symbol"] if selected_currency else pi["sales_currency_symbol"]
-                # Taxes
-                item["tax_percents"] = [float(x) for x in (pi["tax_percents"] or "").split(",") if x]
-                item["tax_labels"] = [x for x in (pi["tax_labels"] or "").split(",") if x]
-                item["tax_fixed_amounts"] = [float(x) for x in (pi["tax_fixed_amounts"] or "").split(",") if x]
-                item["tax_fixed_currencies"] = [x for x in (pi["tax_fixed_currencies"] or "").split(",") if x]
-                item["tax_fixed_units"] = [x for x in (pi["tax_fixed_units"] or "").split(",") if x]
-            else:
-                continue
-
-        # For items without price list item, set price/tax fields to None/empty
-        for item in item_map.values():
-            if "sales_price" not in item:
-                item["sales_price"] = None
-                item["sales_currency_code"] = None
-                item["sales_currency_symbol"] = None
-                item["tax_percents"] = []
-                item["tax_labels"] = []
-                item["tax_fixed_amounts"] = []
-                item["tax_fixed_currencies"] = []
-                item["tax_fixed_units"] = []
-
-        return list(item_map.values())
 
 @router.get("/items/by-sku/{sku}", tags=["Catalog"])
 def get_item_by_sku(sku: str):
@@ -521,31 +618,52 @@ def get_item(item_id: int):
 @router.get("/units", tags=["Catalog"])
 def get_units():
     with get_conn() as conn:
-        rows = conn.execute("SELECT symbol, category FROM unit").fetchall()
-        return {row["symbol"]: row["category"] for row in rows}
-    
+        return dict(get_reference_data(conn).unit_categories)
+
+
+@router.get("/units/conversions", tags=["Catalog"])
+def get_unit_conversions():
+    """Every convertible unit pair, including reverse and transitive rates."""
+    with get_conn() as conn:
+        return get_conversion_matrix(conn).as_list()
+
+
+@router.post("/units/convert", tags=["Catalog"])
+def convert_units(rows: List[UnitConversionIn]):
+    with get_conn() as conn:
+        try:
+            quantities = convert_quantities(conn, [(row.quantity, row.from_unit_id, row.to_unit_id) for row in rows])
+        except UnitConversionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return [dict(row.dict(), converted_quantity=quantity) for row, quantity in zip(rows, quantities)]
+
+
+@router.get("/units/lines/{model}/{parent_id}", tags=["Catalog"])
+def get_line_quantities(model: str, parent_id: int, unit_id: Optional[int] = None):
+    """Quantities of a quotation, sale order, purchase order or BOM converted to ``unit_id``."""
+    if model not in LINE_MODELS:
+        raise HTTPException(status_code=400, detail=f"model must be one of {', '.join(LINE_MODELS)}")
+    with get_conn() as conn:
+        return line_quantities(conn, model, parent_id, unit_id)
+
+
+@router.get("/units/stock", tags=["Catalog"])
+def get_stock_quantities(item_ids: str = Query(..., description="Comma separated item ids"), unit_id: Optional[int] = None):
+    try:
+        ids = [int(part) for part in item_ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="item_ids must be comma separated integers")
+    with get_conn() as conn:
+        return stock_quantities(conn, ids, unit_id)
+
 
 @router.get("/country-info", response_class=JSONResponse)
 def get_country_info(country: str):
     with get_conn() as conn:
-        row = conn.execute("""
-            SELECT id, code, name, currency_id, language_id
-            FROM country
-            WHERE code = ?
-            LIMIT 1
-        """, (country,)).fetchone()
-        if not row:
-            return JSONResponse(status_code=404, content={"detail": "Country not found"})
-        currency = conn.execute("SELECT code, symbol FROM currency WHERE id = ?", (row["currency_id"],)).fetchone()
-        language = conn.execute("SELECT code FROM language WHERE id = ?", (row["language_id"],)).fetchone()
-        return {
-            "id": row["id"],  # <-- Add this line
-            "code": row["code"],
-            "name": row["name"],
-            "currency_code": currency["code"] if currency else "EUR",
-            "currency_symbol": currency["symbol"] if currency else "€",
-            "language": language["code"] if language else "en"
-        }
+        info = get_reference_data(conn).country_info(country)
+    if not info:
+        return JSONResponse(status_code=404, content={"detail": "Country not found"})
+    return info
 
 
 @router.get("/service-hours/{sku}", tags=["Service"])
@@ -616,11 +734,38 @@ def book_service_booking(booking_id: int, req: BookingRequest):
         return {"message": "Booking confirmed"}
 
 
+@router.post("/catalog/import/{entity}", tags=["Catalog"])
+def import_catalog(entity: str, file: UploadFile = File(...), format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"), username: str = Depends(get_current_username)):
+    """Upsert item, price_list_item, item_hs_country or bom_line rows from a CSV or JSONL upload."""
+    if entity not in CATALOG_ENTITIES:
+        raise HTTPException(status_code=400, detail=f"entity must be one of {', '.join(CATALOG_ENTITIES)}")
+    if format is None:
+        format = "jsonl" if (file.filename or "").lower().endswith((".jsonl", ".ndjson")) else "csv"
+    with get_conn() as conn:
+        return import_rows(conn, entity, read_rows(file.file, format))
+
+
+@router.get("/catalog/export/{entity}", tags=["Catalog"])
+def export_catalog(entity: str, format: str = Query("csv", pattern="^(csv|jsonl)$"), username: str = Depends(get_current_username)):
+    if entity not in CATALOG_ENTITIES:
+        raise HTTPException(status_code=400, detail=f"entity must be one of {', '.join(CATALOG_ENTITIES)}")
+    conn = get_conn()
+
+    def stream():
+        try:
+            yield from export_rows(conn, entity, format)
+        finally:
+            conn.close()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{entity}.{format}"'})
+
+
 @router.get("/currency-rates", tags=["Catalog"])
 def get_currency_rates():
     with get_conn() as conn:
-        rows = conn.execute("SELECT code, rel_to_usd FROM currency").fetchall()
-        return {row["code"]: row["rel_to_usd"] for row in rows}
+        return dict(get_reference_data(conn).currency_rates)
 
 # @router.post("/service-bookings", tags=["Service"])
 # def create_service_booking(data: ServiceBookingCreate):
@@ -689,6 +834,36 @@ def create_subscription(data: SubscriptionCreate):
             "end_date": end.date().isoformat()
         }
 
+@router.post("/subscriptions/{subscription_id}/terms", tags=["Service"])
+def upload_subscription_terms(
+    subscription_id: int,
+    file: UploadFile = File(...),
+    username: str = Depends(get_current_username)
+):
+    digest, size = attachment_store.put_file(file.file, FILE_CHUNK_SIZE)
+    with get_conn() as conn:
+        cur = conn.execute(
+            "UPDATE subscription SET terms_conditions = NULL, terms_name = ?, terms_type = ?, terms_sha256 = ?, terms_size = ? WHERE id = ?",
+            (file.filename, file.content_type, digest, size, subscription_id)
+        )
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Subscription not found")
+        conn.commit()
+    return {"message": "Terms uploaded", "sha256": digest, "size": size}
+
+@router.get("/subscriptions/{subscription_id}/terms", tags=["Service"])
+def download_subscription_terms(subscription_id: int, request: Request, username: str = Depends(get_current_username)):
+    with get_conn() as conn:
+        sub = conn.execute(
+            "SELECT terms_name, terms_type, terms_sha256, terms_size FROM subscription WHERE id = ?", (subscription_id,)
+        ).fetchone()
+    if not sub or not attachment_store.exists(sub["terms_sha256"]):
+        raise HTTPException(status_code=404, detail="Terms not found")
+    return stored_file_response(
+        attachment_store, sub["terms_sha256"], sub["terms_size"], request,
+        sub["terms_type"] or "application/pdf", sub["terms_name"] or f"terms_{subscription_id}.pdf",
+    )
+
 @router.post("/stock-adjustments/", tags=["Warehouse"])
 def add_stock_adjustment(data: StockAdjustmentIn, username: str = Depends(get_current_username)):
     with get_conn() as conn:
@@ -783,12 +958,16 @@ def set_manufacturing_order_done(mo_id: int, username: str = Depends(get_current
         except Exception as e:
             return {"message": f"MO done, but label generation failed: {e}"}
 
-        # 5. Store label URL and lot_id in DB
-        conn.execute(
+        # 5. Store label URL and lot_id in DB, then keep a local copy of the label
+        label_id = conn.execute(
             "INSERT INTO carrier_label (mo_id, lot_id, label_url, tracking_number) VALUES (?, ?, ?, ?)",
             (mo_id, lot_id, label_url, tracking_number)
-        )
+        ).lastrowid
         conn.commit()
+        try:
+            store_carrier_label(conn, label_id, label_url)
+        except requests.RequestException as e:
+            print("Carrier label not stored locally, fetched again on download:", e)
         return {
             "message": "Manufacturing order set to done, carrier label generated",
             "label_url": label_url,
@@ -802,25 +981,49 @@ def list_carrier_labels(username: str = Depends(get_current_username)):
         rows = conn.execute("SELECT * FROM carrier_label").fetchall()
         return [dict(row) for row in rows]
 
-# Endpoint to download or redirect to the label
+def store_carrier_label(conn, label_id, label_url):
+    """Download a label once into the label store and record it; returns (digest, size)."""
+    with requests.get(label_url, stream=True, timeout=LABEL_FETCH_TIMEOUT) as resp:
+        resp.raise_for_status()
+        digest, size = label_store.put_chunks(resp.iter_content(FILE_CHUNK_SIZE))
+    conn.execute("UPDATE carrier_label SET label_sha256 = ?, label_size = ? WHERE id = ?", (digest, size, label_id))
+    conn.commit()
+    return digest, size
+
+# Endpoint to download the label from the local label store
 @router.get("/manufacturing-orders/{mo_id}/carrier-label", tags=["Warehouse"])
-def download_carrier_label(mo_id: int, username: str = Depends(get_current_username)):
+def download_carrier_label(mo_id: int, request: Request, username: str = Depends(get_current_username)):
     with get_conn() as conn:
         row = conn.execute(
-            "SELECT label_url FROM carrier_label WHERE mo_id = ? ORDER BY id DESC LIMIT 1", (mo_id,)
+            "SELECT id, label_url, label_sha256, label_size FROM carrier_label WHERE mo_id = ? ORDER BY id DESC LIMIT 1", (mo_id,)
         ).fetchone()
-        if not row or not row["label_url"]:
+        if not row or not (row["label_url"] or row["label_sha256"]):
             raise HTTPException(status_code=404, detail="Carrier label not found")
-        # Fetch the PDF and return as attachment
-        resp = requests.get(row["label_url"])
-        if resp.ok:
-            return Response(
-                resp.content,
-                media_type="application/pdf",
-                headers={"Content-Disposition": f"inline; filename=carrier_label_MO_{mo_id}.pdf"}
-            )
-        else:
-            raise HTTPException(status_code=502, detail="Failed to fetch label from Shippo")
+        digest, size = row["label_sha256"], row["label_size"]
+        if not label_store.exists(digest):
+            # Purchased before the store existed, or the fetch at purchase failed
+            if not row["label_url"]:
+                raise HTTPException(status_code=404, detail="Carrier label file missing")
+            try:
+                digest, size = store_carrier_label(conn, row["id"], row["label_url"])
+            except requests.RequestException:
+                raise HTTPException(status_code=502, detail="Failed to fetch label from Shippo")
+    return stored_file_response(
+        label_store, digest, size, request, "application/pdf", f"carrier_label_MO_{mo_id}.pdf"
+    )
+
+
+def stored_file_response(store, digest, size, request, media_type, filename):
+    """Stream a stored file, honouring Range and If-None-Match."""
+    status, headers, body = serve_file(
+        store.path(digest), size, digest,
+        request.headers.get("range"), request.headers.get("if-none-match"), request.headers.get("if-range"),
+    )
+    media_type, headers["Content-Disposition"] = content_headers(media_type, filename)
+    headers["X-Content-Type-Options"] = "nosniff"
+    if body is None:
+        return Response(status_code=status, headers=headers)
+    return StreamingResponse(body, status_code=status, media_type=media_type, headers=headers)
 
     
 @router.post("/manufacturing-orders/{mo_id}/confirm", tags=["Warehouse"])
@@ -861,19 +1064,13 @@ def get_manufacturing_items(username: str = Depends(get_current_username)):
 @router.post("/manufacturing-orders/", tags=["Warehouse"])
 def create_manufacturing_order(
     data: ManufacturingOrderCreate,
-    username: str = Depends(get_current_username)
+    user: dict = Depends(get_current_user)
 ):
     code = f"MO-{uuid.uuid4().hex[:8].upper()}"
     planned_start = data.planned_start or datetime.now().isoformat()
     planned_end = data.planned_end or (datetime.now() + datetime.timedelta(days=1)).isoformat()
     with get_conn() as conn:
-        # Get partner_id for current user
-        partner_row = conn.execute(
-            "SELECT partner_id FROM user WHERE username = ?", (username,)
-        ).fetchone()
-        if not partner_row:
-            raise HTTPException(status_code=404, detail="User not found")
-        partner_id = partner_row["partner_id"]
+        partner_id = user["partner_id"]
         cur = conn.execute("""
             INSERT INTO manufacturing_order (code, partner_id, item_id, quantity, status, planned_start, planned_end, origin, manufacturing_location_id)
             VALUES (?, ?, ?, ?, 'draft', ?, ?, ?, (
@@ -912,21 +1109,14 @@ def confirm_unbuild_order_receipt(order_code: str):  # username: str = Depends(g
 @router.get("/company/name", response_class=JSONResponse)
 async def get_company_name():
     with get_conn() as conn:
-        row = conn.execute("SELECT name FROM company LIMIT 1").fetchone()
-        return {"name": row["name"] if row else "Shop"}
+        name = get_reference_data(conn).company_name
+    return {"name": name if name is not None else "Shop"}
 
 
 @router.get("/company/address", response_class=JSONResponse)
 async def get_company_address():
     with get_conn() as conn:
-        row = conn.execute("""
-            SELECT c.name AS company_name, c.logo_url, c.website,
-                p.street, p.zip, p.city, co.name AS country, p.phone, p.email
-            FROM company c
-            JOIN partner p ON c.partner_id = p.id
-            LEFT JOIN country co ON p.country_id = co.id
-            LIMIT 1
-        """).fetchone()
+        row = get_reference_data(conn).company_address
         return {
             "name": row["company_name"] if row else "",
             "logo_url": row["logo_url"] if row else "",
@@ -978,338 +1168,38 @@ def upload_bom_file(
     file: UploadFile = File(...),
     username: str = Depends(get_current_username)
 ):
-    content = file.file.read()
-    filename = file.filename
-    mimetype = file.content_type
+    # Streamed to the attachment store in chunks; the bom row keeps only the metadata
+    digest, size = attachment_store.put_file(file.file, FILE_CHUNK_SIZE)
     with get_conn() as conn:
-        conn.execute(
-            "UPDATE bom SET file = ?, file_name = ?, file_type = ? WHERE id = ?",
-            (content, filename, mimetype, bom_id)
+        cur = conn.execute(
+            "UPDATE bom SET file = NULL, file_name = ?, file_type = ?, file_sha256 = ?, file_size = ? WHERE id = ?",
+            (file.filename, file.content_type, digest, size, bom_id)
         )
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="BOM not found")
         conn.commit()
-    return {"message": "BOM file uploaded"}
+    return {"message": "BOM file uploaded", "sha256": digest, "size": size}
 
 
-@router.get("/manufacturing-orders/{mo_id}/download", tags=["Warehouse"])
-def download_manufacturing_order_pdf(mo_id: int, username: str = Depends(get_current_username)):
+@router.get("/bom/{bom_id}/file", tags=["Warehouse"])
+def download_bom_file(bom_id: int, request: Request, username: str = Depends(get_current_username)):
     with get_conn() as conn:
-        mo = conn.execute("""
-            SELECT mo.*, i.name AS item_name, i.sku, p.name AS partner_name, p.street, p.city, p.country, p.zip,
-                   c.name AS company_name, cp.street AS company_street, cp.city AS company_city, cp.country AS company_country, cp.zip AS company_zip
-            FROM manufacturing_order mo
-            JOIN item i ON mo.item_id = i.id
-            JOIN partner p ON mo.partner_id = p.id
-            JOIN company c ON c.id = 1
-            JOIN partner cp ON c.partner_id = cp.id
-            WHERE mo.id = ?
-        """, (mo_id,)).fetchone()
-        if not mo:
-            raise HTTPException(status_code=404, detail="Manufacturing order not found")
-        bom = conn.execute("SELECT * FROM bom WHERE id = (SELECT bom_id FROM item WHERE id = ?)", (mo["item_id"],)).fetchone()
-        bom_lines = conn.execute("""
-            SELECT bl.*, it.name AS component_name, it.sku AS component_sku, it.vendor_id, it.cost, cur.code AS cost_currency
-            FROM bom_line bl
-            JOIN item it ON bl.item_id = it.id
-            LEFT JOIN currency cur ON it.cost_currency_id = cur.id
-            WHERE bl.bom_id = ?
-        """, (bom["id"],)).fetchall()
-
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # Company info
-    company_lines = [
-        f"<b>{mo['company_name']}</b>",
-        f"{mo['company_street']}, {mo['company_zip']} {mo['company_city']}, {mo['company_country']}",
-    ]
-    elements.append(Paragraph("<br/>".join(filter(None, company_lines)), styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # Contractor info
-    contractor_lines = [
-        "<b>Contractor:</b>",
-        mo["partner_name"],
-        mo["street"],
-        f"{mo['zip']} {mo['city']}, {mo['country']}",
-    ]
-    elements.append(Paragraph("<br/>".join(filter(None, contractor_lines)), styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # MO Info
-    elements.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d')}", styles["Normal"]))
-    elements.append(Paragraph(f"<b>Manufacturing Order {mo['code']}</b>", styles["Title"]))
-    elements.append(Paragraph(f"Status: {mo['status']}", styles["Normal"]))
-    elements.append(Paragraph(f"Product: {mo['item_name']} (SKU: {mo['sku']})", styles["Normal"]))
-    elements.append(Paragraph(f"Quantity: {mo['quantity']}", styles["Normal"]))
-    elements.append(Paragraph(f"Planned Start: {mo['planned_start']}", styles["Normal"]))
-    elements.append(Paragraph(f"Planned End: {mo['planned_end']}", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # BOM Table with costs
-    elements.append(Paragraph("<b>Bill of Material (BOM)</b>", styles["Heading3"]))
-    bom_data = [["Component", "SKU", "Lot Number", "Vendor", "Per Product", "Total for MO", "Unit Cost", "Total Cost"]]
-    total_cost = 0.0
-    for bl in bom_lines:
-        vendor_name = ""
-        if bl["vendor_id"]:
-            vendor = conn.execute("SELECT name FROM partner WHERE id = ?", (bl["vendor_id"],)).fetchone()
-            vendor_name = vendor["name"] if vendor else ""
-        unit_cost = float(bl["cost"] or 0)
-        total_qty = float(bl["quantity"]) * float(mo["quantity"])
-        line_cost = unit_cost * total_qty
-        total_cost += line_cost
-        lot_number = "-"
-        if "lot_id" in bl.keys() and bl["lot_id"]:
-            lot_row = conn.execute("SELECT lot_number FROM lot WHERE id = ?", (bl["lot_id"],)).fetchone()
-            lot_number = lot_row["lot_number"] if lot_row and lot_row["lot_number"] else "-"
-        bom_data.append([
-            bl["component_name"],
-            bl["component_sku"],
-            lot_number,
-            vendor_name,
-            str(bl["quantity"]),
-            str(total_qty),
-            f"{unit_cost:.2f} {bl['cost_currency'] or ''}",
-            f"{line_cost:.2f} {bl['cost_currency'] or ''}"
-        ])
-    bom_table = Table(bom_data, colWidths=[90, 60, 110, 70, 50, 60, 50, 50])
-    bom_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.black),
-        ('ALIGN', (1,1), (-1,-1), 'CENTER'),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.black),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
-        ('FONTSIZE', (0,0), (-1,-1), 8),
-        ('BOTTOMPADDING', (0,0), (-1,0), 6),
-        ('TOPPADDING', (0,0), (-1,0), 6),
-    ]))
-    elements.append(bom_table)
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"<b>Total BOM Cost: {total_cost:.2f} EUR</b>", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # Instructions
-    elements.append(Paragraph("<b>Instructions:</b>", styles["Heading3"]))
-    elements.append(Paragraph(bom["instructions"], styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # Signatures header
-    elements.append(Paragraph("<b>Signatures</b>", styles["Heading3"]))
-    elements.append(Paragraph("Date and Place: ___________________________", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph("Manufacturer: ___________________________", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph("Contractor:   ___________________________", styles["Normal"]))
-    elements.append(Spacer(1, 24))
-
-    # BOM File (PDF or JPG) - always last
-    if bom["file"]:
-        file_type = bom["file_type"] if "file_type" in bom.keys() else ""
-        file_name = bom["file_name"] if "file_name" in bom.keys() else "attachment"
-        elements.append(Paragraph("<b>BOM Attachment</b>", styles["Heading3"]))
-        elements.append(Paragraph(f"File: {file_name}", styles["Normal"]))
-        elements.append(Paragraph(f"Type: {file_type}", styles["Normal"]))
-        elements.append(Spacer(1, 12))
-        if file_type == "application/pdf":
-            elements.append(Paragraph("See attached PDF for full instructions.", styles["Normal"]))
-            elements.append(Paragraph(f"Size: {len(bom['file'])} bytes", styles["Normal"]))
-        elif file_type == "image/jpeg":
-            try:
-                img = PILImage.open(BytesIO(bom["file"]))
-                img_width, img_height = img.size
-                aspect = img_height / img_width
-                display_width = 400
-                display_height = int(display_width * aspect)
-                img_buffer = BytesIO(bom["file"])
-                elements.append(Image(img_buffer, width=display_width, height=display_height))
-                elements.append(Spacer(1, 12))
-            except Exception:
-                elements.append(Paragraph("Error displaying image.", styles["Normal"]))
-        else:
-            elements.append(Paragraph("Unsupported file type.", styles["Normal"]))
-
-    # Build PDF with page numbers
-    doc.build(
-        elements,
-        onFirstPage=lambda c, d: add_page_number_and_qr(c, d, mo['code']),
-        onLaterPages=lambda c, d: add_page_number_and_qr(c, d, mo['code'])
-    )
-    buffer.seek(0)
-    return Response(
-        buffer.read(),
-        media_type="application/pdf",
-        headers = {"Content-Disposition": f"inline; filename=manufacturing_order_{mo['code']}.pdf"}
+        bom = conn.execute(
+            "SELECT file_name, file_type, file_sha256, file_size FROM bom WHERE id = ?", (bom_id,)
+        ).fetchone()
+    if not bom or not attachment_store.exists(bom["file_sha256"]):
+        raise HTTPException(status_code=404, detail="BOM file not found")
+    return stored_file_response(
+        attachment_store, bom["file_sha256"], bom["file_size"], request,
+        bom["file_type"], bom["file_name"] or f"bom_{bom_id}",
     )
 
 
+@router.get("/manufacturing-orders/{mo_id}/download", tags=["Warehouse"])
+async def download_manufacturing_order_pdf(mo_id: int, username: str = Depends(get_current_username)):
+    return await rendered("manufacturing_order", mo_id)
+
+
 @router.get("/manufacturing-orders/{mo_id}/receipt", tags=["Warehouse"])
-def download_manufacturing_receipt_pdf(mo_id: int, username: str = Depends(get_current_username)):
-    with get_conn() as conn:
-        mo = conn.execute("""
-            SELECT mo.*, i.name AS item_name, i.sku, p.name AS partner_name, p.street, p.city, p.country, p.zip,
-                   c.name AS company_name, cp.street AS company_street, cp.city AS company_city, cp.country AS company_country, cp.zip AS company_zip
-            FROM manufacturing_order mo
-            JOIN item i ON mo.item_id = i.id
-            JOIN partner p ON mo.partner_id = p.id
-            JOIN company c ON c.id = 1
-            JOIN partner cp ON c.partner_id = cp.id
-            WHERE mo.id = ?
-        """, (mo_id,)).fetchone()
-        if not mo:
-            raise HTTPException(status_code=404, detail="Manufacturing order not found")
-        bom = conn.execute("SELECT * FROM bom WHERE id = (SELECT bom_id FROM item WHERE id = ?)", (mo["item_id"],)).fetchone()
-        bom_lines = conn.execute("""
-            SELECT bl.*, it.name AS component_name, it.sku AS component_sku, it.vendor_id, it.cost, cur.code AS cost_currency,
-                   bl.lot_id
-            FROM bom_line bl
-            JOIN item it ON bl.item_id = it.id
-            LEFT JOIN currency cur ON it.cost_currency_id = cur.id
-            WHERE bl.bom_id = ?
-        """, (bom["id"],)).fetchall()
-        # Products created (lots)
-        lots = conn.execute("""
-            SELECT l.id, l.lot_number, l.created_at, l.quality_control_status
-            FROM lot l
-            WHERE l.origin_model = 'manufacturing_order' AND l.origin_id = ?
-            ORDER BY l.id
-        """, (mo_id,)).fetchall()
-
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # Header
-    elements.append(Paragraph(f"<b>Manufacturing Report</b>", styles["Title"]))
-    elements.append(Spacer(1, 12))
-
-    # Company info
-    company_lines = [
-        f"<b>{mo['company_name']}</b>",
-        f"{mo['company_street']}, {mo['company_zip']} {mo['company_city']}, {mo['company_country']}",
-    ]
-    elements.append(Paragraph("<br/>".join(filter(None, company_lines)), styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # Contractor info
-    contractor_lines = [
-        "<b>Contractor:</b>",
-        mo["partner_name"],
-        mo["street"],
-        f"{mo['zip']} {mo['city']}, {mo['country']}",
-    ]
-    elements.append(Paragraph("<br/>".join(filter(None, contractor_lines)), styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # MO Info
-    elements.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d')}", styles["Normal"]))
-    elements.append(Paragraph(f"<b>Manufacturing Order {mo['code']}</b>", styles["Heading2"]))
-    elements.append(Paragraph(f"Status: {mo['status']}", styles["Normal"]))
-    elements.append(Paragraph(f"Product: {mo['item_name']} (SKU: {mo['sku']})", styles["Normal"]))
-    elements.append(Paragraph(f"Quantity: {mo['quantity']}", styles["Normal"]))
-    elements.append(Paragraph(f"Planned Start: {mo['planned_start']}", styles["Normal"]))
-    elements.append(Paragraph(f"Planned End: {mo['planned_end']}", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-
-    # BOM Table with costs and lot number (lot number after SKU)
-    elements.append(Paragraph("<b>Bill of Material (BOM)</b>", styles["Heading3"]))
-    bom_data = [["Component", "SKU", "Lot Number", "Vendor", "Per Product", "Total for MO", "Unit Cost", "Total Cost"]]
-    total_cost = 0.0
-    for bl in bom_lines:
-        vendor_name = ""
-        if bl["vendor_id"]:
-            vendor = conn.execute("SELECT name FROM partner WHERE id = ?", (bl["vendor_id"],)).fetchone()
-            vendor_name = vendor["name"] if vendor else ""
-        unit_cost = float(bl["cost"] or 0)
-        total_qty = float(bl["quantity"]) * float(mo["quantity"])
-        line_cost = unit_cost * total_qty
-        total_cost += line_cost
-        # Get lot number if lot_id is present
-        lot_number = "-"
-        if "lot_id" in bl.keys() and bl["lot_id"]:
-            lot_row = conn.execute("SELECT lot_number FROM lot WHERE id = ?", (bl["lot_id"],)).fetchone()
-            lot_number = lot_row["lot_number"] if lot_row and lot_row["lot_number"] is not None else "-"
-        bom_data.append([
-            bl["component_name"],
-            bl["component_sku"],
-            lot_number,
-            vendor_name,
-            str(bl["quantity"]),
-            str(total_qty),
-            f"{unit_cost:.2f} {bl['cost_currency'] or ''}",
-            f"{line_cost:.2f} {bl['cost_currency'] or ''}"
-        ])
-    bom_table = Table(bom_data, colWidths=[90, 60, 110, 70, 50, 60, 50, 50])
-    bom_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.black),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.black),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
-        ('FONTSIZE', (0,0), (-1,-1), 8),  # smaller font
-        ('BOTTOMPADDING', (0,0), (-1,0), 4),
-        ('TOPPADDING', (0,0), (-1,0), 4),
-    ]))
-    elements.append(bom_table)
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"<b>Total BOM Cost: {total_cost:.2f} EUR</b>", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-
-    # Products created (lots) table: name, sku, lot number, batch size, created at, quality status
-    elements.append(Paragraph("<b>Products Created</b>", styles["Heading3"]))
-    lot_data = [["Name", "SKU", "Lot Number", "Batch Size", "Created At", "Quality Status"]]
-    for l in lots:
-        # Get item info for this lot
-        item = conn.execute("SELECT name, sku FROM item WHERE id = (SELECT item_id FROM lot WHERE id = ?)", (l["id"],)).fetchone()
-        # Get batch size (sum of stock for this lot)
-        batch_size_row = conn.execute("SELECT SUM(quantity) as batch_size FROM stock WHERE lot_id = ?", (l["id"],)).fetchone()
-        batch_size = batch_size_row["batch_size"] if batch_size_row and batch_size_row["batch_size"] is not None else "-"
-        lot_data.append([
-            item["name"] if item else "",
-            item["sku"] if item else "",
-            l["lot_number"],
-            str(batch_size),
-            l["created_at"],
-            l["quality_control_status"]
-        ])
-    lot_table = Table(lot_data, colWidths=[80, 60, 110, 50, 80, 70])
-    lot_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.black),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.black),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
-        ('FONTSIZE', (0,0), (-1,-1), 8),  # smaller font
-        ('BOTTOMPADDING', (0,0), (-1,0), 4),
-        ('TOPPADDING', (0,0), (-1,0), 4),
-    ]))
-    elements.append(lot_table)
-    elements.append(Spacer(1, 12))
-
-    # Signatures header
-    elements.append(Paragraph("<b>Signatures</b>", styles["Heading3"]))
-    elements.append(Paragraph("Date and Place: ___________________________", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph("Manufacturer: ___________________________", styles["Normal"]))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph("Contractor:   ___________________________", styles["Normal"]))
-    elements.append(Spacer(1, 24))
-
-    # Build PDF with page numbers
-    doc.build(
-        elements,
-        onFirstPage=lambda c, d: add_page_number_and_qr(c, d, mo['code']),
-        onLaterPages=lambda c, d: add_page_number_and_qr(c, d, mo['code'])
-    )
-    buffer.seek(0)
-    return Response(
-        buffer.read(),
-        media_type="application/pdf",
-        headers = {"Content-Disposition": f"inline; filename=manufacturing_receipt_{mo['code']}.pdf"}
-    )
\ No newline at end of file
+async def download_manufacturing_receipt_pdf(mo_id: int, username: str = Depends(get_current_username)):
+    return await rendered("manufacturing_receipt", mo_id)
\ No newline at end of file
@@ -1,10 +1,12 @@
 from fastapi.security import OAuth2PasswordBearer, HTTPBasic, APIKeyHeader
-from passlib.context import CryptContext
 from fastapi import HTTPException, Depends
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from dotenv import load_dotenv
 import os
+import time
+from cache import TTLCache
+from database import get_conn
 
 load_dotenv()
 
@@ -12,6 +14,14 @@ SECRET_KEY = os.environ.get("SECRET_ENCRYPTION_KEY")  # Use a strong random key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# Verified tokens -> user context. An entry lives until its token expires, but at
+# most TOKEN_CACHE_TTL_SECONDS, so changes to the user row are picked up.
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "4096"))
+TOKEN_CACHE_TTL_SECONDS = float(os.environ.get("TOKEN_CACHE_TTL_SECONDS", "300"))
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+
+USER_CONTEXT_QUERY = "SELECT id, username, partner_id, company_id, role FROM user WHERE username = ?"
+
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl="/login",
     description="JWT token authentication. Use /login to get a token."
@@ -19,7 +29,6 @@ oauth2_scheme = OAuth2PasswordBearer(
 security = HTTPBasic()
 
 api_key_scheme = APIKeyHeader(name="Authorization")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
@@ -31,22 +40,48 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_token(token: str):
+def decode_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return username
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
 
+def verify_token(token: str):
+    return decode_token(token)["sub"]
 
-def get_current_username(api_key: str = Depends(api_key_scheme)):
+
+def user_context(token: str):
+    """id, username, partner_id, company_id and role of the user behind a valid token."""
+    context = token_cache.get(token)
+    if context is None:
+        payload = decode_token(token)
+        with get_conn() as conn:
+            user = conn.execute(USER_CONTEXT_QUERY, (payload["sub"],)).fetchone()
+        if not user:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        context = dict(user)
+        expires_at = time.time() + TOKEN_CACHE_TTL_SECONDS
+        if payload.get("exp"):
+            expires_at = min(expires_at, payload["exp"])
+        token_cache.set(token, context, expires_at)
+    return dict(context)
+
+
+def _token(api_key: str):
     # Accept with or without "Bearer " prefix
     if api_key.startswith("Bearer "):
-        token = api_key.split(" ", 1)[1]
-    else:
-        token = api_key
-    return verify_token(token)
+        return api_key.split(" ", 1)[1]
+    return api_key
+
+
+def get_current_user(api_key: str = Depends(api_key_scheme)):
+    """The user context of the request, from the token cache on repeat requests."""
+    return user_context(_token(api_key))
+
+
+def get_current_username(api_key: str = Depends(api_key_scheme)):
+    return user_context(_token(api_key))["username"]
 
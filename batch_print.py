@@ -0,0 +1,101 @@
+"""Batch printing: many sale orders' labels or delivery notes as one merged PDF.
+
+Orders are given directly or through picking ids; a wave of pickings resolves
+to every sale order with a move in them. All data is loaded with one query per
+table for the whole batch, styles and the company block are built once, and
+the merged PDF is spooled to a temporary file and streamed back in chunks.
+Labels can also be printed as one ZPL stream for thermal printers.
+"""
+import tempfile
+
+from reportlab.lib.pagesizes import A4, A7
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Flowable, PageBreak, Paragraph, SimpleDocTemplate
+
+from document_data import load_orders, resolve_sale_order_ids
+from labels import zpl_label
+from documents import PAGE_MARGINS, STYLES, document_elements
+from utils import add_page_number_and_qr, draw_shipping_label
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+def order_code(order):
+    return order["code"] if order["code"] else f"SO-{order['id']}"
+
+
+def render_labels(out, batch):
+    """One A7 shipping label page per order."""
+    c = canvas.Canvas(out, pagesize=A7)
+    width, height = A7
+    for entry in batch:
+        code = order_code(entry["order"])
+        draw_shipping_label(c, width, height, code, entry["company"], entry["partner"])
+        c.showPage()
+    c.save()
+
+
+def render_zpl_labels(out, batch):
+    """One ZPL label per order, concatenated; no PDF or raster work at all."""
+    for entry in batch:
+        out.write(zpl_label("sale_order", order_code(entry["order"]), entry["company"], entry["partner"]).encode("utf-8"))
+
+
+class _DocumentCode(Flowable):
+    """Zero-size marker: pages started after it carry ``code`` in their QR."""
+
+    def __init__(self, state, code):
+        super().__init__()
+        self.state = state
+        self.code = code
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        self.state["code"] = self.code
+
+
+def render_delivery_notes(out, batch):
+    """All delivery notes in one document, each starting on a new page."""
+    doc = SimpleDocTemplate(out, pagesize=A4, **PAGE_MARGINS)
+    state = {"code": order_code(batch[0]["order"]) if batch else ""}
+    elements = []
+    for index, entry in enumerate(batch):
+        if index:
+            # Set before the break so the next page's header already shows this order
+            elements.append(_DocumentCode(state, order_code(entry["order"])))
+            elements.append(PageBreak())
+        elements += document_elements("sale_order_delivery", entry)
+    if not elements:
+        elements.append(Paragraph("No documents", STYLES["Normal"]))
+    on_page = lambda c, d: add_page_number_and_qr(c, d, state["code"])
+    doc.build(elements, onFirstPage=on_page, onLaterPages=on_page)
+
+
+def render_batch(conn, document, sale_order_ids=None, picking_ids=None, output="pdf", out=None):
+    """Render the merged PDF (or ZPL labels) into ``out`` or a spooled temp file; returns (file rewound, order count)."""
+    order_ids = resolve_sale_order_ids(conn, sale_order_ids, picking_ids)
+    batch = load_orders(conn, order_ids, with_lines=document == "shipment")
+    if out is None:
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    if document == "label" and output == "zpl":
+        render_zpl_labels(out, batch)
+    elif document == "label":
+        render_labels(out, batch)
+    else:
+        render_delivery_notes(out, batch)
+    out.seek(0)
+    return out, len(batch)
+
+
+def iter_file(f, chunk_size=CHUNK_SIZE):
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
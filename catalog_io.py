@@ -0,0 +1,432 @@
+"""Streaming catalog import and export (CSV or JSONL).
+
+Rows are read lazily from the upload, validated a chunk at a time (SKUs,
+codes and symbols are resolved with one query per chunk) and written with
+executemany, one transaction per chunk. When a chunk hits a constraint error
+it is rolled back and replayed row by row so every bad row is reported with
+its line number and the good rows are still written. Export streams from a
+cursor, so neither direction holds the whole catalog in memory.
+
+Rows refer to items by SKU, to currencies and countries by code and to units
+by symbol. Blank item fields keep the stored value on update.
+"""
+import csv
+import io
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(row, key, required=False):
+    value = row.get(key)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise RowError(f"{key} is required")
+        return None
+    return str(value).strip()
+
+
+def _number(row, key, required=False):
+    value = _text(row, key, required)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise RowError(f"{key} must be a number")
+
+
+def _flag(row, key):
+    value = _text(row, key)
+    if value is None:
+        return None
+    if value.lower() in ("1", "true", "yes"):
+        return 1
+    if value.lower() in ("0", "false", "no"):
+        return 0
+    raise RowError(f"{key} must be 0 or 1")
+
+
+def _lookup(mapping, row, key, default=None):
+    value = _text(row, key)
+    if value is None:
+        return default
+    if value not in mapping:
+        raise RowError(f"unknown {key} {value!r}")
+    return mapping[value]
+
+
+def _item_ids(conn, skus):
+    return {
+        row["sku"]: row["id"]
+        for row in conn.execute(
+            "SELECT id, sku FROM item WHERE sku IN (SELECT value FROM json_each(?))",
+            (json.dumps(sorted(set(skus))),)
+        )
+    }
+
+
+class CatalogEntity(ABC):
+    """One importable table: export columns, validation and the batched write."""
+
+    columns = ()
+    export_sql = ""
+
+    def __init__(self, conn):
+        self.currencies = {row["code"]: row["id"] for row in conn.execute("SELECT id, code FROM currency")}
+        self.countries = {row["code"]: row["id"] for row in conn.execute("SELECT id, code FROM country")}
+        self.units = {row["symbol"]: row["id"] for row in conn.execute("SELECT id, symbol FROM unit ORDER BY id DESC")}
+
+    def item_skus(self, row):
+        return [_text(row, "item_sku")]
+
+    @abstractmethod
+    def validate(self, row, item_ids):
+        """The write parameters of one row; raises RowError."""
+
+    @abstractmethod
+    def write(self, conn, params):
+        """Write a chunk of validated rows."""
+
+
+class ItemEntity(CatalogEntity):
+    columns = (
+        "sku", "barcode", "name", "type", "size", "description", "image_url",
+        "length", "width", "height", "weight", "volume",
+        "cost", "cost_currency_code", "purchase_price", "purchase_currency_code", "unit_symbol",
+        "is_sellable", "is_digital", "is_assemblable", "is_disassemblable",
+    )
+    export_sql = """
+        SELECT i.sku, i.barcode, i.name, i.type, i.size, i.description, i.image_url,
+               i.length, i.width, i.height, i.weight, i.volume,
+               i.cost, cc.code AS cost_currency_code, i.purchase_price, pc.code AS purchase_currency_code,
+               u.symbol AS unit_symbol,
+               i.is_sellable, i.is_digital, i.is_assemblable, i.is_disassemblable
+        FROM item i
+        LEFT JOIN currency cc ON cc.id = i.cost_currency_id
+        LEFT JOIN currency pc ON pc.id = i.purchase_currency_id
+        LEFT JOIN unit u ON u.id = i.unit_id
+        ORDER BY i.id
+    """
+    numbers = ("length", "width", "height", "weight", "volume", "cost", "purchase_price")
+    flags = ("is_sellable", "is_digital", "is_assemblable", "is_disassemblable")
+    texts = ("size", "description", "image_url")
+    upsert_sql = """
+        INSERT INTO item (
+            sku, barcode, name, type, size, description, image_url,
+            length, width, height, weight, volume,
+            cost, cost_currency_id, purchase_price, purchase_currency_id, unit_id,
+            is_sellable, is_digital, is_assemblable, is_disassemblable
+        ) VALUES (
+            :sku, :barcode, :name, IFNULL(:type, 'product'), :size, :description, :image_url,
+            :length, :width, :height, :weight, :volume,
+            :cost, :cost_currency_id, :purchase_price, :purchase_currency_id, :unit_id,
+            IFNULL(:is_sellable, 1), IFNULL(:is_digital, 0), IFNULL(:is_assemblable, 0), IFNULL(:is_disassemblable, 0)
+        )
+        ON CONFLICT(sku) DO UPDATE SET
+            barcode = excluded.barcode,
+            name = excluded.name,
+            type = IFNULL(:type, item.type),
+            size = IFNULL(:size, item.size),
+            description = IFNULL(:description, item.description),
+            image_url = IFNULL(:image_url, item.image_url),
+            length = IFNULL(:length, item.length),
+            width = IFNULL(:width, item.width),
+            height = IFNULL(:height, item.height),
+            weight = IFNULL(:weight, item.weight),
+            volume = IFNULL(:volume, item.volume),
+            cost = IFNULL(:cost, item.cost),
+            cost_currency_id = IFNULL(:cost_currency_id, item.cost_currency_id),
+            purchase_price = IFNULL(:purchase_price, item.purchase_price),
+            purchase_currency_id = IFNULL(:purchase_currency_id, item.purchase_currency_id),
+            unit_id = IFNULL(:unit_id, item.unit_id),
+            is_sellable = IFNULL(:is_sellable, item.is_sellable),
+            is_digital = IFNULL(:is_digital, item.is_digital),
+            is_assemblable = IFNULL(:is_assemblable, item.is_assemblable),
+            is_disassemblable = IFNULL(:is_disassemblable, item.is_disassemblable)
+    """
+
+    def item_skus(self, row):
+        return []
+
+    def validate(self, row, item_ids):
+        params = {
+            "sku": _text(row, "sku", required=True),
+            "barcode": _text(row, "barcode", required=True),
+            "name": _text(row, "name", required=True),
+            "type": _text(row, "type"),
+            "cost_currency_id": _lookup(self.currencies, row, "cost_currency_code"),
+            "purchase_currency_id": _lookup(self.currencies, row, "purchase_currency_code"),
+            "unit_id": _lookup(self.units, row, "unit_symbol"),
+        }
+        if params["type"] not in (None, "product", "digital", "service"):
+            raise RowError("type must be product, digital or service")
+        if _text(row, "size") not in (None, "small", "big"):
+            raise RowError("size must be small or big")
+        params.update({key: _text(row, key) for key in self.texts})
+        params.update({key: _number(row, key) for key in self.numbers})
+        params.update({key: _flag(row, key) for key in self.flags})
+        return params
+
+    def write(self, conn, params):
+        conn.executemany(self.upsert_sql, params)
+
+
+class PriceListItemEntity(CatalogEntity):
+    columns = ("price_list_id", "item_sku", "unit_symbol", "price")
+    export_sql = """
+        SELECT pli.price_list_id, i.sku AS item_sku, u.symbol AS unit_symbol, pli.price
+        FROM price_list_item pli
+        JOIN item i ON i.id = pli.item_id
+        JOIN unit u ON u.id = pli.unit_id
+        ORDER BY pli.price_list_id, pli.id
+    """
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.price_lists = {row[0] for row in conn.execute("SELECT id FROM price_list")}
+
+    def validate(self, row, item_ids):
+        price_list_id = _number(row, "price_list_id", required=True)
+        if price_list_id not in self.price_lists:
+            raise RowError(f"unknown price_list_id {row.get('price_list_id')!r}")
+        sku = _text(row, "item_sku", required=True)
+        if sku not in item_ids:
+            raise RowError(f"unknown item_sku {sku!r}")
+        return {
+            "price_list_id": int(price_list_id),
+            "item_id": item_ids[sku],
+            "unit_id": _lookup(self.units, row, "unit_symbol", default=self.units.get("pc.")),
+            "price": _number(row, "price", required=True),
+        }
+
+    def write(self, conn, params):
+        # price_list_item has no unique key: update existing prices, insert the rest.
+        # Within a chunk the last row for a key wins.
+        params = list({(p["price_list_id"], p["item_id"], p["unit_id"]): p for p in params}.values())
+        conn.executemany("""
+            UPDATE price_list_item SET price = :price
+            WHERE price_list_id = :price_list_id AND item_id = :item_id AND unit_id = :unit_id
+        """, params)
+        conn.executemany("""
+            INSERT INTO price_list_item (price_list_id, item_id, unit_id, price)
+            SELECT :price_list_id, :item_id, :unit_id, :price
+            WHERE NOT EXISTS (
+                SELECT 1 FROM price_list_item
+                WHERE price_list_id = :price_list_id AND item_id = :item_id AND unit_id = :unit_id
+            )
+        """, params)
+
+
+class ItemHsCountryEntity(CatalogEntity):
+    columns = ("item_sku", "country_code", "hs_code", "hs_description")
+    export_sql = """
+        SELECT i.sku AS item_sku, c.code AS country_code, h.code AS hs_code, h.description AS hs_description
+        FROM item_hs_country ihc
+        JOIN item i ON i.id = ihc.item_id
+        JOIN country c ON c.id = ihc.country_id
+        JOIN hs_code h ON h.id = ihc.hs_code_id
+        ORDER BY ihc.id
+    """
+
+    def validate(self, row, item_ids):
+        sku = _text(row, "item_sku", required=True)
+        if sku not in item_ids:
+            raise RowError(f"unknown item_sku {sku!r}")
+        country_id = _lookup(self.countries, row, "country_code")
+        if country_id is None:
+            raise RowError("country_code is required")
+        hs_code = _text(row, "hs_code", required=True)
+        return {
+            "item_id": item_ids[sku],
+            "country_id": country_id,
+            "hs_code": hs_code,
+            "hs_description": _text(row, "hs_description") or hs_code,
+        }
+
+    def write(self, conn, params):
+        conn.executemany("INSERT OR IGNORE INTO hs_code (code, description) VALUES (:hs_code, :hs_description)", params)
+        conn.executemany("""
+            INSERT INTO item_hs_country (item_id, hs_code_id, country_id)
+            VALUES (:item_id, (SELECT id FROM hs_code WHERE code = :hs_code), :country_id)
+            ON CONFLICT(item_id, country_id) DO UPDATE SET hs_code_id = excluded.hs_code_id
+        """, params)
+
+
+class BomLineEntity(CatalogEntity):
+    """BOM lines keyed by the assembled item; an import replaces the lines of every BOM it mentions."""
+
+    columns = ("item_sku", "component_sku", "quantity", "instructions")
+    export_sql = """
+        SELECT i.sku AS item_sku, ci.sku AS component_sku, bl.quantity, b.instructions
+        FROM item i
+        JOIN bom b ON b.id = i.bom_id
+        JOIN bom_line bl ON bl.bom_id = b.id
+        JOIN item ci ON ci.id = bl.item_id
+        ORDER BY i.id, bl.id
+    """
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.replaced = set()
+
+    def item_skus(self, row):
+        return [_text(row, "item_sku"), _text(row, "component_sku")]
+
+    def validate(self, row, item_ids):
+        sku = _text(row, "item_sku", required=True)
+        component = _text(row, "component_sku", required=True)
+        for value in (sku, component):
+            if value not in item_ids:
+                raise RowError(f"unknown item sku {value!r}")
+        if sku == component:
+            raise RowError("a BOM line cannot reference its own parent item")
+        quantity = _number(row, "quantity")
+        return {
+            "item_id": item_ids[sku],
+            "component_id": item_ids[component],
+            "quantity": 1 if quantity is None else quantity,
+            "instructions": _text(row, "instructions"),
+        }
+
+    def write(self, conn, params):
+        for item_id in dict.fromkeys(p["item_id"] for p in params):
+            if item_id in self.replaced:
+                continue
+            instructions = next((p["instructions"] for p in params if p["item_id"] == item_id and p["instructions"]), None)
+            bom_id = conn.execute("SELECT bom_id FROM item WHERE id = ?", (item_id,)).fetchone()[0]
+            if bom_id is None:
+                bom_id = conn.execute("INSERT INTO bom (instructions) VALUES (?)", (instructions or "",)).lastrowid
+                conn.execute("UPDATE item SET bom_id = ? WHERE id = ?", (bom_id, item_id))
+            else:
+                conn.execute("DELETE FROM bom_line WHERE bom_id = ?", (bom_id,))
+                if instructions:
+                    conn.execute("UPDATE bom SET instructions = ? WHERE id = ?", (instructions, bom_id))
+            self.replaced.add(item_id)
+        conn.executemany("""
+            INSERT INTO bom_line (bom_id, item_id, quantity)
+            VALUES ((SELECT bom_id FROM item WHERE id = :item_id), :component_id, :quantity)
+        """, params)
+
+
+ENTITIES = {
+    "item": ItemEntity,
+    "price_list_item": PriceListItemEntity,
+    "item_hs_country": ItemHsCountryEntity,
+    "bom_line": BomLineEntity,
+}
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row, error)`` from a binary CSV or JSONL stream."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "each line must be a JSON object"
+            continue
+        yield line_number, row, None
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_rows(conn, entity, rows, chunk_size=CHUNK_SIZE):
+    """Validate and write ``(line_number, row, error)`` tuples; returns the import report."""
+    handler = ENTITIES[entity](conn)
+    report = {"entity": entity, "rows": 0, "written": 0, "error_count": 0, "errors": []}
+
+    def fail(line_number, message):
+        report["error_count"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line_number, "error": message})
+
+    for chunk in _chunks(rows, chunk_size):
+        report["rows"] += len(chunk)
+        skus = [sku for _, row, _ in chunk if row for sku in handler.item_skus(row) if sku]
+        item_ids = _item_ids(conn, skus) if skus else {}
+        valid = []
+        for line_number, row, error in chunk:
+            if error:
+                fail(line_number, error)
+                continue
+            try:
+                valid.append((line_number, handler.validate(row, item_ids)))
+            except RowError as e:
+                fail(line_number, str(e))
+        if not valid:
+            continue
+
+        replaced = set(getattr(handler, "replaced", ()))
+        conn.execute("SAVEPOINT catalog_chunk")
+        try:
+            handler.write(conn, [params for _, params in valid])
+            report["written"] += len(valid)
+        except sqlite3.DatabaseError:
+            # Replay the chunk row by row to find the rows the database rejects
+            conn.execute("ROLLBACK TO catalog_chunk")
+            if hasattr(handler, "replaced"):
+                handler.replaced = replaced
+            for line_number, params in valid:
+                conn.execute("SAVEPOINT catalog_row")
+                try:
+                    handler.write(conn, [params])
+                    report["written"] += 1
+                except sqlite3.DatabaseError as e:
+                    conn.execute("ROLLBACK TO catalog_row")
+                    fail(line_number, str(e))
+                conn.execute("RELEASE catalog_row")
+        conn.execute("RELEASE catalog_chunk")
+        conn.commit()
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
+
+
+def export_rows(conn, entity, fmt, batch_size=500):
+    """Yield the encoded export of ``entity`` in batches read from one cursor."""
+    handler = ENTITIES[entity]
+    cursor = conn.execute(handler.export_sql)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(handler.columns)
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        if fmt == "csv":
+            writer.writerows(tuple(row) for row in batch)
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            chunk = "".join(json.dumps(dict(row), default=str) + "\n" for row in batch)
+        yield chunk.encode("utf-8")
+    if fmt == "csv" and buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
@@ -0,0 +1,288 @@
+"""Batched data loaders for the PDF documents.
+
+Each loader fetches everything one document needs in a fixed number of
+set-based queries (no per-line lookups) and returns a dict keyed the way the
+layouts in documents.py read it, or None when the document does not exist.
+The company block comes from the reference data snapshot.
+"""
+import json
+
+from reference_data import get_reference_data
+from totals import fresh_totals, overlay_totals
+
+PARTNER_QUERY = """
+    SELECT p.*, co.name AS country, co2.name AS billing_country
+    FROM partner p
+    LEFT JOIN country co ON p.country_id = co.id
+    LEFT JOIN country co2 ON p.billing_country_id = co2.id
+    WHERE p.id = ?
+"""
+
+
+def load_company(conn):
+    address = get_reference_data(conn).company_address
+    if not address:
+        return None
+    return dict(address, name=address["company_name"])
+
+
+def _partner(conn, partner_id):
+    return conn.execute(PARTNER_QUERY, (partner_id,)).fetchone()
+
+
+def _priced_document(conn, model, doc_table, line_table, fk, doc_id):
+    doc = conn.execute(f"""
+        SELECT d.*, c.symbol AS currency_symbol
+        FROM {doc_table} d
+        LEFT JOIN currency c ON c.id = d.totals_currency_id
+        WHERE d.id = ?
+    """, (doc_id,)).fetchone()
+    if not doc:
+        return None
+    lines = conn.execute(f"""
+        SELECT dl.id, dl.item_id, dl.quantity, dl.price, dl.amount_net, dl.amount_discount, dl.amount_tax,
+               i.name AS item_name, i.sku AS item_sku, l.lot_number AS lot_code
+        FROM {line_table} dl
+        JOIN item i ON dl.item_id = i.id
+        LEFT JOIN lot l ON dl.lot_id = l.id
+        WHERE dl.{fk} = ?
+        ORDER BY dl.id
+    """, (doc_id,)).fetchall()
+    totals = fresh_totals(conn, model, doc_id)
+    if totals:
+        doc, lines = dict(doc), [dict(line) for line in lines]
+        overlay_totals(doc, lines, totals)
+    return {"order": doc, "partner": _partner(conn, doc["partner_id"]), "lines": lines, "company": load_company(conn)}
+
+
+def load_sale_order(conn, order_id):
+    data = _priced_document(conn, "sale_order", "sale_order", "order_line", "order_id", order_id)
+    if data:
+        data["return_lines"] = conn.execute("""
+            SELECT ro.code as return_order_code, rl.item_id, rl.quantity, rl.refund_amount, i.name as item_name, i.sku as item_sku, l.lot_number as lot_code
+            FROM return_order ro
+            JOIN return_line rl ON rl.return_order_id = ro.id
+            JOIN item i ON rl.item_id = i.id
+            LEFT JOIN lot l ON rl.lot_id = l.id
+            WHERE ro.origin_model = 'sale_order' AND ro.origin_id = ? AND ro.status = 'done'
+            ORDER BY rl.id
+        """, (order_id,)).fetchall()
+    return data
+
+
+def load_quotation(conn, quotation_id):
+    return _priced_document(conn, "quotation", "quotation", "quotation_line", "quotation_id", quotation_id)
+
+
+def _lines_document(conn, doc_table, line_query, doc_id):
+    doc = conn.execute(f"SELECT * FROM {doc_table} WHERE id = ?", (doc_id,)).fetchone()
+    if not doc:
+        return None
+    return {
+        "order": doc,
+        "partner": _partner(conn, doc["partner_id"]),
+        "lines": conn.execute(line_query, (doc_id,)).fetchall(),
+        "company": load_company(conn),
+    }
+
+
+def load_sale_order_delivery(conn, order_id):
+    return _lines_document(conn, "sale_order", """
+        SELECT ol.quantity, i.name as item_name, i.sku as item_sku, l.lot_number as lot_code
+        FROM order_line ol
+        JOIN item i ON ol.item_id = i.id
+        LEFT JOIN lot l ON ol.lot_id = l.id
+        WHERE ol.order_id = ?
+        ORDER BY ol.id
+    """, order_id)
+
+
+def load_purchase_order(conn, order_id):
+    return _lines_document(conn, "purchase_order", """
+        SELECT pol.quantity, pol.price, pol.cost, i.name as item_name, i.sku as item_sku, l.lot_number as lot_code
+        FROM purchase_order_line pol
+        JOIN item i ON pol.item_id = i.id
+        LEFT JOIN lot l ON pol.lot_id = l.id
+        WHERE pol.purchase_order_id = ?
+        ORDER BY pol.id
+    """, order_id)
+
+
+def load_return_order(conn, return_order_id):
+    data = _lines_document(conn, "return_order", """
+        SELECT rl.quantity, rl.refund_amount, rl.reason, i.name as item_name, i.sku as item_sku, l.lot_number as lot_code
+        FROM return_line rl
+        JOIN item i ON rl.item_id = i.id
+        LEFT JOIN lot l ON rl.lot_id = l.id
+        WHERE rl.return_order_id = ?
+        ORDER BY rl.id
+    """, return_order_id)
+    if data:
+        order = data["order"]
+        origin_table = "sale_order" if order["origin_model"] == "sale_order" else "purchase_order"
+        origin = conn.execute(f"SELECT * FROM {origin_table} WHERE id = ?", (order["origin_id"],)).fetchone()
+        currency = None
+        if origin and origin["currency_id"]:
+            currency = get_reference_data(conn).currencies.get(origin["currency_id"])
+        data["origin"] = origin
+        data["currency_symbol"] = currency["symbol"] if currency else "€"
+    return data
+
+
+def load_manufacturing_order(conn, mo_id, with_lots=False):
+    mo = conn.execute("""
+        SELECT mo.*, i.name AS item_name, i.sku, i.bom_id
+        FROM manufacturing_order mo
+        JOIN item i ON mo.item_id = i.id
+        WHERE mo.id = ?
+    """, (mo_id,)).fetchone()
+    if not mo:
+        return None
+    data = {
+        "order": mo,
+        "partner": _partner(conn, mo["partner_id"]),
+        "company": load_company(conn),
+        # The attachment itself stays in the attachment store; only its metadata is loaded
+        "bom": conn.execute(
+            "SELECT id, instructions, file_name, file_type, file_sha256, file_size FROM bom WHERE id = ?",
+            (mo["bom_id"],),
+        ).fetchone(),
+        "bom_lines": conn.execute("""
+            SELECT bl.*, it.name AS component_name, it.sku AS component_sku, it.cost, cur.code AS cost_currency,
+                   v.name AS vendor_name, l.lot_number
+            FROM bom_line bl
+            JOIN item it ON bl.item_id = it.id
+            LEFT JOIN currency cur ON it.cost_currency_id = cur.id
+            LEFT JOIN partner v ON v.id = it.vendor_id
+            LEFT JOIN lot l ON l.id = bl.lot_id
+            WHERE bl.bom_id = ?
+            ORDER BY bl.id
+        """, (mo["bom_id"],)).fetchall(),
+    }
+    if with_lots:
+        data["lots"] = conn.execute("""
+            SELECT l.id, l.lot_number, l.created_at, l.quality_control_status,
+                   i.name AS item_name, i.sku AS item_sku, SUM(s.quantity) AS batch_size
+            FROM lot l
+            JOIN item i ON i.id = l.item_id
+            LEFT JOIN stock s ON s.lot_id = l.id
+            WHERE l.origin_model = 'manufacturing_order' AND l.origin_id = ?
+            GROUP BY l.id
+            ORDER BY l.id
+        """, (mo_id,)).fetchall()
+    return data
+
+
+def load_manufacturing_receipt(conn, mo_id):
+    return load_manufacturing_order(conn, mo_id, with_lots=True)
+
+
+def resolve_sale_order_ids(conn, sale_order_ids=None, picking_ids=None):
+    """Sale order ids in request order, followed by the orders behind ``picking_ids``."""
+    ids = list(dict.fromkeys(sale_order_ids or []))
+    if picking_ids:
+        rows = conn.execute("""
+            SELECT t.origin_id, MIN(m.id) AS first_move
+            FROM move m
+            JOIN trigger t ON t.id = m.trigger_id
+            WHERE m.picking_id IN (SELECT value FROM json_each(?))
+              AND t.origin_model = 'sale_order'
+            GROUP BY t.origin_id
+            ORDER BY first_move
+        """, (json.dumps(list(picking_ids)),)).fetchall()
+        seen = set(ids)
+        ids += [row["origin_id"] for row in rows if row["origin_id"] not in seen]
+    return ids
+
+
+def load_orders(conn, order_ids, with_lines=False):
+    """Loader dicts of the sale_order_delivery layout for a batch of orders, in ``order_ids`` order."""
+    params = (json.dumps(order_ids),)
+    company = load_company(conn)
+    orders = {
+        row["id"]: {"order": row, "partner": None, "lines": [], "company": company}
+        for row in conn.execute(
+            "SELECT * FROM sale_order WHERE id IN (SELECT value FROM json_each(?))", params
+        )
+    }
+    for row in conn.execute("""
+        SELECT so.id AS order_id, p.*, co.name AS country
+        FROM sale_order so
+        JOIN partner p ON p.id = so.partner_id
+        LEFT JOIN country co ON co.id = p.country_id
+        WHERE so.id IN (SELECT value FROM json_each(?))
+    """, params):
+        orders[row["order_id"]]["partner"] = row
+    if with_lines:
+        for row in conn.execute("""
+            SELECT ol.order_id, ol.quantity, i.name as item_name, i.sku as item_sku, l.lot_number as lot_code
+            FROM order_line ol
+            JOIN item i ON ol.item_id = i.id
+            LEFT JOIN lot l ON ol.lot_id = l.id
+            WHERE ol.order_id IN (SELECT value FROM json_each(?))
+            ORDER BY ol.order_id, ol.id
+        """, params):
+            orders[row["order_id"]]["lines"].append(row)
+    return [orders[order_id] for order_id in order_ids if order_id in orders]
+
+
+PICKING_LINES_QUERY = """
+    SELECT ml.id, ml.picking_id, ml.quantity, ml.done_quantity, ml.status,
+           i.name AS item_name, i.sku AS item_sku, l.lot_number AS lot_code,
+           src.code AS source_code, dst.code AS target_code
+    FROM move_lines_by_picking ml
+    JOIN item i ON i.id = ml.item_id
+    LEFT JOIN lot l ON l.id = ml.lot_id
+    LEFT JOIN location src ON src.id = ml.source_id
+    LEFT JOIN location dst ON dst.id = ml.target_id
+    WHERE ml.picking_id IN (SELECT value FROM json_each(?))
+      AND (ml.picking_id, ml.id) > (?, ?)
+    ORDER BY ml.picking_id, ml.id
+    LIMIT ?
+"""
+
+
+def load_pickings(conn, picking_ids):
+    """Header rows of the given pickings, in id order."""
+    return conn.execute("""
+        SELECT p.*, sz.code AS source_zone, tz.code AS target_zone, pa.name AS partner_name
+        FROM picking p
+        LEFT JOIN zone sz ON sz.id = p.source_id
+        LEFT JOIN zone tz ON tz.id = p.target_id
+        LEFT JOIN partner pa ON pa.id = p.partner_id
+        WHERE p.id IN (SELECT value FROM json_each(?))
+        ORDER BY p.id
+    """, (json.dumps(list(picking_ids)),)).fetchall()
+
+
+def iter_picking_lines(conn, picking_ids, batch_size=500):
+    """Move lines of the pickings ordered by (picking, line), read ``batch_size`` rows at a time.
+
+    Each batch continues after the last (picking_id, id) seen, so only one batch
+    is held in memory however many lines the wave has.
+    """
+    ids = json.dumps(list(picking_ids))
+    last = (0, 0)
+    while True:
+        rows = conn.execute(PICKING_LINES_QUERY, (ids, *last, batch_size)).fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        last = (rows[-1]["picking_id"], rows[-1]["id"])
+
+
+LOADERS = {
+    "sale_order": load_sale_order,
+    "sale_order_delivery": load_sale_order_delivery,
+    "quotation": load_quotation,
+    "purchase_order": load_purchase_order,
+    "purchase_order_delivery": load_purchase_order,
+    "return_order": load_return_order,
+    "return_bill": load_return_order,
+    "manufacturing_order": load_manufacturing_order,
+    "manufacturing_receipt": load_manufacturing_receipt,
+}
+
+
+def load_document(conn, kind, doc_id):
+    return LOADERS[kind](conn, doc_id)
@@ -0,0 +1,490 @@
+"""Shared templates for the A4 PDF documents.
+
+Styles and table styles are built once per process. A layout is a list of
+blocks; each block turns the dict of a loader in document_data.py into
+flowables. document_pdf renders a layout through the PDF cache.
+"""
+from datetime import datetime
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from file_store import attachment_store
+from pdf_cache import document_key, pdf_cache
+from utils import add_page_number_and_qr
+
+STYLES = getSampleStyleSheet()
+PAGE_MARGINS = {"rightMargin": 30, "leftMargin": 30, "topMargin": 30, "bottomMargin": 18}
+
+
+@lru_cache(maxsize=None)
+def table_style(font_size=10, grid=1, padding=8, right_from=None, center_all=False):
+    """Header-row table style; identical arguments share one TableStyle."""
+    commands = [
+        ('BACKGROUND', (0,0), (-1,0), colors.lightgrey),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.black),
+        ('ALIGN', (0,0) if center_all else (1,1), (-1,-1), 'CENTER'),
+        ('GRID', (0,0), (-1,-1), grid, colors.black),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
+        ('FONTSIZE', (0,0), (-1,-1), font_size),
+        ('BOTTOMPADDING', (0,0), (-1,0), padding),
+    ]
+    if right_from is not None:
+        commands.insert(3, ('ALIGN', (right_from,1), (-1,-1), 'RIGHT'))
+    if padding < 8:
+        commands.append(('TOPPADDING', (0,0), (-1,0), padding))
+    return TableStyle(commands)
+
+
+def format_quantity(qty):
+    qty = float(qty)
+    return str(int(qty)) if qty == int(qty) else f"{qty:.2f}"
+
+
+def extract_shipping_lot_code(lot_code):
+    if lot_code and lot_code.startswith("SHIP-"):
+        # Remove "SHIP-" prefix and split by "-"
+        parts = lot_code[5:].split("-")
+        # Remove the last two parts (date and random number)
+        if len(parts) > 2:
+            return "-".join(parts[:-2])
+        else:
+            return lot_code[5:]
+    return lot_code or ""
+
+
+def currency_symbol(data):
+    order = data["order"]
+    if data.get("currency_symbol"):
+        return data["currency_symbol"]
+    if "currency_symbol" in order.keys() and order["currency_symbol"]:
+        return order["currency_symbol"]
+    return "€"
+
+
+def _paragraph(lines, style="Normal"):
+    return [Paragraph("<br/>".join(filter(None, lines)), STYLES[style]), Spacer(1, 12)]
+
+
+# --- Blocks: each takes the loader dict and returns flowables ---
+
+def company_block(data):
+    company = data["company"]
+    return _paragraph([
+        f"<b>{company['name'] if company else 'Warehouse Company'}</b>",
+        f"{company['street']}, {company['zip']} {company['city']}, {company['country']}" if company else "",
+        f"Phone: {company['phone']}" if company and company['phone'] else "",
+        f"Email: {company['email']}" if company and company['email'] else "",
+    ])
+
+
+def company_address_block(data):
+    """The company as the receiving party (purchase documents)."""
+    company = data["company"]
+    return _paragraph([
+        f"<b>{company['name'] if company else 'Warehouse Company'}</b>",
+        company["street"] if company else "",
+        f"{company['zip']} {company['city']}, {company['country']}" if company else "",
+        f"Phone: {company['phone']}" if company and company['phone'] else "",
+        f"Email: {company['email']}" if company and company['email'] else "",
+    ])
+
+
+def partner_block(heading, billing=False):
+    def block(data):
+        partner = data["partner"]
+        if billing:
+            street = partner["billing_street"] if partner else ""
+            city = f"{partner['billing_zip']} {partner['billing_city']}, {partner['billing_country']}" if partner else ""
+        else:
+            street = partner["street"] if partner else ""
+            city = f"{partner['zip']} {partner['city']}, {partner['country']}" if partner else ""
+        return _paragraph([
+            f"<b>{heading}</b>",
+            partner["name"] if partner else "",
+            street,
+            city,
+            f"Phone: {partner['phone']}" if partner and partner["phone"] else "",
+            f"Email: {partner['email']}" if partner and partner["email"] else "",
+        ])
+    return block
+
+
+def header_block(title, *info, title_style="Title"):
+    """Date line, the title (formatted with the document row) and info lines."""
+    def block(data):
+        order = data["order"]
+        elements = [
+            Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d')}", STYLES["Normal"]),
+            Paragraph(f"<b>{title.format(**dict(order))}</b>", STYLES[title_style]),
+        ]
+        for line in info:
+            text = line(data) if callable(line) else line.format(**dict(order))
+            if text:
+                elements.append(Paragraph(text, STYLES["Normal"]))
+        elements.append(Spacer(1, 12))
+        return elements
+    return block
+
+
+def table_block(columns, row, source="lines", heading=None, style=None, after=18):
+    """Table of ``data[source]``: ``columns`` are (header, width), ``row(line, data)`` the cells.
+
+    Headers are formatted with ``currency`` (the document currency symbol).
+    """
+    def block(data):
+        currency = currency_symbol(data)
+        table_data = [[header.format(currency=currency) for header, _ in columns]]
+        table_data += [cells for cells in (row(line, data) for line in data[source]) if cells]
+        table = Table(table_data, colWidths=[width for _, width in columns])
+        table.setStyle(style or table_style())
+        elements = [Paragraph(f"<b>{heading}</b>", STYLES["Heading3"])] if heading else []
+        return elements + [table, Spacer(1, after)]
+    return block
+
+
+def text_block(*lines):
+    """Fixed lines: (text, style) pairs or Spacer heights."""
+    def block(data):
+        return [Spacer(1, line) if isinstance(line, int) else Paragraph(line[0], STYLES[line[1]]) for line in lines]
+    return block
+
+
+DELIVERY_NOTE_FOOTER = text_block(
+    ("<font size='9' color='gray'>This document is for delivery purposes only and contains no pricing information.</font>", "Normal"),
+    24,
+    ("Received by: ____________________________", "Normal"),
+)
+
+SIGNATURES = text_block(
+    ("<b>Signatures</b>", "Heading3"),
+    ("Date and Place: ___________________________", "Normal"),
+    12,
+    ("Manufacturer: ___________________________", "Normal"),
+    12,
+    ("Contractor:   ___________________________", "Normal"),
+    24,
+)
+
+NOT_BINDING = "<font size='8' color='gray'>Note: This document is not a valid bill, but a non-binding offer.</font>"
+
+PRICED_COLUMNS = [("Item", 120), ("SKU", 45), ("Lot", 120), ("Qty", 35), ("Unit {currency}", 45), ("Total {currency}", 55)]
+DELIVERY_COLUMNS = [("Item", 150), ("SKU", 60), ("Lot", 90), ("Quantity", 60)]
+BOM_COLUMNS = [("Component", 90), ("SKU", 60), ("Lot Number", 110), ("Vendor", 70), ("Per Product", 50),
+               ("Total for MO", 60), ("Unit Cost", 50), ("Total Cost", 50)]
+
+
+def priced_row(line, data):
+    qty = float(line["quantity"])
+    amount = line["amount_net"] or 0.0
+    if "return_lines" in data and qty <= 0:
+        return None  # sale orders skip empty lines
+    return [
+        line["item_name"],
+        line["item_sku"],
+        extract_shipping_lot_code(line["lot_code"]),
+        format_quantity(qty),
+        f"{amount / qty:.2f}" if qty else "0.00",
+        f"{amount:.2f}",
+    ]
+
+
+def _refunds(data):
+    """(rows, net, tax, gross) of the done returns; refunds carry the tax rate of the item's order line."""
+    rates = {}
+    for line in data["lines"]:
+        taxed_base = (line["amount_net"] or 0.0) - (line["amount_discount"] or 0.0)
+        rates[line["item_id"]] = (line["amount_tax"] or 0.0) / taxed_base if taxed_base else 0.0
+    rows, net, tax = [], 0.0, 0.0
+    for rl in data["return_lines"]:
+        qty = float(rl["quantity"])
+        refund_net = float(rl["refund_amount"]) if rl["refund_amount"] is not None else 0.0
+        refund_tax = refund_net * rates.get(rl["item_id"], 0.0)
+        net += refund_net
+        tax += refund_tax
+        rows.append([
+            rl["return_order_code"],
+            rl["item_name"],
+            rl["item_sku"],
+            rl["lot_code"] or "",
+            format_quantity(qty),
+            f"{-(refund_net / qty if qty else 0.0):.2f}",
+            f"{-refund_net:.2f}",
+            f"{-refund_tax:.2f}",
+        ])
+    return rows, net, tax, net + tax
+
+
+def sale_returns_block(data):
+    rows = _refunds(data)[0]
+    if not rows:
+        return []
+    table = Table([["Return#", "Item", "SKU", "Lot", "Qty", "Unit €", "Total €", "Tax €"]] + rows,
+                  colWidths=[65, 90, 45, 60, 35, 45, 55, 45])
+    table.setStyle(table_style(font_size=8, grid=0.5, padding=6, right_from=4))
+    return [Paragraph("<b>Done Returns</b>", STYLES["Heading3"]), table, Spacer(1, 12)]
+
+
+def totals_block(final_label="Total"):
+    """Summary of a totals-engine document; sale orders also subtract their done returns."""
+    def block(data):
+        order = data["order"]
+        currency = currency_symbol(data)
+        subtotal = (order["amount_untaxed"] or 0.0) + (order["amount_discount"] or 0.0)
+        lines = [f"Subtotal: {subtotal:.2f} {currency}"]
+        if order["amount_discount"]:
+            lines.append(f"Discount: -{order['amount_discount']:.2f} {currency}")
+        lines.append(f"Tax: {order['amount_tax'] or 0.0:.2f} {currency}")
+        total = order["amount_total"] or 0.0
+        if "return_lines" in data:
+            _, refund_net, refund_tax, refund_gross = _refunds(data)
+            lines.append(f"Total before returns: {total:.2f} {currency}")
+            if refund_gross:
+                lines.append(f"Refunded (returns, net): {-refund_net:.2f} {currency}")
+                lines.append(f"Refunded tax: {-refund_tax:.2f} {currency}")
+                lines.append(f"Total refund (gross): {-refund_gross:.2f} {currency}")
+            total -= refund_gross
+        elements = [Paragraph(line, STYLES["Normal"]) for line in lines]
+        elements.append(Paragraph(f"<b>{final_label}: {total:.2f} {currency}</b>", STYLES["Title"]))
+        return elements
+    return block
+
+
+def purchase_summary_block(data):
+    order = data["order"]
+    tax_percent = float(order["tax_percent"]) if "tax_percent" in order.keys() else 19.0
+    subtotal = sum(float(line["quantity"]) * float(line["price"] or 0.0) for line in data["lines"])
+    tax_amount = subtotal * (tax_percent / 100)
+    return [
+        Paragraph(f"Subtotal: {subtotal:.2f} €", STYLES["Normal"]),
+        Paragraph(f"Tax ({tax_percent:.2f}%): {tax_amount:.2f} €", STYLES["Normal"]),
+        Paragraph(f"<b>Total: {subtotal + tax_amount:.2f} €</b>", STYLES["Title"]),
+    ]
+
+
+def return_bill_summary_block(data):
+    origin = data["origin"]
+    currency = data["currency_symbol"]
+    tax_percent = float(origin["tax_percent"]) if origin and "tax_percent" in origin.keys() and origin["tax_percent"] is not None else 19.0
+    discount = float(origin["discount"]) if origin and "discount" in origin.keys() and origin["discount"] is not None else 0.0
+    subtotal = sum(float(line["quantity"]) * float(line["refund_amount"] or 0.0) for line in data["lines"])
+    elements = [Paragraph(f"Subtotal: {subtotal:.2f} {currency}", STYLES["Normal"])]
+    if discount:
+        elements.append(Paragraph(f"Discount: -{discount:.2f} {currency}", STYLES["Normal"]))
+    taxed_base = subtotal - discount
+    tax_amount = taxed_base * (tax_percent / 100)
+    elements.append(Paragraph(f"Tax ({tax_percent:.2f}%): {tax_amount:.2f} {currency}", STYLES["Normal"]))
+    elements.append(Paragraph(f"<b>Total Refund: {taxed_base + tax_amount:.2f} {currency}</b>", STYLES["Title"]))
+    elements.append(Spacer(1, 18))
+    elements.append(Paragraph("<font size='9' color='gray'>This document serves as a refund bill for your return.</font>", STYLES["Normal"]))
+    return elements
+
+
+def manufacturing_company_block(data):
+    company = data["company"]
+    return _paragraph([
+        f"<b>{company['name'] if company else 'Warehouse Company'}</b>",
+        f"{company['street']}, {company['zip']} {company['city']}, {company['country']}" if company else "",
+    ])
+
+
+def contractor_block(data):
+    partner = data["partner"]
+    return _paragraph([
+        "<b>Contractor:</b>",
+        partner["name"] if partner else "",
+        partner["street"] if partner else "",
+        f"{partner['zip']} {partner['city']}, {partner['country']}" if partner else "",
+    ])
+
+
+def bom_row(line, data):
+    unit_cost = float(line["cost"] or 0)
+    total_qty = float(line["quantity"]) * float(data["order"]["quantity"])
+    currency = line["cost_currency"] or ""
+    return [
+        line["component_name"],
+        line["component_sku"],
+        line["lot_number"] or "-",
+        line["vendor_name"] or "",
+        str(line["quantity"]),
+        str(total_qty),
+        f"{unit_cost:.2f} {currency}",
+        f"{unit_cost * total_qty:.2f} {currency}",
+    ]
+
+
+def bom_cost_block(data):
+    total = sum(float(line["cost"] or 0) * float(line["quantity"]) * float(data["order"]["quantity"]) for line in data["bom_lines"])
+    return [Paragraph(f"<b>Total BOM Cost: {total:.2f} EUR</b>", STYLES["Normal"]), Spacer(1, 12)]
+
+
+def instructions_block(data):
+    bom = data["bom"]
+    return [
+        Paragraph("<b>Instructions:</b>", STYLES["Heading3"]),
+        Paragraph(bom["instructions"] if bom else "", STYLES["Normal"]),
+        Spacer(1, 12),
+    ]
+
+
+def bom_attachment_block(data):
+    """The BOM file, always last: JPEG images inline, other files as a note."""
+    bom = data["bom"]
+    if not bom or not attachment_store.exists(bom["file_sha256"]):
+        return []
+    path = attachment_store.path(bom["file_sha256"])
+    file_type = bom["file_type"] or ""
+    elements = [
+        Paragraph("<b>BOM Attachment</b>", STYLES["Heading3"]),
+        Paragraph(f"File: {bom['file_name'] or 'attachment'}", STYLES["Normal"]),
+        Paragraph(f"Type: {file_type}", STYLES["Normal"]),
+        Spacer(1, 12),
+    ]
+    if file_type == "application/pdf":
+        elements.append(Paragraph("See attached PDF for full instructions.", STYLES["Normal"]))
+        elements.append(Paragraph(f"Size: {bom['file_size']} bytes", STYLES["Normal"]))
+    elif file_type == "image/jpeg":
+        try:
+            from PIL import Image as PILImage
+            img_width, img_height = PILImage.open(path).size
+            display_width = 400
+            elements.append(Image(path, width=display_width, height=int(display_width * img_height / img_width)))
+            elements.append(Spacer(1, 12))
+        except Exception:
+            elements.append(Paragraph("Error displaying image.", STYLES["Normal"]))
+    else:
+        elements.append(Paragraph("Unsupported file type.", STYLES["Normal"]))
+    return elements
+
+
+MO_INFO = ("Status: {status}", "Product: {item_name} (SKU: {sku})", "Quantity: {quantity}",
+           "Planned Start: {planned_start}", "Planned End: {planned_end}")
+
+LAYOUTS = {
+    "sale_order": [
+        company_block,
+        partner_block("Billing Address:", billing=True),
+        header_block("Order Number {code}", "Status: {status}",
+                     lambda data: NOT_BINDING if data["order"]["status"] != "confirmed" else None),
+        table_block(PRICED_COLUMNS, priced_row, style=table_style(font_size=8, grid=0.5, padding=6, right_from=3)),
+        sale_returns_block,
+        totals_block("Final Total"),
+    ],
+    "quotation": [
+        company_block,
+        partner_block("Billing Address:", billing=True),
+        header_block("Quotation Number {code}", "Status: {status}", NOT_BINDING),
+        table_block(PRICED_COLUMNS, priced_row, style=table_style(font_size=8, grid=0.5, padding=6, right_from=3)),
+        totals_block(),
+    ],
+    "sale_order_delivery": [
+        company_block,
+        partner_block("Shipping Address:"),
+        header_block("Delivery Note for Order {code}"),
+        table_block(DELIVERY_COLUMNS, lambda line, data: [
+            line["item_name"], line["item_sku"], line["lot_code"] or "", str(float(line["quantity"]))]),
+        DELIVERY_NOTE_FOOTER,
+    ],
+    "purchase_order": [
+        partner_block("Vendor:"),
+        company_address_block,
+        header_block("Purchase Order Number {code}", "Status: {status}"),
+        table_block([("Item", 140), ("SKU", 70), ("Lot", 90), ("Quantity", 70), ("Unit Price", 70), ("Line Total", 70)],
+                    lambda line, data: [
+                        line["item_name"], line["item_sku"], line["lot_code"] or "", str(float(line["quantity"])),
+                        f"{float(line['price'] or 0.0):.2f} €", f"{float(line['quantity']) * float(line['price'] or 0.0):.2f} €"]),
+        purchase_summary_block,
+    ],
+    "purchase_order_delivery": [
+        partner_block("Vendor:"),
+        company_address_block,
+        header_block("Delivery Note for Purchase Order {code}"),
+        table_block(DELIVERY_COLUMNS, lambda line, data: [
+            line["item_name"], line["item_sku"], line["lot_code"] or "", str(float(line["quantity"]))]),
+        DELIVERY_NOTE_FOOTER,
+    ],
+    "return_order": [
+        company_block,
+        partner_block("Return From:"),
+        header_block("Return Order {code}", "Origin: {origin_model} #{origin_id}", "Status: {status}"),
+        table_block([("Item", 120), ("SKU", 60), ("Lot", 90), ("Quantity", 60), ("Reason", 120)],
+                    lambda line, data: [
+                        line["item_name"], line["item_sku"], line["lot_code"] or "", str(line["quantity"]), line["reason"] or ""]),
+        text_block(
+            ("<font size='9' color='gray'>This document is for return processing purposes only.</font>", "Normal"),
+            24,
+            ("Received by: ____________________________", "Normal"),
+        ),
+    ],
+    "return_bill": [
+        company_block,
+        partner_block("Customer:"),
+        header_block("Return Bill for {code}"),
+        table_block([("Item", 120), ("SKU", 45), ("Lot", 90), ("Qty", 35), ("Unit ({currency})", 55), ("Total ({currency})", 55)],
+                    lambda line, data: [
+                        line["item_name"], line["item_sku"], line["lot_code"] or "", str(float(line["quantity"])),
+                        f"{float(line['refund_amount'] or 0.0):.2f}", f"{float(line['quantity']) * float(line['refund_amount'] or 0.0):.2f}"],
+                    style=table_style(font_size=9, grid=0.5, padding=6, right_from=3)),
+        return_bill_summary_block,
+    ],
+    "manufacturing_order": [
+        manufacturing_company_block,
+        contractor_block,
+        header_block("Manufacturing Order {code}", *MO_INFO),
+        table_block(BOM_COLUMNS, bom_row, source="bom_lines", heading="Bill of Material (BOM)", after=12,
+                    style=table_style(font_size=8, grid=0.5, padding=6)),
+        bom_cost_block,
+        instructions_block,
+        SIGNATURES,
+        bom_attachment_block,
+    ],
+    "manufacturing_receipt": [
+        text_block(("<b>Manufacturing Report</b>", "Title"), 12),
+        manufacturing_company_block,
+        contractor_block,
+        header_block("Manufacturing Order {code}", *MO_INFO, title_style="Heading2"),
+        table_block(BOM_COLUMNS, bom_row, source="bom_lines", heading="Bill of Material (BOM)", after=12,
+                    style=table_style(font_size=8, grid=0.5, padding=4, center_all=True)),
+        bom_cost_block,
+        table_block([("Name", 80), ("SKU", 60), ("Lot Number", 110), ("Batch Size", 50), ("Created At", 80), ("Quality Status", 70)],
+                    lambda lot, data: [
+                        lot["item_name"], lot["item_sku"], lot["lot_number"],
+                        str(lot["batch_size"] if lot["batch_size"] is not None else "-"),
+                        lot["created_at"], lot["quality_control_status"]],
+                    source="lots", heading="Products Created", after=12,
+                    style=table_style(font_size=8, grid=0.5, padding=4, center_all=True)),
+        SIGNATURES,
+    ],
+}
+
+
+def document_elements(kind, data):
+    elements = []
+    for block in LAYOUTS[kind]:
+        elements += block(data)
+    return elements
+
+
+def render_document(out, kind, data):
+    doc = SimpleDocTemplate(out, pagesize=A4, **PAGE_MARGINS)
+    code = data["order"]["code"]
+    on_page = lambda c, d: add_page_number_and_qr(c, d, code)
+    doc.build(document_elements(kind, data), onFirstPage=on_page, onLaterPages=on_page)
+
+
+def document_pdf(kind, data):
+    """PDF bytes of a loaded document, from the PDF cache when its rows are unchanged."""
+    cache_key = document_key(kind, data, datetime.now().strftime('%Y-%m-%d'))
+    pdf = pdf_cache.get(cache_key)
+    if pdf is None:
+        buffer = BytesIO()
+        render_document(buffer, kind, data)
+        pdf = buffer.getvalue()
+        pdf_cache.put(cache_key, pdf)
+    return pdf
@@ -0,0 +1,178 @@
+"""Content-addressed file storage on disk.
+
+Files are stored under their SHA-256 (``<dir>/<first two hex>/<digest>``); the
+database keeps only the digest and size. Writes stream through a temporary
+file in chunks, so memory does not grow with the file, and storing the same
+content twice keeps one copy. Carrier labels, BOM files and subscription
+terms each have their own store. serve_file answers conditional and Range
+requests from the stored file; the digest doubles as a strong ETag.
+"""
+import hashlib
+import os
+import tempfile
+
+from cache import etag_matches
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+CHUNK_SIZE = 64 * 1024
+
+# Uploaded types a browser may show in the page; anything else (HTML, SVG, ...) is downloaded
+INLINE_TYPES = {"application/pdf", "image/png", "image/jpeg", "image/gif", "image/webp"}
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+class FileStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def exists(self, digest):
+        return bool(digest) and os.path.isfile(self.path(digest))
+
+    def put_chunks(self, chunks):
+        """Store an iterable of byte chunks; returns (digest, size)."""
+        os.makedirs(self.directory, exist_ok=True)
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    sha.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            digest = sha.hexdigest()
+            if self.exists(digest):
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+                os.replace(tmp, self.path(digest))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return digest, size
+
+    def put_file(self, f, chunk_size=CHUNK_SIZE):
+        """Store a binary file object read in ``chunk_size`` pieces."""
+        return self.put_chunks(iter(lambda: f.read(chunk_size), b""))
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path(digest))
+        except OSError:
+            pass
+
+
+# table -> (legacy BLOB column, digest column, size column)
+BLOB_COLUMNS = {
+    "bom": ("file", "file_sha256", "file_size"),
+    "subscription": ("terms_conditions", "terms_sha256", "terms_size"),
+}
+
+
+def move_blobs_to_store(conn, store):
+    """Move inline BLOBs into ``store``, leaving only the digest and size in the row.
+
+    Each BLOB is read incrementally, so a large attachment is never loaded
+    whole. Returns the number of rows moved; the caller commits.
+    """
+    moved = 0
+    for table, (blob_column, digest_column, size_column) in BLOB_COLUMNS.items():
+        row_ids = [row[0] for row in conn.execute(f"SELECT id FROM {table} WHERE {blob_column} IS NOT NULL")]
+        for row_id in row_ids:
+            with conn.blobopen(table, blob_column, row_id, readonly=True) as blob:
+                digest, size = store.put_file(blob)
+            conn.execute(
+                f"UPDATE {table} SET {blob_column} = NULL, {digest_column} = ?, {size_column} = ? WHERE id = ?",
+                (digest, size, row_id),
+            )
+            moved += 1
+    return moved
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single ``bytes=`` range, or None to send the whole file.
+
+    Raises RangeNotSatisfiable when the range lies outside the file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path, start, end, chunk_size=CHUNK_SIZE):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def content_headers(media_type, filename):
+    """(media type, Content-Disposition) for an uploaded file.
+
+    The type is whatever the uploader claimed, so only INLINE_TYPES are served
+    inline; everything else goes out as an application/octet-stream attachment.
+    """
+    media_type = (media_type or "").split(";")[0].strip().lower()
+    filename = "".join(c for c in filename if c.isprintable() and c not in '"\\')
+    if media_type in INLINE_TYPES:
+        return media_type, f'inline; filename="{filename}"'
+    return "application/octet-stream", f'attachment; filename="{filename}"'
+
+
+def serve_file(path, size, digest, range_header=None, if_none_match=None, if_range=None):
+    """(status, headers, chunks) for a stored file; chunks is None when there is no body."""
+    etag = f'"{digest}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return 304, headers, None
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        headers["Content-Range"] = f"bytes */{size}"
+        return 416, headers, None
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return 200, headers, iter_file_range(path, 0, size - 1)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return 206, headers, iter_file_range(path, start, end)
+
+
+# Seconds to wait for the carrier when fetching a purchased label
+LABEL_FETCH_TIMEOUT = float(os.environ.get("LABEL_FETCH_TIMEOUT", "10"))
+
+label_store = FileStore(os.environ.get("LABEL_STORE_DIR") or os.path.join(PROJECT_ROOT, "data", "labels"))
+
+# BOM files and subscription terms
+attachment_store = FileStore(os.environ.get("ATTACHMENT_STORE_DIR") or os.path.join(PROJECT_ROOT, "data", "attachments"))
@@ -0,0 +1,122 @@
+"""Benchmark the shared document templates: queries, load and render time per layout.
+
+Builds an in-memory database from schema.sql with one quotation, sale order,
+purchase order and return order of LINES lines each, and one manufacturing
+order (its lines are the BOM lines of the kit it builds, whatever LINES is).
+
+Every layout is measured twice. "cold" drops the per-process state of the
+templates (style sheet, table styles, reference data snapshot) before each
+document, which is the setup every print request paid when each handler built
+its own styles and read the company rows itself; "warm" is the steady state of
+a long-running process. The last column is the cold/warm ratio.
+
+Run from the project root: python helpers/bench_documents.py [LINES]
+"""
+import os
+import sqlite3
+import sys
+import time
+from io import BytesIO
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from reportlab.lib.styles import getSampleStyleSheet
+
+import documents
+import reference_data
+from cache import VersionedCache
+from document_data import load_document
+from documents import render_document
+
+
+def build_db(lines):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    with open(os.path.join(ROOT, "schema.sql"), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    partner_id = conn.execute("SELECT id FROM partner ORDER BY id LIMIT 1").fetchone()[0]
+    item_ids = [row[0] for row in conn.execute("SELECT id FROM item ORDER BY id")]
+    kit = conn.execute("SELECT id FROM item WHERE bom_id IS NOT NULL ORDER BY id LIMIT 1").fetchone()[0]
+    zone_id = conn.execute("SELECT id FROM zone ORDER BY id LIMIT 1").fetchone()[0]
+    line_items = [(item_ids[i % len(item_ids)], 1 + i % 5) for i in range(lines)]
+    quotation_id = conn.execute("INSERT INTO quotation (code, partner_id) VALUES ('Q-BENCH', ?)", (partner_id,)).lastrowid
+    conn.executemany("INSERT INTO quotation_line (quotation_id, item_id, quantity, price) VALUES (?, ?, ?, 9.5)",
+                     [(quotation_id, item_id, quantity) for item_id, quantity in line_items])
+    so_id = conn.execute(
+        "INSERT INTO sale_order (code, partner_id, quotation_id) VALUES ('SO-BENCH', ?, ?)", (partner_id, quotation_id)
+    ).lastrowid
+    conn.executemany("INSERT INTO order_line (order_id, item_id, quantity, price) VALUES (?, ?, ?, 9.5)",
+                     [(so_id, item_id, quantity) for item_id, quantity in line_items])
+    po_id = conn.execute("INSERT INTO purchase_order (code, partner_id) VALUES ('PO-BENCH', ?)", (partner_id,)).lastrowid
+    conn.executemany("INSERT INTO purchase_order_line (purchase_order_id, item_id, quantity, price) VALUES (?, ?, ?, 4.0)",
+                     [(po_id, item_id, quantity) for item_id, quantity in line_items])
+    ro_id = conn.execute(
+        "INSERT INTO return_order (code, origin_model, origin_id, partner_id) VALUES ('RO-BENCH', 'sale_order', ?, ?)",
+        (so_id, partner_id),
+    ).lastrowid
+    conn.executemany(
+        "INSERT INTO return_line (return_order_id, item_id, quantity, reason, refund_amount) VALUES (?, ?, ?, 'damaged', 9.5)",
+        [(ro_id, item_id, quantity) for item_id, quantity in line_items],
+    )
+    mo_id = conn.execute(
+        "INSERT INTO manufacturing_order (code, partner_id, item_id, quantity, manufacturing_zone_id) VALUES ('MO-BENCH', ?, ?, 2, ?)",
+        (partner_id, kit, zone_id),
+    ).lastrowid
+    conn.commit()
+    return conn, {
+        "quotation": quotation_id,
+        "sale_order": so_id,
+        "sale_order_delivery": so_id,
+        "purchase_order": po_id,
+        "purchase_order_delivery": po_id,
+        "return_order": ro_id,
+        "return_bill": ro_id,
+        "manufacturing_order": mo_id,
+        "manufacturing_receipt": mo_id,
+    }
+
+
+def drop_template_state():
+    """Forget what the templates keep per process, so the next document builds it again."""
+    documents.STYLES = getSampleStyleSheet()
+    documents.table_style.cache_clear()
+    reference_data._snapshot_cache = VersionedCache(maxsize=1)
+
+
+def measure(conn, kind, doc_id, repeat, cold):
+    """(queries, best load s, best render s, PDF bytes) of one layout."""
+    if not cold:
+        load_document(conn, kind, doc_id)  # warm the reference snapshot and totals
+    load_times, render_times = [], []
+    for _ in range(repeat):
+        if cold:
+            drop_template_state()
+        statements = []
+        conn.set_trace_callback(statements.append)
+        started = time.perf_counter()
+        data = load_document(conn, kind, doc_id)
+        load_times.append(time.perf_counter() - started)
+        conn.set_trace_callback(None)
+        out = BytesIO()
+        started = time.perf_counter()
+        render_document(out, kind, data)
+        render_times.append(time.perf_counter() - started)
+    return len(statements), min(load_times), min(render_times), len(out.getvalue())
+
+
+def main(lines=200, repeat=5):
+    conn, docs = build_db(lines)
+    print(f"{'layout':<24} {'queries':>11} {'load ms':>13} {'render ms':>13} {'KiB':>7} {'cold/warm':>9}")
+    print(f"{'':<24} {'cold  warm':>11} {'cold   warm':>13} {'cold   warm':>13}")
+    for kind, doc_id in docs.items():
+        cold_queries, cold_load, cold_render, _ = measure(conn, kind, doc_id, repeat, cold=True)
+        warm_queries, warm_load, warm_render, size = measure(conn, kind, doc_id, repeat, cold=False)
+        ratio = (cold_load + cold_render) / (warm_load + warm_render)
+        print(f"{kind:<24} {cold_queries:>5} {warm_queries:>5} {cold_load * 1000:>6.1f} {warm_load * 1000:>6.1f} "
+              f"{cold_render * 1000:>6.1f} {warm_render * 1000:>6.1f} {size / 1024:>7.1f} {ratio:>8.2f}x")
+    drop_template_state()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,46 @@
+"""Benchmark shipping labels: A7 PDF pages vs ZPL templates.
+
+Run from the project root: python helpers/bench_labels.py
+"""
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from reportlab.lib.pagesizes import A7
+from reportlab.pdfgen import canvas
+
+from labels import zpl_label
+from utils import draw_shipping_label
+
+SENDER = {"name": "Warehouse GmbH", "street": "Hauptstrasse 1", "zip": "1010", "city": "Wien", "country": "Austria"}
+RECEIVER = {"name": "Customer_42", "street": "Ring 7", "zip": "8010", "city": "Graz", "country": "Austria"}
+
+
+def pdf_labels(count, out):
+    c = canvas.Canvas(out, pagesize=A7)
+    width, height = A7
+    for index in range(count):
+        draw_shipping_label(c, width, height, f"SO-BENCH-{index}", SENDER, RECEIVER)
+        c.showPage()
+    c.save()
+
+
+def zpl_labels(count, out):
+    for index in range(count):
+        out.write(zpl_label("sale_order", f"SO-BENCH-{index}", SENDER, RECEIVER).encode("utf-8"))
+
+
+def main(count=1000):
+    for label, render in (("pdf", pdf_labels), ("zpl", zpl_labels)):
+        out = BytesIO()
+        started = time.perf_counter()
+        render(count, out)
+        elapsed = time.perf_counter() - started
+        print(f"{label}  {count} labels  {elapsed * 1000:8.1f} ms  {count / elapsed * 60:10.0f} labels/min  {len(out.getvalue()) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Benchmark page QR codes: PNG per page (previous draw_qr_code) vs cached vector form.
+
+Run from the project root: python helpers/bench_qr.py
+"""
+import os
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import qrcode
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from utils import add_page_number, draw_qr_code, qr_matrix
+
+
+def png_qr_code(c, code, page_width, page_height, qr_size=60, margin=20):
+    qr = qrcode.QRCode(box_size=2, border=1)
+    qr.add_data(code)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    qr_buffer = BytesIO()
+    img.save(qr_buffer, format="PNG")
+    qr_buffer.seek(0)
+    x = page_width - qr_size - margin
+    y = page_height - qr_size - margin
+    c.setLineWidth(1.5)
+    c.rect(x - 4, y - 4, qr_size + 8, qr_size + 8, stroke=1, fill=0)
+    c.drawImage(ImageReader(qr_buffer), x, y, width=qr_size, height=qr_size)
+
+
+def build(pages, draw, code):
+    out = BytesIO()
+    c = canvas.Canvas(out, pagesize=A4)
+    for _ in range(pages):
+        add_page_number(c, None)
+        draw(c, code, *A4)
+        c.showPage()
+    c.save()
+    return len(out.getvalue())
+
+
+def main(repeat=5):
+    for pages in (1, 100):
+        for label, draw in (("png per page", png_qr_code), ("vector form", draw_qr_code)):
+            timings = []
+            for run in range(repeat):
+                qr_matrix.cache_clear()
+                started = time.perf_counter()
+                size = build(pages, draw, f"SO-BENCH-{run}")
+                timings.append(time.perf_counter() - started)
+            print(f"{pages:>3} pages  {label:<13} {min(timings) * 1000:8.1f} ms  {size / 1024:7.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
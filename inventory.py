@@ -0,0 +1,115 @@
+"""Batched stock adjustments.
+
+Posting adjustments one by one makes the stock triggers scan the open
+interventions of every zone of the location for each row. A batch pauses that
+per-row resolution, applies all deltas first and then resolves interventions
+once per (item, zone), in priority order, while stock is available.
+"""
+
+
+def apply_stock_adjustments(conn, adjustments, reason=None, username=None):
+    """Apply a list of adjustment dicts in one pass and return a batch summary.
+
+    Each adjustment needs ``item_id``, ``location_id`` and ``delta``; ``lot_id``,
+    ``reason`` and ``route_id`` are optional. The caller owns the transaction.
+    """
+    batch_id = conn.execute(
+        "INSERT INTO stock_adjustment_batch (status, reason, created_by) VALUES ('open', ?, ?)",
+        (reason, username)
+    ).lastrowid
+
+    conn.executemany("""
+        INSERT INTO stock_adjustment (item_id, location_id, lot_id, delta, reason, route_id, batch_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (
+            adj["item_id"],
+            adj["location_id"],
+            adj.get("lot_id"),
+            adj["delta"],
+            adj.get("reason") or reason,
+            adj.get("route_id"),
+            batch_id,
+        )
+        for adj in adjustments
+    ])
+
+    groups = conn.execute("""
+        SELECT DISTINCT sa.item_id, lz.zone_id
+        FROM stock_adjustment sa
+        JOIN location_zone lz ON lz.location_id = sa.location_id
+        WHERE sa.batch_id = ? AND sa.delta > 0
+    """, (batch_id,)).fetchall()
+
+    resolved = 0
+    for item_id, zone_id in groups:
+        resolved += _resolve_interventions(conn, batch_id, item_id, zone_id)
+
+    # Supply triggers of the batched rows, deferred until interventions had
+    # first pick of the new stock. The batch is still open, so their
+    # 'intervene' outcome does not re-resolve interventions blindly.
+    conn.execute("""
+        INSERT INTO trigger (
+            origin_model, origin_id, trigger_type, trigger_item_id, trigger_route_id,
+            trigger_zone_id, trigger_item_quantity, trigger_lot_id, type, status
+        )
+        SELECT 'stock', sa.id, 'supply', sa.item_id, sa.route_id,
+               lz.zone_id, sa.delta, sa.lot_id, 'internal', 'draft'
+        FROM stock_adjustment sa
+        JOIN location_zone lz ON lz.location_id = sa.location_id
+        WHERE sa.batch_id = ? AND sa.delta > 0
+        ORDER BY sa.id
+    """, (batch_id,))
+
+    conn.execute(
+        "UPDATE stock_adjustment_batch SET status = 'done', done_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (batch_id,)
+    )
+
+    return {
+        "batch_id": batch_id,
+        "adjustments": len(adjustments),
+        "groups": len(groups),
+        "resolved_interventions": resolved,
+    }
+
+
+def _available_in_zone(conn, item_id, zone_id):
+    return conn.execute("""
+        SELECT IFNULL(SUM(s.quantity - s.reserved_quantity), 0)
+        FROM stock s
+        JOIN location_zone lz ON lz.location_id = s.location_id
+        WHERE lz.zone_id = ? AND s.item_id = ?
+    """, (zone_id, item_id)).fetchone()[0]
+
+
+def _resolve_interventions(conn, batch_id, item_id, zone_id):
+    # Snapshot of the open interventions for this (item, zone); each one is
+    # tried at most once so a partially served move cannot loop.
+    candidates = conn.execute("""
+        SELECT oi.move_id
+        FROM open_intervention oi
+        WHERE oi.item_id = ?
+          AND oi.zone_id = ?
+          AND (
+              oi.lot_id IS NULL
+              OR oi.lot_id IN (SELECT lot_id FROM stock_adjustment WHERE batch_id = ? AND item_id = ?)
+          )
+        GROUP BY oi.move_id
+        ORDER BY MAX(oi.priority) DESC, MIN(oi.created_at) ASC, oi.move_id ASC
+    """, (item_id, zone_id, batch_id, item_id)).fetchall()
+
+    resolved = 0
+    for (move_id,) in candidates:
+        if _available_in_zone(conn, item_id, zone_id) <= 0:
+            break
+        conn.execute("UPDATE move SET status = 'confirmed' WHERE id = ?", (move_id,))
+        resolved += conn.execute("""
+            UPDATE intervention
+            SET resolved = 1
+            WHERE move_id = ?
+              AND resolved = 0
+              AND (SELECT IFNULL(SUM(quantity), 0) FROM move_line WHERE move_id = ?)
+                  = (SELECT quantity FROM move WHERE id = ?)
+        """, (move_id, move_id, move_id)).rowcount
+    return resolved
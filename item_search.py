@@ -0,0 +1,48 @@
+"""Item search over the item_fts full-text index.
+
+An exact SKU or barcode hit (what a scanner sends) is always returned first.
+The remaining results come from an FTS5 prefix query ranked by bm25, with
+name, sku and barcode weighted above the description.
+"""
+import re
+
+# bm25 column weights: name, sku, barcode, description
+RANK_WEIGHTS = (10.0, 8.0, 8.0, 1.0)
+
+ITEM_COLUMNS = "i.id, i.name, i.sku, i.barcode, i.description, i.image_url, i.is_sellable, i.is_digital"
+
+
+def build_match_query(q):
+    """Turn free text into an FTS5 query: every term must match as a prefix."""
+    terms = re.findall(r"\w+", q or "")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_items(conn, q, limit=20, offset=0, sellable_only=False):
+    """Return ``{"items": [...], "next_offset": ...}`` for one page of results."""
+    q = (q or "").strip()
+    sellable = " AND i.is_sellable = 1" if sellable_only else ""
+
+    exact = conn.execute(f"""
+        SELECT {ITEM_COLUMNS}, 'exact' AS match, NULL AS rank
+        FROM item i
+        WHERE (i.barcode = ? OR i.sku = ?){sellable}
+    """, (q, q)).fetchall() if q else []
+
+    match = build_match_query(q)
+    rows = [dict(row) for row in exact][offset:offset + limit]
+    # One extra row tells whether there is a next page
+    remaining = limit + 1 - len(rows)
+    if match and remaining > 0:
+        exclude = " AND i.id NOT IN ({})".format(",".join("?" for _ in exact)) if exact else ""
+        rows += [dict(row) for row in conn.execute(f"""
+            SELECT {ITEM_COLUMNS}, 'text' AS match, bm25(item_fts, ?, ?, ?, ?) AS rank
+            FROM item_fts
+            JOIN item i ON i.id = item_fts.rowid
+            WHERE item_fts MATCH ?{sellable}{exclude}
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        """, (*RANK_WEIGHTS, match, *[row["id"] for row in exact], remaining, max(offset - len(exact), 0)))]
+
+    more = len(rows) > limit
+    return {"items": rows[:limit], "next_offset": offset + limit if more else None}
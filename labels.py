@@ -0,0 +1,148 @@
+"""Shipping labels for sale, purchase and return orders, as PDF or ZPL.
+
+Every label kind shares one layout: title, order code, QR code, sender and
+receiver blocks and a footer. load_label reads what a label needs in fixed
+queries. The ZPL template of each kind is built once per printer density with
+the static text already baked in, so printing a label is a single string
+substitution and no raster work; thermal printers draw the QR code themselves.
+"""
+import os
+from functools import lru_cache
+
+from document_data import PARTNER_QUERY, load_company
+
+ZPL_MEDIA_TYPE = "application/zpl"
+
+# Printer density in dots per millimetre (8 = 203 dpi, 12 = 300 dpi)
+ZPL_DOTS_PER_MM = int(os.environ.get("ZPL_DOTS_PER_MM", "8"))
+
+# A7, the size of the PDF labels
+LABEL_WIDTH_MM = 74
+LABEL_HEIGHT_MM = 105
+
+ADDRESS_LINES = 4
+
+# kind -> (document table, code prefix, partner is the sender, texts)
+LABELS = {
+    "sale_order": ("sale_order", "SO", False, {
+        "title": "Shipping Label",
+        "code": "Sale Order",
+        "scan": "Scan for order info",
+        "sender": "Sender:",
+        "receiver": "Receiver:",
+        "footer": "Stick this label on your parcel.",
+    }),
+    "purchase_order": ("purchase_order", "PO", True, {
+        "title": "Inbound Carrier Label",
+        "code": "Purchase Order",
+        "scan": "Scan for PO info",
+        "sender": "Sender (Vendor):",
+        "receiver": "Receiver (Warehouse):",
+        "footer": "Stick this label on your inbound parcel.",
+    }),
+    "return_order": ("return_order", "RET", True, {
+        "title": "Return Parcel Label",
+        "code": "Return Order",
+        "scan": "Scan for return info",
+        "sender": "Sender:",
+        "receiver": "Receiver:",
+        "footer": "Stick this label on your return parcel.",
+    }),
+}
+
+
+def label_texts(kind):
+    return LABELS[kind][3]
+
+
+def label_code(kind, order):
+    return order["code"] if order["code"] else f"{LABELS[kind][1]}-{order['id']}"
+
+
+def load_label(conn, kind, doc_id):
+    """(code, sender, receiver) of one label, or None when the order does not exist."""
+    table, _, partner_sends, _ = LABELS[kind]
+    order = conn.execute(f"SELECT id, code, partner_id FROM {table} WHERE id = ?", (doc_id,)).fetchone()
+    if not order:
+        return None
+    partner = conn.execute(PARTNER_QUERY, (order["partner_id"],)).fetchone()
+    company = load_company(conn)
+    sender, receiver = (partner, company) if partner_sends else (company, partner)
+    return label_code(kind, order), sender, receiver
+
+
+def address_lines(party, unknown):
+    """The lines of an address block, as drawn on the PDF label."""
+    if not party:
+        return [unknown]
+    lines = [party["name"]]
+    if "street" in party.keys() and party["street"]:
+        lines.append(party["street"])
+    lines.append(f"{party['zip']} {party['city']}".strip())
+    if "country" in party.keys() and party["country"]:
+        lines.append(party["country"])
+    return lines
+
+
+def zpl_escape(text):
+    """Field data for a ^FH_ field: the ZPL control characters as hex escapes."""
+    return str(text).replace("_", "_5F").replace("^", "_5E").replace("~", "_7E")
+
+
+@lru_cache(maxsize=None)
+def zpl_template(kind, dots_per_mm=ZPL_DOTS_PER_MM):
+    """The ZPL of one label with ``{code}``, ``{sender0}``… ``{receiver3}`` placeholders."""
+    texts = label_texts(kind)
+
+    def dots(mm):
+        return round(mm * dots_per_mm)
+
+    def static(text):
+        return zpl_escape(text).replace("{", "{{").replace("}", "}}")
+
+    def field(x_mm, y_mm, height_mm, data):
+        # ^A0 is the printer's scalable font, so sizes follow the density
+        return f"^FO{dots(x_mm)},{dots(y_mm)}^A0N,{dots(height_mm)},{dots(height_mm * 0.8)}^FH_^FD{data}^FS"
+
+    qr_size_mm = 35
+    # A short code gives a 21-25 module QR symbol; ^BQ magnification is 1-10
+    magnification = max(1, min(10, round(dots(qr_size_mm) / 25)))
+    parts = [
+        "^XA^CI28",
+        f"^PW{dots(LABEL_WIDTH_MM)}^LL{dots(LABEL_HEIGHT_MM)}",
+        f"^FO{dots(1.5)},{dots(1.5)}^GB{dots(LABEL_WIDTH_MM - 3)},{dots(LABEL_HEIGHT_MM - 3)},2^FS",
+        field(3.5, 4, 4, static(texts["title"])),
+        field(3.5, 10, 3, static(texts["code"]) + ": {code}"),
+        f"^FO{dots((LABEL_WIDTH_MM - qr_size_mm) / 2)},{dots(14)}^BQN,2,{magnification}^FH_^FDQA,{{code}}^FS",
+        field((LABEL_WIDTH_MM - 30) / 2, 51, 2.5, static(texts["scan"])),
+    ]
+    y = 56
+    for party in ("sender", "receiver"):
+        parts.append(field(3.5, y, 3, static(texts[party])))
+        for index in range(ADDRESS_LINES):
+            y += 4
+            parts.append(field(3.5, y, 3, f"{{{party}{index}}}"))
+        y += 5
+    parts.append(field(3.5, LABEL_HEIGHT_MM - 6, 2.5, static(texts["footer"])))
+    parts.append("^XZ")
+    return "\n".join(parts) + "\n"
+
+
+def zpl_label(kind, code, sender, receiver, dots_per_mm=ZPL_DOTS_PER_MM):
+    values = {"code": zpl_escape(code)}
+    for party, lines in (
+        ("sender", address_lines(sender, "(Unknown sender)")),
+        ("receiver", address_lines(receiver, "(Unknown receiver)")),
+    ):
+        lines = (lines + [""] * ADDRESS_LINES)[:ADDRESS_LINES]
+        for index, line in enumerate(lines):
+            values[f"{party}{index}"] = zpl_escape(line)
+    return zpl_template(kind, dots_per_mm).format_map(values)
+
+
+def render_label(kind, code, sender, receiver, output="pdf"):
+    """(body, media type, file extension) of one label; anything but ``"zpl"`` gives the PDF."""
+    if output == "zpl":
+        return zpl_label(kind, code, sender, receiver).encode("utf-8"), ZPL_MEDIA_TYPE, "zpl"
+    from utils import shipping_label_pdf
+    return shipping_label_pdf(kind, code, sender, receiver), "application/pdf", "pdf"
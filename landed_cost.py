@@ -0,0 +1,131 @@
+"""Landed cost of a cart or order for a destination country.
+
+One batched query resolves, for every item of the cart, its HS code (the
+mapping for the destination, else the item's first mapping), the duties and
+taxes hs_country_tax attaches to that code in the destination, and the price
+list price. Fixed amounts are converted into the price list currency.
+
+These per-item rates do not depend on quantities, so they are cached per
+(item set, country, price list) for the current catalog_version; the cart's
+quantities are applied on top of the cached rates.
+"""
+import json
+
+from cache import VersionedCache, catalog_version
+
+_rates_cache = VersionedCache(maxsize=256)
+
+RATES_QUERY = """
+    WITH requested AS (
+        SELECT DISTINCT value AS item_id FROM json_each(:item_ids)
+    ),
+    classified AS (
+        SELECT r.item_id, COALESCE(
+            (SELECT hs_code_id FROM item_hs_country WHERE item_id = r.item_id AND country_id = :country_id),
+            (SELECT hs_code_id FROM item_hs_country WHERE item_id = r.item_id ORDER BY id LIMIT 1)
+        ) AS hs_code_id
+        FROM requested r
+    )
+    SELECT c.item_id, h.code AS hs_code,
+           (SELECT pli.price FROM price_list_item pli
+            WHERE pli.price_list_id = :price_list_id AND pli.item_id = c.item_id
+            ORDER BY pli.unit_id LIMIT 1) AS unit_price,
+           tx.id AS tax_id, tx.name AS tax_name, tx.label AS tax_label, tx.percent,
+           tx.fixed_amount * IFNULL(plc.rel_to_usd, 1.0) / IFNULL(fc.rel_to_usd, IFNULL(plc.rel_to_usd, 1.0)) AS fixed_amount
+    FROM classified c
+    LEFT JOIN hs_code h ON h.id = c.hs_code_id
+    LEFT JOIN hs_country_tax hct ON hct.hs_code_id = c.hs_code_id AND hct.country_id = :country_id
+    LEFT JOIN tax tx ON tx.id = hct.tax_id
+    LEFT JOIN currency fc ON fc.id = tx.fixed_currency_id
+    LEFT JOIN price_list pl ON pl.id = :price_list_id
+    LEFT JOIN currency plc ON plc.id = pl.currency_id
+    ORDER BY c.item_id, tx.id
+"""
+
+
+def load_landed_rates(conn, item_ids, country_id, price_list_id):
+    """Per-item HS code, unit price and duties as {item_id: {...}}; cached per catalog version."""
+    key = (tuple(sorted(set(item_ids))), country_id, price_list_id)
+    version = catalog_version(conn)
+    rates = _rates_cache.get(key, version)
+    if rates is not None:
+        return rates
+
+    rates = {}
+    rows = conn.execute(RATES_QUERY, {
+        "item_ids": json.dumps(list(key[0])),
+        "country_id": country_id,
+        "price_list_id": price_list_id,
+    })
+    for row in rows:
+        item = rates.setdefault(row["item_id"], {
+            "hs_code": row["hs_code"],
+            "unit_price": row["unit_price"],
+            "duty_percent": 0.0,
+            "fixed_amount": 0.0,
+            "taxes": [],
+        })
+        if row["tax_id"] is None:
+            continue
+        item["duty_percent"] += row["percent"] or 0
+        item["fixed_amount"] += row["fixed_amount"] or 0
+        item["taxes"].append({
+            "tax_id": row["tax_id"],
+            "name": row["tax_name"],
+            "label": row["tax_label"],
+            "percent": row["percent"],
+            "fixed_amount": row["fixed_amount"],
+        })
+    _rates_cache.set(key, version, rates)
+    return rates
+
+
+def compute_landed_cost(conn, lines, country_id, price_list_id):
+    """Landed cost of ``lines`` (dicts with item_id, quantity and an optional price).
+
+    Amounts are in the price list currency; a line price overrides the price list.
+    """
+    lines = list(lines)
+    rates = load_landed_rates(conn, [line["item_id"] for line in lines], country_id, price_list_id)
+    currency = conn.execute("""
+        SELECT c.id, c.code, c.symbol
+        FROM price_list pl
+        JOIN currency c ON c.id = pl.currency_id
+        WHERE pl.id = ?
+    """, (price_list_id,)).fetchone()
+
+    result_lines = []
+    totals = {"goods_value": 0.0, "duty_amount": 0.0, "landed_cost": 0.0}
+    for line in lines:
+        rate = rates.get(line["item_id"])
+        if rate is None:
+            continue
+        quantity = line.get("quantity") or 0
+        price = line.get("price")
+        unit_price = price if price is not None else (rate["unit_price"] or 0)
+        goods_value = round(quantity * unit_price, 2)
+        duty_amount = round(goods_value * rate["duty_percent"] / 100 + quantity * rate["fixed_amount"], 2)
+        result_lines.append({
+            "item_id": line["item_id"],
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "hs_code": rate["hs_code"],
+            "duty_percent": rate["duty_percent"],
+            "fixed_amount": rate["fixed_amount"],
+            "goods_value": goods_value,
+            "duty_amount": duty_amount,
+            "landed_cost": round(goods_value + duty_amount, 2),
+            "taxes": rate["taxes"],
+        })
+        totals["goods_value"] += goods_value
+        totals["duty_amount"] += duty_amount
+        totals["landed_cost"] += goods_value + duty_amount
+
+    return dict(
+        {key: round(value, 2) for key, value in totals.items()},
+        country_id=country_id,
+        price_list_id=price_list_id,
+        currency_code=currency["code"] if currency else None,
+        currency_symbol=currency["symbol"] if currency else None,
+        lines=result_lines,
+    )
@@ -0,0 +1,185 @@
+"""Keyset pagination, field projection and NDJSON streaming for list endpoints.
+
+Without ``limit``/``cursor``/``format`` a list endpoint keeps returning the
+plain JSON array it always did. With ``limit`` (or ``cursor``) it returns one
+page, ``{"items": [...], "next_cursor": ...}``, read with a keyset predicate on
+the ordering columns instead of OFFSET. ``format=ndjson`` streams one JSON
+object per line straight from the cursor. When a limited stream has more rows,
+it ends with a ``{"next_cursor": ...}`` line.
+"""
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from database import get_conn
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+FETCH_SIZE = 500
+
+
+class ListParams:
+    """Query parameters shared by the paginated list endpoints (use with ``Depends()``)."""
+
+    def __init__(
+        self,
+        fields: Optional[str] = Query(None, description="Comma separated columns to return"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        format: str = Query("json", pattern="^(json|ndjson)$"),
+    ):
+        self.fields = fields
+        self.cursor = cursor
+        self.limit = limit
+        self.format = format
+
+
+class Listing:
+    """A listable source: a table (plus optional joins) and its keyset ordering.
+
+    ``order_by`` names the ordering columns; the last one must be unique.
+    ``columns`` restricts the default projection (all table columns otherwise);
+    ``extra_columns`` maps additional output names to SQL expressions.
+    """
+
+    def __init__(self, table, order_by=("id",), descending=False, columns=None,
+                 alias=None, joins="", extra_columns=None):
+        self.table = table
+        self.alias = alias or table
+        self.order_by = tuple(order_by)
+        self.descending = descending
+        self.columns = columns
+        self.joins = joins
+        self.extra_columns = extra_columns or {}
+        self._fields = None
+
+    def fields(self, conn):
+        if self._fields is None:
+            names = self.columns or [row[1] for row in conn.execute(f"PRAGMA table_info({self.table})")]
+            fields = {name: f"{self.alias}.{name}" for name in names}
+            fields.update(self.extra_columns)
+            self._fields = fields
+        return self._fields
+
+    def query(self, conn, fields=None, cursor=None, limit=None, filters=()):
+        """Build (sql, params, names) for one page; raise ValueError on bad fields or cursor."""
+        available = self.fields(conn)
+        if fields:
+            names = [name.strip() for name in fields.split(",") if name.strip()]
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        else:
+            names = list(available)
+
+        # Key columns are always selected (as _k0, _k1, ...) to build the next cursor
+        keys = [f"{self.alias}.{column}" for column in self.order_by]
+        select = [f"{available[name]} AS \"{name}\"" for name in names]
+        select += [f"{key} AS _k{i}" for i, key in enumerate(keys)]
+
+        where = []
+        params = []
+        for clause, clause_params in filters:
+            where.append(clause)
+            params.extend(clause_params)
+        if cursor:
+            values = decode_cursor(cursor, len(keys))
+            op = "<" if self.descending else ">"
+            where.append(f"({', '.join(keys)}) {op} ({', '.join('?' for _ in keys)})")
+            params.extend(values)
+
+        direction = "DESC" if self.descending else "ASC"
+        sql = f"SELECT {', '.join(select)} FROM {self.table}"
+        if self.alias != self.table:
+            sql += f" {self.alias}"
+        if self.joins:
+            sql += f" {self.joins}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY " + ", ".join(f"{key} {direction}" for key in keys)
+        if limit is not None:
+            # One extra row tells whether there is a next page
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+        return sql, params, names
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    # Only scalars can be bound as keyset parameters
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def iter_rows(result, names):
+    """Yield ``(row dict, key values)`` from a cursor in fetchmany batches."""
+    key_count = len(result.description) - len(names)
+    while True:
+        batch = result.fetchmany(FETCH_SIZE)
+        if not batch:
+            return
+        for row in batch:
+            yield dict(zip(names, row[:len(names)])), tuple(row[len(row) - key_count:])
+
+
+def fetch_page(conn, listing, fields=None, cursor=None, limit=DEFAULT_PAGE_SIZE, filters=()):
+    sql, params, names = listing.query(conn, fields, cursor, limit, filters)
+    rows = conn.execute(sql, params).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [dict(zip(names, row[:len(names)])) for row in rows]
+    next_cursor = encode_cursor(tuple(rows[-1])[len(names):]) if more and rows else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _ndjson_stream(conn, result, names, limit):
+    try:
+        produced = 0
+        last_keys = None
+        for row, keys in iter_rows(result, names):
+            if limit is not None and produced == limit:
+                # The query reads one row past the limit: there is a next page
+                yield json.dumps({"next_cursor": encode_cursor(last_keys)}).encode("utf-8") + b"\n"
+                break
+            produced += 1
+            last_keys = keys
+            yield json.dumps(row, default=str).encode("utf-8") + b"\n"
+    finally:
+        conn.close()
+
+
+def list_response(listing, params, filters=()):
+    """Serve ``listing`` according to ``params``: legacy array, keyset page or NDJSON stream."""
+    if params.format == "ndjson":
+        conn = get_conn()
+        try:
+            sql, sql_params, names = listing.query(conn, params.fields, params.cursor, params.limit, filters)
+            result = conn.execute(sql, sql_params)
+        except ValueError as e:
+            conn.close()
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(_ndjson_stream(conn, result, names, params.limit), media_type="application/x-ndjson")
+
+    with get_conn() as conn:
+        try:
+            if params.limit is None and params.cursor is None:
+                sql, sql_params, names = listing.query(conn, params.fields, filters=filters)
+                return [row for row, _ in iter_rows(conn.execute(sql, sql_params), names)]
+            return fetch_page(conn, listing, params.fields, params.cursor, params.limit or DEFAULT_PAGE_SIZE, filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
@@ -17,10 +18,36 @@ from api import (
     users_router,
     partners_router,
     frontend_router,
+    documents_router,
 )
 
 # import DB helpers for diagnostics only; avoid initializing DB automatically on import
-from database import DB_PATH, initialize_database
+from database import DB_PATH, initialize_database, get_conn
+from replenishment import plan_replenishment
+from reference_data import get_reference_data
+from render_service import render_service
+from passwords import password_hasher
+from prerender import PRERENDER_INTERVAL_SECONDS, prerenderer
+from file_store import attachment_store, move_blobs_to_store
+
+
+def _run_replenishment():
+    with get_conn() as conn:
+        plan = plan_replenishment(conn, dry_run=False)
+        conn.commit()
+    return plan
+
+
+async def replenishment_loop(interval_minutes: float):
+    """Periodically emit the min/max replenishment plan (REPLENISHMENT_INTERVAL_MINUTES)."""
+    while True:
+        await asyncio.sleep(interval_minutes * 60)
+        try:
+            plan = await asyncio.to_thread(_run_replenishment)
+            logging.info("Replenishment run: %d shortfalls, %d transfer orders, %.1f ms",
+                         plan["shortfalls"], len(plan["transfer_orders"]), plan["compute_ms"])
+        except Exception:
+            logging.exception("Replenishment run failed")
 
 
 @asynccontextmanager
@@ -32,7 +59,34 @@ async def lifespan(app: FastAPI):
         initialize_database()
     else:
         logging.info("Skipping automatic DB initialization on startup")
+    try:
+        with get_conn() as conn:
+            get_reference_data(conn)
+    except Exception:
+        logging.exception("Could not preload reference data")
+    try:
+        with get_conn() as conn:
+            moved = move_blobs_to_store(conn, attachment_store)
+            conn.commit()
+        if moved:
+            logging.info("Moved %d inline attachments to the attachment store", moved)
+    except Exception:
+        logging.exception("Could not move inline attachments to the attachment store")
+    replenishment_task = None
+    interval = float(os.environ.get("REPLENISHMENT_INTERVAL_MINUTES", "0") or 0)
+    if interval > 0:
+        logging.info("Replenishment planner every %s minutes", interval)
+        replenishment_task = asyncio.create_task(replenishment_loop(interval))
+    prerender_task = None
+    if PRERENDER_INTERVAL_SECONDS > 0:
+        prerender_task = asyncio.create_task(prerenderer.run(get_conn))
     yield
+    if replenishment_task:
+        replenishment_task.cancel()
+    if prerender_task:
+        prerender_task.cancel()
+    render_service.shutdown()
+    password_hasher.shutdown()
     logging.info("Application shutdown")
 
 
@@ -51,3 +105,4 @@ app.include_router(returns_router)
 app.include_router(warehouse_router)
 app.include_router(users_router)
 app.include_router(partners_router)
+app.include_router(documents_router)
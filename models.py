@@ -7,6 +7,9 @@ class LoginRequest(BaseModel):
     username: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class ActionEnum(str, Enum):
     pull = "pull"
     push = "push"
@@ -107,6 +110,8 @@ class StockAdjustmentIn(BaseModel):
     location_id: int
     delta: int
     reason: str
+    lot_id: Optional[int] = None
+    route_id: Optional[int] = None
 
 class ManufacturingOrderCreate(BaseModel):
     item_id: int
@@ -119,6 +124,13 @@ class LotCreate(BaseModel):
     lot_number: str
     notes: str = ""
 
+class LotGenealogyLink(BaseModel):
+    parent_lot_id: int
+    child_lot_id: int
+    event_model: Literal['manufacturing_order', 'unbuild_order', 'return_order', 'purchase_order', 'stock_adjustment']
+    event_id: Optional[int] = None
+    quantity: Optional[float] = None
+
 class PurchaseLabelRequest(BaseModel):
     rate_id: str
 
@@ -142,4 +154,25 @@ class SubscriptionCreate(BaseModel):
     item_id: int
     partner_id: int
     service_window_id: int
-    start_date: Optional[str] = None
\ No newline at end of file
+    start_date: Optional[str] = None
+
+class UnitConversionIn(BaseModel):
+    quantity: float
+    from_unit_id: int
+    to_unit_id: int
+
+class LandedCostLineIn(BaseModel):
+    item_id: int
+    quantity: float = 1
+    price: Optional[float] = None  # overrides the price list price
+
+class LandedCostRequest(BaseModel):
+    country_id: int
+    price_list_id: int
+    lines: List[LandedCostLineIn]
+
+class BatchPrintRequest(BaseModel):
+    document: Literal['label', 'shipment']
+    sale_order_ids: List[int] = []
+    picking_ids: List[int] = []  # a wave: every sale order with a move in these pickings
+    format: Literal['pdf', 'zpl'] = 'pdf'  # zpl: labels only
@@ -0,0 +1,78 @@
+"""Password hashing in a dedicated process pool.
+
+bcrypt is slow on purpose and holds the GIL while it runs, so logins verified
+in the request threadpool compete with order traffic. PasswordHasher runs
+hashing and verification in a bounded process pool instead; when its queue
+is full LoginBusy is raised, so a burst of logins is shed rather than queued
+without limit.
+
+The bcrypt cost is BCRYPT_ROUNDS; a stored hash with any other cost is
+replaced by a fresh one on the next successful login.
+"""
+import os
+from functools import lru_cache
+
+from process_pool import BoundedProcessPool, QueueFull
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+
+class LoginBusy(QueueFull):
+    pass
+
+
+@lru_cache(maxsize=None)
+def crypt_context(rounds):
+    from passlib.context import CryptContext
+    # min = max = default, so a hash with any other cost needs an update
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds,
+    )
+
+
+def hash_password(password, rounds=BCRYPT_ROUNDS):
+    return crypt_context(rounds).hash(password)
+
+
+def verify_password(password, password_hash, rounds=BCRYPT_ROUNDS):
+    """(valid, new hash when the stored one has another cost, else None)."""
+    if not password_hash:
+        return False, None
+    return crypt_context(rounds).verify_and_update(password, password_hash)
+
+
+class PasswordHasher(BoundedProcessPool):
+    full_error = LoginBusy
+    waiting = "password checks"
+
+    def __init__(self, max_workers=2, max_queue=200, rounds=BCRYPT_ROUNDS, executor=None,
+                 hash_func=hash_password, verify_func=verify_password):
+        super().__init__(max_workers, max_queue, executor)
+        self.rounds = rounds
+        self.hash_func = hash_func
+        self.verify_func = verify_func
+
+    async def hash(self, password):
+        return await self.run(self.hash_func, password, self.rounds)
+
+    async def verify(self, password, password_hash):
+        """(valid, replacement hash or None), see verify_password."""
+        return await self.run(self.verify_func, password, password_hash, self.rounds)
+
+    def metrics(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "rounds": self.rounds,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.finished,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get("AUTH_WORKERS", "2")),
+    max_queue=int(os.environ.get("AUTH_MAX_QUEUE", "200")),
+)
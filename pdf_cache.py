@@ -0,0 +1,180 @@
+"""On-disk cache of generated PDF documents.
+
+A document is keyed by a hash of its kind, the template version and the rows
+it is rendered from, so a reprint of an unchanged document is served from disk
+and any change to its source rows (or to a template) produces a new key.
+Files are evicted least recently used first once the directory exceeds
+PDF_CACHE_MAX_MB. The render workers and the API process share the directory,
+so each keeps only a running estimate of its size and re-reads the real size
+from disk every ``rescan_every`` puts and before evicting anything.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Bump when a document layout changes so cached files are not served any more
+TEMPLATE_VERSION = 2
+
+RESCAN_PUTS = 20
+
+
+def _plain(value):
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+
+def document_key(kind, *sources):
+    """Hash of a document kind and the rows (sqlite3.Row, dicts, lists, scalars) it is rendered from."""
+    payload = json.dumps([kind, TEMPLATE_VERSION, _plain(list(sources))], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    def __init__(self, directory, max_bytes, rescan_every=RESCAN_PUTS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_every = rescan_every
+        self._lock = threading.Lock()
+        self._size = None
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pdf")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def open(self, key):
+        """The cached file opened for reading, or None; for documents too large to read at once."""
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return f
+
+    def put(self, key, data):
+        self._store(key, lambda f: f.write(data))
+
+    def put_file(self, key, src):
+        """Copy ``src`` from its current position into the cache without reading it into memory."""
+        self._store(key, lambda f: shutil.copyfileobj(src, f))
+
+    def _store(self, key, write):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                written = f.tell()
+            path = self._path(key)
+            with self._lock:
+                try:
+                    replaced = os.stat(path).st_size
+                except OSError:
+                    replaced = 0
+                os.replace(tmp, path)
+                self._puts += 1
+                if self._size is None or self._puts % self.rescan_every == 0:
+                    self._size = sum(size for _, size, _ in self._entries())
+                else:
+                    self._size += written - replaced
+                if self._size > self.max_bytes:
+                    self._evict()
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(".pdf"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            # Another process already evicted, or the running estimate was off
+            self._size = total
+            return
+        # Evict down to 90% so every put past the limit does not rescan the directory
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            entries = self._entries()
+            return {
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+pdf_cache = PdfCache(
+    os.environ.get("PDF_CACHE_DIR") or os.path.join(PROJECT_ROOT, "data", "pdf_cache"),
+    int(float(os.environ.get("PDF_CACHE_MAX_MB", "256")) * 1024 * 1024),
+)
@@ -0,0 +1,184 @@
+"""Streaming picking lists for single pickings and whole waves.
+
+The move lines are read from move_lines_by_picking in fixed-size batches and
+drawn straight onto the canvas row by row, so neither the rows nor a platypus
+table of the whole wave is ever held in memory. Each picking starts on a new
+page; the finished PDF is spooled to a temporary file and streamed back.
+Single picking lists also go through the document cache, where the
+pre-renderer puts them when a picking becomes ready to work; those carry the
+print date only, so a cached list is valid for the day.
+"""
+import hashlib
+import json
+import tempfile
+from datetime import date, datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from batch_print import SPOOL_MAX_BYTES
+from document_data import iter_picking_lines, load_pickings
+from pdf_cache import document_key, pdf_cache
+from utils import add_page_number, draw_qr_code
+
+LINE_BATCH_SIZE = 500
+ROW_HEIGHT = 14
+MARGIN = 30
+FONT_SIZE = 8
+
+# (header, width, row -> text)
+COLUMNS = [
+    ("#", 25, lambda index, row: str(index)),
+    ("Item", 135, lambda index, row: row["item_name"]),
+    ("SKU", 60, lambda index, row: row["item_sku"]),
+    ("Lot", 80, lambda index, row: row["lot_code"] or ""),
+    ("From", 70, lambda index, row: row["source_code"] or ""),
+    ("To", 70, lambda index, row: row["target_code"] or ""),
+    ("Qty", 35, lambda index, row: f"{row['quantity']:g}"),
+    ("Done", 35, lambda index, row: f"{row['done_quantity'] or 0:g}"),
+    ("OK", 25, lambda index, row: ""),
+]
+
+
+def picking_code(picking):
+    return f"PICK-{picking['id']}"
+
+
+def _fit(text, width, font="Helvetica"):
+    """``text`` cut to fit ``width`` points."""
+    text = str(text)
+    if stringWidth(text, font, FONT_SIZE) <= width:
+        return text
+    while text and stringWidth(text + "…", font, FONT_SIZE) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+class PickingListWriter:
+    def __init__(self, out, printed):
+        self.c = canvas.Canvas(out, pagesize=A4, pageCompression=1)
+        self.printed = printed
+        self.width, self.height = A4
+        self.picking = None
+        self.y = None
+        self.page_open = False
+
+    def _end_page(self):
+        if self.page_open:
+            add_page_number(self.c, None)
+            self.c.showPage()
+            self.page_open = False
+
+    def _header(self, continued):
+        c, picking = self.c, self.picking
+        draw_qr_code(c, picking_code(picking), self.width, self.height)
+        y = self.height - MARGIN - 12
+        c.setFont("Helvetica-Bold", 14)
+        title = f"Picking List {picking_code(picking)}" + (" (continued)" if continued else "")
+        c.drawString(MARGIN, y, title)
+        c.setFont("Helvetica", 9)
+        for text in (
+            f"Type: {picking['type']}   Status: {picking['status']}   Origin: {picking['origin'] or '-'}",
+            f"From zone: {picking['source_zone'] or '-'}   To zone: {picking['target_zone'] or '-'}",
+            f"Partner: {picking['partner_name'] or '-'}   Scheduled: {picking['scheduled_at'] or '-'}",
+            f"Printed: {self.printed}",
+        ):
+            y -= 13
+            c.drawString(MARGIN, y, text)
+        self.y = min(y, self.height - MARGIN - 80) - 20
+        self._column_headers()
+
+    def _column_headers(self):
+        c = self.c
+        c.setFillGray(0.85)
+        c.rect(MARGIN, self.y - 4, sum(width for _, width, _ in COLUMNS), ROW_HEIGHT, stroke=0, fill=1)
+        c.setFillGray(0)
+        c.setFont("Helvetica-Bold", FONT_SIZE)
+        x = MARGIN
+        for header, width, _ in COLUMNS:
+            c.drawString(x + 2, self.y, header)
+            x += width
+        self.y -= ROW_HEIGHT
+
+    def start_picking(self, picking):
+        self._end_page()
+        self.picking = picking
+        self.page_open = True
+        self._header(continued=False)
+
+    def row(self, index, row):
+        if self.y < MARGIN + 20:
+            self._end_page()
+            self.page_open = True
+            self._header(continued=True)
+        c = self.c
+        c.setFont("Helvetica", FONT_SIZE)
+        x = MARGIN
+        for _, width, value in COLUMNS:
+            c.drawString(x + 2, self.y, _fit(value(index, row), width - 4))
+            x += width
+        c.setLineWidth(0.3)
+        c.line(MARGIN, self.y - 4, x, self.y - 4)
+        self.y -= ROW_HEIGHT
+
+    def empty(self):
+        self.c.setFont("Helvetica-Oblique", FONT_SIZE)
+        self.c.drawString(MARGIN, self.y, "No move lines")
+
+    def finish(self):
+        self._end_page()
+        self.c.save()
+
+
+def render_picking_lists(conn, picking_ids, batch_size=LINE_BATCH_SIZE, printed=None, out=None):
+    """Render the pickings into ``out`` or a spooled temp file; returns (file rewound, pickings, line count)."""
+    pickings = {picking["id"]: picking for picking in load_pickings(conn, picking_ids)}
+    if out is None:
+        out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    writer = PickingListWriter(out, printed or datetime.now().strftime("%Y-%m-%d %H:%M"))
+    pending = list(pickings.values())
+    line_count = 0
+    index = 0
+    for row in iter_picking_lines(conn, list(pickings), batch_size):
+        while writer.picking is None or writer.picking["id"] != row["picking_id"]:
+            # Pickings without lines still get their (empty) page
+            if writer.picking is not None and index == 0:
+                writer.empty()
+            writer.start_picking(pending.pop(0))
+            index = 0
+        index += 1
+        line_count += 1
+        writer.row(index, row)
+    if writer.picking is not None and index == 0:
+        writer.empty()
+    for picking in pending:
+        writer.start_picking(picking)
+        writer.empty()
+    writer.finish()
+    out.seek(0)
+    return out, list(pickings.values()), line_count
+
+
+def picking_list_pdf(conn, picking_id):
+    """(PDF file rewound, line count) of one picking list through the document cache, or None when it does not exist.
+
+    The key hashes the print date, the picking and its lines as they are
+    streamed, so any change to them renders a new list. The caller closes the file.
+    """
+    pickings = load_pickings(conn, [picking_id])
+    if not pickings:
+        return None
+    printed = date.today().isoformat()
+    sha = hashlib.sha256(document_key("picking_list", printed, pickings).encode("utf-8"))
+    line_count = 0
+    for row in iter_picking_lines(conn, [picking_id]):
+        sha.update(json.dumps(tuple(row), default=str).encode("utf-8"))
+        line_count += 1
+    key = sha.hexdigest()
+    pdf = pdf_cache.open(key)
+    if pdf is None:
+        pdf, _, _ = render_picking_lists(conn, [picking_id], printed=printed)
+        pdf_cache.put_file(key, pdf)
+        pdf.seek(0)
+    return pdf, line_count
@@ -0,0 +1,122 @@
+"""Pre-render picking documents into the document cache ahead of printing.
+
+Triggers on picking and move_line status changes queue documents in the
+document_prerender table (one row per document, so repeated changes coalesce).
+The Prerenderer drains that table through the render service; the builders
+store their PDFs in the document cache, so the print button is served from
+disk.
+
+Printing on demand keeps priority: a round only takes as many documents as
+the render service has room for below ``max_in_flight``, and while the
+service is busy the poll interval doubles (up to ``max_delay``) and the
+documents stay queued.
+"""
+import asyncio
+import logging
+import os
+
+from render_service import RenderQueueFull, render_service
+
+# Seconds between rounds while idle; 0 disables pre-rendering
+PRERENDER_INTERVAL_SECONDS = float(os.environ.get("PRERENDER_INTERVAL_SECONDS", "2"))
+PRERENDER_MAX_IN_FLIGHT = int(os.environ.get("PRERENDER_MAX_IN_FLIGHT", "2"))
+
+
+def claim_prerenders(conn, limit):
+    """Remove and return the oldest queued documents as (kind, doc_id, queued_at) rows.
+
+    Committed at once, so no write lock is held while the documents render.
+    """
+    rows = conn.execute("""
+        DELETE FROM document_prerender
+        WHERE rowid IN (SELECT rowid FROM document_prerender ORDER BY queued_at, rowid LIMIT ?)
+        RETURNING kind, doc_id, queued_at
+    """, (limit,)).fetchall()
+    conn.commit()
+    return rows
+
+
+def requeue_prerender(conn, row):
+    """Put a claimed document back, keeping its place in the queue."""
+    conn.execute(
+        "INSERT OR IGNORE INTO document_prerender (kind, doc_id, queued_at) VALUES (?, ?, ?)",
+        (row["kind"], row["doc_id"], row["queued_at"]),
+    )
+    conn.commit()
+
+
+def prerender_backlog(conn):
+    return conn.execute("SELECT COUNT(*) FROM document_prerender").fetchone()[0]
+
+
+class Prerenderer:
+    def __init__(self, service, max_in_flight=PRERENDER_MAX_IN_FLIGHT,
+                 interval=PRERENDER_INTERVAL_SECONDS, max_delay=None):
+        self.service = service
+        self.max_in_flight = max_in_flight
+        self.interval = interval
+        self.max_delay = max_delay or interval * 16
+        self.rendered = 0
+        self.failed = 0
+        self.deferred = 0
+        self.backlog = 0
+
+    def room(self):
+        """Documents the render service can take now without delaying on-demand prints."""
+        busy = self.service.in_flight + self.service.queued
+        return max(0, min(self.max_in_flight, self.service.max_workers) - busy)
+
+    async def _render(self, conn, row):
+        try:
+            result = await self.service.render(row["kind"], row["doc_id"])
+        except RenderQueueFull:
+            self.deferred += 1
+            requeue_prerender(conn, row)
+            return
+        except KeyError:
+            result = {"status": 404, "detail": "Unknown document kind"}
+        if result["status"] == 200:
+            self.rendered += 1
+        else:
+            # Not retried: the next status change queues the document again
+            self.failed += 1
+            logging.warning("Pre-rendering %s %s failed: %s", row["kind"], row["doc_id"], result.get("detail"))
+
+    async def run_once(self, conn):
+        """Render one round of queued documents; returns how many were taken (0 while the service is busy)."""
+        room = self.room()
+        if room == 0:
+            self.deferred += 1
+            self.backlog = prerender_backlog(conn)
+            return 0
+        rows = claim_prerenders(conn, room)
+        await asyncio.gather(*(self._render(conn, row) for row in rows))
+        self.backlog = prerender_backlog(conn)
+        return len(rows)
+
+    async def run(self, get_conn):
+        delay = self.interval
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                with get_conn() as conn:
+                    taken = await self.run_once(conn)
+            except Exception:
+                logging.exception("Pre-render round failed")
+                taken = 0
+            if taken == 0 and self.backlog:
+                delay = min(delay * 2, self.max_delay)
+            else:
+                delay = self.interval
+
+    def metrics(self):
+        return {
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "deferred": self.deferred,
+            "backlog": self.backlog,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+prerenderer = Prerenderer(render_service)
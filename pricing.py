@@ -0,0 +1,56 @@
+"""Materialized price-and-tax matrix.
+
+price_matrix holds one row per (price_list, country, item, unit). Each row has
+the net price, the summed tax percent and fixed amounts, and the gross price.
+price_matrix_tax keeps the individual tax components. Triggers on the catalog
+tables queue the affected items in price_matrix_refresh, which rebuilds their
+rows in the same transaction as the change, so readers never write and never
+parse GROUP_CONCAT strings.
+"""
+
+
+def refresh_price_matrix(conn):
+    """Rebuild the whole matrix, e.g. after loading a catalog with the triggers missing."""
+    conn.execute("DELETE FROM price_matrix_tax")
+    conn.execute("DELETE FROM price_matrix")
+    conn.execute("INSERT OR IGNORE INTO price_matrix_refresh (item_id) SELECT DISTINCT item_id FROM price_list_item")
+
+
+def load_price_matrix(conn, price_list_id, country_id, item_ids=None):
+    """Matrix rows for one price list and country as {item_id: row}, taxes included.
+
+    When an item has several units, the row with the lowest unit_id is used.
+    """
+    params = [price_list_id, country_id]
+    item_filter = ""
+    if item_ids is not None:
+        item_ids = list(item_ids)
+        if not item_ids:
+            return {}
+        item_filter = f" AND pm.item_id IN ({','.join('?' for _ in item_ids)})"
+        params += item_ids
+
+    rows = {}
+    for row in conn.execute(f"""
+        SELECT pm.item_id, pm.unit_id, pm.net_price, pm.tax_percent, pm.tax_fixed_amount, pm.gross_price,
+               c.code AS currency_code, c.symbol AS currency_symbol,
+               u.symbol AS unit_symbol, u.name AS unit_name
+        FROM price_matrix pm
+        JOIN currency c ON c.id = pm.currency_id
+        LEFT JOIN unit u ON u.id = pm.unit_id
+        WHERE pm.price_list_id = ? AND pm.country_id IS ?{item_filter}
+        ORDER BY pm.item_id, pm.unit_id
+    """, params):
+        if row["item_id"] not in rows:
+            rows[row["item_id"]] = dict(row, taxes=[])
+
+    for tax in conn.execute(f"""
+        SELECT pm.item_id, pm.tax_id, pm.percent, pm.label, pm.fixed_amount,
+               pm.fixed_currency_code, pm.fixed_unit_symbol
+        FROM price_matrix_tax pm
+        WHERE pm.price_list_id = ? AND pm.country_id IS ?{item_filter}
+        ORDER BY pm.item_id, pm.tax_id
+    """, params):
+        if tax["item_id"] in rows:
+            rows[tax["item_id"]]["taxes"].append(dict(tax))
+    return rows
@@ -0,0 +1,192 @@
+"""Document builders run in the render service's worker processes.
+
+Every print endpoint awaits ``render_service.render(kind, ...)`` and the
+builder registered for that kind runs here, so reportlab never holds the GIL
+of the API process. Builders return a Response, or a result dict naming a file
+for the API process to stream (cached picking lists, merged batches); a missing
+document raises HTTPException(404), which the worker passes back as a status.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from batch_print import render_batch
+from database import get_conn
+from document_data import (
+    load_manufacturing_order, load_manufacturing_receipt, load_purchase_order, load_quotation,
+    load_return_order, load_sale_order, load_sale_order_delivery,
+)
+from documents import document_pdf
+from labels import ZPL_MEDIA_TYPE, load_label, render_label
+from picking_print import picking_code, picking_list_pdf, render_picking_lists
+
+# kind -> (loader, 404 detail, Content-Disposition with the order code)
+PDFS = {
+    "sale_order": (load_sale_order, "Order not found", "inline; filename=sales_order_{code}.pdf"),
+    "sale_order_delivery": (
+        load_sale_order_delivery, "Order not found", 'attachment; filename="delivery_note_{code}.pdf"'
+    ),
+    "quotation": (load_quotation, "Quotation not found", "inline; filename=quotation_{code}.pdf"),
+    "purchase_order": (
+        load_purchase_order, "Purchase order not found", 'attachment; filename="purchase_order_{code}.pdf"'
+    ),
+    "purchase_order_delivery": (
+        load_purchase_order, "Purchase order not found", 'attachment; filename="purchase_delivery_note_{code}.pdf"'
+    ),
+    "return_order": (load_return_order, "Return order not found", 'attachment; filename="return_order_{code}.pdf"'),
+    "return_bill": (load_return_order, "Return order not found", 'attachment; filename="return_bill_{code}.pdf"'),
+    "manufacturing_order": (
+        load_manufacturing_order, "Manufacturing order not found", "inline; filename=manufacturing_order_{code}.pdf"
+    ),
+    "manufacturing_receipt": (
+        load_manufacturing_receipt, "Manufacturing order not found", "inline; filename=manufacturing_receipt_{code}.pdf"
+    ),
+}
+
+# label kind -> (404 detail, file name prefix)
+LABELS = {
+    "sale_order": ("Sale order not found", "sale_label"),
+    "purchase_order": ("Purchase order not found", "purchase_label"),
+    "return_order": ("Return order not found", "return_label"),
+}
+
+
+def document_response(kind, doc_id):
+    loader, not_found, disposition = PDFS[kind]
+    with get_conn() as conn:
+        data = loader(conn, doc_id)
+    if not data:
+        raise HTTPException(status_code=404, detail=not_found)
+    headers = {"Content-Disposition": disposition.format(code=data["order"]["code"])}
+    return Response(document_pdf(kind, data), media_type="application/pdf", headers=headers)
+
+
+def label_response(kind, doc_id, output="pdf"):
+    """The A7 label as PDF, or as ZPL for thermal printers."""
+    not_found, prefix = LABELS[kind]
+    with get_conn() as conn:
+        label = load_label(conn, kind, doc_id)
+    if not label:
+        raise HTTPException(status_code=404, detail=not_found)
+    code, sender, receiver = label
+    body, media_type, extension = render_label(kind, code, sender, receiver, output)
+    return Response(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{prefix}_{code}.{extension}"'}
+    )
+
+
+def sale_order_pdf(order_id):
+    return document_response("sale_order", order_id)
+
+
+def sale_order_delivery_pdf(order_id):
+    return document_response("sale_order_delivery", order_id)
+
+
+def quotation_pdf(quotation_id):
+    return document_response("quotation", quotation_id)
+
+
+def purchase_order_pdf(order_id):
+    return document_response("purchase_order", order_id)
+
+
+def purchase_order_delivery_pdf(order_id):
+    return document_response("purchase_order_delivery", order_id)
+
+
+def return_order_pdf(return_order_id):
+    return document_response("return_order", return_order_id)
+
+
+def return_bill_pdf(return_order_id):
+    return document_response("return_bill", return_order_id)
+
+
+def manufacturing_order_pdf(mo_id):
+    return document_response("manufacturing_order", mo_id)
+
+
+def manufacturing_receipt_pdf(mo_id):
+    return document_response("manufacturing_receipt", mo_id)
+
+
+def sale_order_label(sale_order_id, output="pdf"):
+    return label_response("sale_order", sale_order_id, output)
+
+
+def purchase_order_label(purchase_order_id, output="pdf"):
+    return label_response("purchase_order", purchase_order_id, output)
+
+
+def return_label(return_order_id, output="pdf"):
+    return label_response("return_order", return_order_id, output)
+
+
+def picking_list(picking_id):
+    """One picking list; a cached file is streamed by the API process rather than sent back through the pool."""
+    with get_conn() as conn:
+        result = picking_list_pdf(conn, picking_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Picking not found")
+    pdf, line_count = result
+    headers = {
+        "Content-Disposition": f'inline; filename="picking_list_PICK-{picking_id}.pdf"',
+        "X-Line-Count": str(line_count),
+    }
+    with pdf:
+        if isinstance(pdf.name, str):
+            return {"status": 200, "path": pdf.name, "media_type": "application/pdf", "headers": headers}
+        return Response(pdf.read(), media_type="application/pdf", headers=headers)
+
+
+@contextmanager
+def _merged_file(suffix):
+    """Named temp file for a merged document, handed to the API process by path; removed if rendering fails."""
+    out = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        with out:
+            yield out
+    except BaseException:
+        os.remove(out.name)
+        raise
+
+
+def picking_wave(picking_ids):
+    """Picking lists of a wave as one PDF, each picking on its own pages."""
+    with _merged_file(".pdf") as out:
+        with get_conn() as conn:
+            _, pickings, line_count = render_picking_lists(conn, picking_ids, out=out)
+        if not pickings:
+            raise HTTPException(status_code=404, detail="Picking not found")
+    name = picking_code(pickings[0]) if len(pickings) == 1 else f"wave_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    return {
+        "status": 200, "path": out.name, "temporary": True, "media_type": "application/pdf",
+        "headers": {
+            "Content-Disposition": f'inline; filename="picking_list_{name}.pdf"',
+            "X-Line-Count": str(line_count),
+        },
+    }
+
+
+def sale_order_batch(document, sale_order_ids, picking_ids, output="pdf"):
+    """Labels or delivery notes of many sale orders as one PDF (or ZPL stream)."""
+    with _merged_file("." + output) as out:
+        with get_conn() as conn:
+            _, count = render_batch(conn, document, sale_order_ids, picking_ids, output, out=out)
+        if not count:
+            raise HTTPException(status_code=404, detail="No sale orders found")
+    return {
+        "status": 200, "path": out.name, "temporary": True,
+        "media_type": ZPL_MEDIA_TYPE if output == "zpl" else "application/pdf",
+        "headers": {
+            "Content-Disposition": f'attachment; filename="batch_{document}_{datetime.now().strftime("%Y%m%d%H%M%S")}.{output}"',
+            "X-Document-Count": str(count),
+        },
+    }
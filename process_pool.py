@@ -0,0 +1,76 @@
+"""Bounded process pool for CPU-bound work such as PDF builds and bcrypt.
+
+Both hold the GIL, so running them in the request threadpool starves every
+other request. A BoundedProcessPool runs calls in worker processes instead: at
+most ``max_workers`` at once, up to ``max_queue`` more waiting for a worker,
+beyond that ``full_error`` is raised so a burst is shed rather than queued
+without limit. Subclasses set ``full_error`` and what their calls are called
+in that error's message.
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+class QueueFull(Exception):
+    pass
+
+
+class BoundedProcessPool:
+    full_error = QueueFull
+    waiting = "calls"
+
+    def __init__(self, max_workers, max_queue, executor=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = executor
+        self._executor_lock = threading.Lock()
+        self._slots = None
+        self.in_flight = 0
+        self.queued = 0
+        self.finished = 0
+        self.rejected = 0
+        self.worker_seconds = 0.0
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: workers must not inherit the server's threads and sockets
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def check_room(self):
+        """Raise ``full_error`` when every worker is busy and ``max_queue`` calls already wait."""
+        if self._slots is not None and self.queued >= self.max_queue and self._slots.locked():
+            self.rejected += 1
+            raise self.full_error(f"{self.queued} {self.waiting} already waiting")
+
+    async def run(self, func, *args):
+        """``func(*args)`` in a worker process, once a worker is free."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        self.check_room()
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+            self.finished += 1
+            self.worker_seconds += time.perf_counter() - started
@@ -0,0 +1,70 @@
+"""In-process cache of rarely changing reference data.
+
+Countries, currencies, languages, units, zones and the company address are
+loaded in one pass (at startup and after any change) and served from
+dictionaries. Triggers bump reference_version on every write to these tables,
+so a request costs one primary-key read to check the snapshot is current.
+"""
+from cache import VersionedCache
+
+_snapshot_cache = VersionedCache(maxsize=1)
+
+
+class ReferenceData:
+    def __init__(self, conn):
+        self.currencies = {row["id"]: dict(row) for row in conn.execute(
+            "SELECT id, code, symbol, name, rel_to_usd FROM currency ORDER BY id")}
+        self.currency_rates = {row["code"]: row["rel_to_usd"] for row in self.currencies.values()}
+        self.languages = {row["id"]: dict(row) for row in conn.execute(
+            "SELECT id, code, name, native_name, rtl FROM language ORDER BY id")}
+        self.countries = {row["id"]: dict(row) for row in conn.execute("""
+            SELECT id, code, name, official_name, eu_member, currency_id, vat_standard, region,
+                   phone_code, language_id, active
+            FROM country ORDER BY id
+        """)}
+        self.countries_by_code = {country["code"]: country for country in self.countries.values()}
+        self.units = {row["id"]: dict(row) for row in conn.execute(
+            "SELECT id, name, symbol, category, description FROM unit ORDER BY id")}
+        self.unit_categories = {unit["symbol"]: unit["category"] for unit in self.units.values()}
+        self.zones = {row["id"]: dict(row) for row in conn.execute("SELECT * FROM zone ORDER BY id")}
+        company = conn.execute("SELECT name FROM company LIMIT 1").fetchone()
+        self.company_name = company["name"] if company else None
+        address = conn.execute("""
+            SELECT c.name AS company_name, c.logo_url, c.website,
+                p.street, p.zip, p.city, co.name AS country, p.phone, p.email
+            FROM company c
+            JOIN partner p ON c.partner_id = p.id
+            LEFT JOIN country co ON p.country_id = co.id
+            LIMIT 1
+        """).fetchone()
+        self.company_address = dict(address) if address else None
+
+    def country_info(self, code):
+        """The /country-info payload for a country code, or None."""
+        country = self.countries_by_code.get(code)
+        if country is None:
+            return None
+        currency = self.currencies.get(country["currency_id"])
+        language = self.languages.get(country["language_id"])
+        return {
+            "id": country["id"],
+            "code": country["code"],
+            "name": country["name"],
+            "currency_code": currency["code"] if currency else "EUR",
+            "currency_symbol": currency["symbol"] if currency else "€",
+            "language": language["code"] if language else "en",
+        }
+
+
+def reference_versions(conn):
+    return tuple(tuple(row) for row in conn.execute("SELECT name, version FROM reference_version ORDER BY name"))
+
+
+def get_reference_data(conn):
+    """The current snapshot, reloaded if any reference table changed since it was built."""
+    version = reference_versions(conn)
+    data = _snapshot_cache.get("reference", version)
+    if data is None:
+        data = ReferenceData(conn)
+        _snapshot_cache.set("reference", version, data)
+    return data
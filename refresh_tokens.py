@@ -0,0 +1,61 @@
+"""Long-lived refresh tokens, so devices renew access tokens without a password.
+
+A refresh token is an opaque random string; only its SHA-256 is stored.
+Every use rotates it: the presented token is revoked and a new one issued.
+Presenting a token that was already revoked revokes all of that user's
+tokens, since it means the token was copied.
+"""
+import hashlib
+import os
+import secrets
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def create_refresh_token(conn, user_id):
+    token = secrets.token_urlsafe(32)
+    conn.execute(
+        "INSERT INTO refresh_token (user_id, token_hash, expires_at) VALUES (?, ?, datetime('now', ?))",
+        (user_id, _token_hash(token), f"+{REFRESH_TOKEN_EXPIRE_DAYS} days"),
+    )
+    return token
+
+
+def rotate_refresh_token(conn, token):
+    """(user row, new refresh token) for a valid token, which is revoked; None otherwise."""
+    row = conn.execute("""
+        SELECT rt.id, rt.revoked_at, rt.expires_at > datetime('now') AS valid, u.id AS user_id, u.username
+        FROM refresh_token rt
+        JOIN user u ON u.id = rt.user_id
+        WHERE rt.token_hash = ?
+    """, (_token_hash(token),)).fetchone()
+    if not row or not row["valid"]:
+        return None
+    if row["revoked_at"] is not None:
+        revoke_user_refresh_tokens(conn, row["user_id"])
+        return None
+    cur = conn.execute(
+        "UPDATE refresh_token SET revoked_at = CURRENT_TIMESTAMP WHERE id = ? AND revoked_at IS NULL", (row["id"],)
+    )
+    if cur.rowcount == 0:
+        return None
+    return row, create_refresh_token(conn, row["user_id"])
+
+
+def revoke_refresh_token(conn, token, user_id):
+    """Revoke ``token`` if it belongs to ``user_id``; another user's token is left alone."""
+    conn.execute(
+        "UPDATE refresh_token SET revoked_at = CURRENT_TIMESTAMP"
+        " WHERE token_hash = ? AND user_id = ? AND revoked_at IS NULL",
+        (_token_hash(token), user_id),
+    )
+
+
+def revoke_user_refresh_tokens(conn, user_id):
+    conn.execute(
+        "UPDATE refresh_token SET revoked_at = CURRENT_TIMESTAMP WHERE user_id = ? AND revoked_at IS NULL", (user_id,)
+    )
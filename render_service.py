@@ -0,0 +1,178 @@
+"""Process-pool rendering service for reportlab documents.
+
+PDF builds are CPU bound and hold the GIL, so a burst of print requests in
+the request threadpool starves the order APIs. The service runs the existing
+document builders in worker processes instead:
+
+- ``await service.render(kind, doc_id)`` waits for the PDF (synchronous mode,
+  what every print endpoint does);
+- ``service.submit(kind, doc_id)`` returns a job id whose result is fetched later.
+
+At most ``max_workers`` builds run at once; up to ``max_queue`` more wait for a
+worker, beyond that RenderQueueFull is raised. Finished jobs are kept for
+JOB_TTL_SECONDS (at most MAX_JOBS of them).
+"""
+import asyncio
+import importlib
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from process_pool import BoundedProcessPool, QueueFull
+
+# kind -> (module, builder); builders take the document id and return a Response or bytes
+DOCUMENTS = {
+    "sale_order": ("print_documents", "sale_order_pdf"),
+    "sale_order_delivery": ("print_documents", "sale_order_delivery_pdf"),
+    "sale_order_label": ("print_documents", "sale_order_label"),
+    "quotation": ("print_documents", "quotation_pdf"),
+    "purchase_order": ("print_documents", "purchase_order_pdf"),
+    "purchase_order_delivery": ("print_documents", "purchase_order_delivery_pdf"),
+    "purchase_order_label": ("print_documents", "purchase_order_label"),
+    "return_order": ("print_documents", "return_order_pdf"),
+    "return_bill": ("print_documents", "return_bill_pdf"),
+    "return_label": ("print_documents", "return_label"),
+    "manufacturing_order": ("print_documents", "manufacturing_order_pdf"),
+    "manufacturing_receipt": ("print_documents", "manufacturing_receipt_pdf"),
+    "picking_list": ("print_documents", "picking_list"),
+}
+
+# Merged documents of many ids; only the print endpoints render these, not /render/{kind}/{doc_id}
+BATCH_DOCUMENTS = {
+    "picking_wave": ("print_documents", "picking_wave"),
+    "sale_order_batch": ("print_documents", "sale_order_batch"),
+}
+
+MAX_JOBS = 500
+JOB_TTL_SECONDS = 15 * 60
+
+
+class RenderQueueFull(QueueFull):
+    pass
+
+
+def render_in_worker(module_name, function_name, *args):
+    """Run one builder; returns a plain dict so the result pickles across processes.
+
+    A builder may return such a dict itself, e.g. with a ``path`` to stream
+    instead of a ``body`` when the document is already a file on disk.
+    """
+    try:
+        builder = getattr(importlib.import_module(module_name), function_name)
+        result = builder(*args)
+    except Exception as e:
+        status = getattr(e, "status_code", 500)
+        return {"status": status, "detail": getattr(e, "detail", None) or str(e)}
+    if isinstance(result, dict):
+        return result
+    if isinstance(result, (bytes, bytearray)):
+        return {"status": 200, "body": bytes(result), "media_type": "application/pdf", "headers": {}}
+    headers = {
+        key: value for key, value in result.headers.items()
+        if key.lower() not in ("content-length", "content-type")
+    }
+    return {
+        "status": result.status_code, "body": _response_body(result),
+        "media_type": result.media_type, "headers": headers,
+    }
+
+
+def _response_body(response):
+    if hasattr(response, "body"):
+        return response.body
+
+    # Streamed documents (picking lists) are collected here, in the worker
+    async def collect():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(collect())
+
+
+class RenderService(BoundedProcessPool):
+    full_error = RenderQueueFull
+    waiting = "documents"
+
+    def __init__(self, max_workers=None, max_queue=100, documents=DOCUMENTS, batch_documents=BATCH_DOCUMENTS,
+                 executor=None):
+        super().__init__(max_workers or max(1, (os.cpu_count() or 2) // 2), max_queue, executor)
+        self.documents = documents
+        self.batch_documents = batch_documents
+        self._jobs = OrderedDict()
+        self._tasks = set()
+        self.completed = 0
+        self.failed = 0
+
+    async def render(self, kind, *args):
+        """Render and return the worker result dict; raises KeyError for an unknown kind."""
+        if kind in self.documents:
+            module_name, function_name = self.documents[kind]
+        else:
+            module_name, function_name = self.batch_documents[kind]
+        try:
+            result = await self.run(render_in_worker, module_name, function_name, *args)
+        except RenderQueueFull:
+            raise
+        except Exception as e:
+            result = {"status": 500, "detail": str(e)}
+        if result["status"] == 200:
+            self.completed += 1
+        else:
+            self.failed += 1
+        return result
+
+    def submit(self, kind, doc_id):
+        """Start a background render and return its job id."""
+        if kind not in self.documents:
+            raise KeyError(kind)
+        self.check_room()
+        self._expire_jobs()
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "kind": kind, "doc_id": doc_id, "status": "queued",
+               "created_at": time.time(), "finished_at": None, "result": None}
+        self._jobs[job_id] = job
+        task = asyncio.get_running_loop().create_task(self._run_job(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def _run_job(self, job):
+        job["status"] = "running"
+        try:
+            result = await self.render(job["kind"], job["doc_id"])
+        except RenderQueueFull as e:
+            result = {"status": 503, "detail": str(e)}
+        job["result"] = result
+        job["status"] = "done" if result["status"] == 200 else "failed"
+        job["finished_at"] = time.time()
+
+    def job(self, job_id):
+        self._expire_jobs()
+        return self._jobs.get(job_id)
+
+    def _expire_jobs(self):
+        now = time.time()
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            finished = job["finished_at"]
+            if (finished and now - finished > JOB_TTL_SECONDS) or (finished and len(self._jobs) > MAX_JOBS):
+                del self._jobs[job_id]
+
+    def metrics(self):
+        done = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "jobs": len(self._jobs),
+            "avg_render_ms": round(self.worker_seconds * 1000 / done, 1) if done else None,
+        }
+
+
+render_service = RenderService(
+    max_workers=int(os.environ.get("RENDER_WORKERS", "0") or 0) or None,
+    max_queue=int(os.environ.get("RENDER_MAX_QUEUE", "100")),
+)
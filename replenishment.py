@@ -0,0 +1,163 @@
+"""Min/max replenishment planner.
+
+Each stock row carries a ``target_quantity``. The planner sums targets and free
+stock per (item, storage zone) in one set-based query, nets everything already
+on its way into the zone (open moves, draft demand triggers and draft transfer
+order lines) and turns the remaining shortfalls into transfer orders, one per
+source zone and vendor. Confirming them raises the usual demand triggers, so
+'pull' rules move stock internally and 'pull_or_buy' rules end up in purchases.
+"""
+import time
+import uuid
+from collections import OrderedDict
+
+
+SHORTFALL_QUERY = """
+    WITH zone_stock AS (
+        SELECT s.item_id, lz.zone_id,
+               SUM(s.target_quantity) AS target_quantity,
+               SUM(s.quantity - s.reserved_quantity) AS available_quantity
+        FROM stock s
+        JOIN location_zone lz ON lz.location_id = s.location_id
+        JOIN zone z ON z.id = lz.zone_id
+        WHERE z.warehouse_area IN ('yes', 'primary')
+          AND z.inbound_area = 'no'
+          AND z.outbound_area = 'no'
+          AND z.production_area = 'no'
+        GROUP BY s.item_id, lz.zone_id
+    ),
+    done_lines AS (
+        SELECT move_id, SUM(done_quantity) AS done_quantity
+        FROM move_line
+        GROUP BY move_id
+    ),
+    inbound AS (
+        SELECT m.item_id, m.target_id AS zone_id,
+               SUM(m.quantity - IFNULL(d.done_quantity, 0)) AS quantity
+        FROM move m
+        LEFT JOIN done_lines d ON d.move_id = m.id
+        WHERE m.status IN ('draft', 'waiting', 'confirmed', 'assigned')
+        GROUP BY m.item_id, m.target_id
+    ),
+    open_demand AS (
+        SELECT trigger_item_id AS item_id, trigger_zone_id AS zone_id,
+               SUM(trigger_item_quantity) AS quantity
+        FROM trigger
+        WHERE trigger_type = 'demand' AND status = 'draft' AND trigger_zone_id IS NOT NULL
+        GROUP BY trigger_item_id, trigger_zone_id
+    ),
+    draft_transfers AS (
+        SELECT tol.item_id, tol.target_zone_id AS zone_id, SUM(tol.quantity) AS quantity
+        FROM transfer_order_line tol
+        JOIN transfer_order t ON t.id = tol.transfer_order_id
+        WHERE t.status = 'draft'
+        GROUP BY tol.item_id, tol.target_zone_id
+    ),
+    netted AS (
+        SELECT zs.item_id, zs.zone_id, zs.target_quantity, zs.available_quantity,
+               IFNULL(ib.quantity, 0) AS inbound_quantity,
+               IFNULL(od.quantity, 0) + IFNULL(dt.quantity, 0) AS pending_quantity
+        FROM zone_stock zs
+        LEFT JOIN inbound ib ON ib.item_id = zs.item_id AND ib.zone_id = zs.zone_id
+        LEFT JOIN open_demand od ON od.item_id = zs.item_id AND od.zone_id = zs.zone_id
+        LEFT JOIN draft_transfers dt ON dt.item_id = zs.item_id AND dt.zone_id = zs.zone_id
+    )
+    SELECT n.item_id, i.sku, n.zone_id, z.code AS zone_code,
+           n.target_quantity, n.available_quantity, n.inbound_quantity, n.pending_quantity,
+           n.target_quantity - n.available_quantity - n.inbound_quantity - n.pending_quantity AS shortfall,
+           r.id AS rule_id, r.action, r.route_id, r.source_id AS source_zone_id,
+           CASE WHEN r.action = 'pull_or_buy' THEN i.vendor_id END AS vendor_id
+    FROM netted n
+    JOIN item i ON i.id = n.item_id
+    JOIN zone z ON z.id = n.zone_id
+    LEFT JOIN rule r ON r.id = (
+        SELECT r2.id FROM rule r2
+        WHERE r2.active = 1
+          AND r2.action IN ('pull', 'pull_or_buy')
+          AND r2.target_id = n.zone_id
+          AND r2.route_id = COALESCE(i.route_id, z.route_id)
+        ORDER BY r2.id
+        LIMIT 1
+    )
+    WHERE n.target_quantity - n.available_quantity - n.inbound_quantity - n.pending_quantity > 0
+    ORDER BY r.source_id, vendor_id, n.zone_id, n.item_id
+"""
+
+
+def compute_shortfalls(conn):
+    return [dict(row) for row in conn.execute(SHORTFALL_QUERY)]
+
+
+def group_shortfalls(shortfalls):
+    """Group plannable shortfalls per (source zone, vendor); lines without a rule are returned apart."""
+    groups = OrderedDict()
+    unplannable = []
+    for line in shortfalls:
+        if line["rule_id"] is None:
+            unplannable.append(line)
+            continue
+        key = (line["source_zone_id"], line["vendor_id"])
+        groups.setdefault(key, []).append(line)
+    return [
+        {"source_zone_id": source_zone_id, "vendor_id": vendor_id, "lines": lines}
+        for (source_zone_id, vendor_id), lines in groups.items()
+    ], unplannable
+
+
+def plan_replenishment(conn, dry_run=True):
+    """Compute the replenishment plan and, unless ``dry_run``, emit it as confirmed transfer orders."""
+    started = time.perf_counter()
+    shortfalls = compute_shortfalls(conn)
+    groups, unplannable = group_shortfalls(shortfalls)
+    compute_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    transfer_orders = []
+    if not dry_run and groups:
+        transfer_orders = _emit_transfer_orders(conn, groups)
+
+    return {
+        "dry_run": dry_run,
+        "compute_ms": compute_ms,
+        "shortfalls": len(shortfalls),
+        "groups": groups,
+        "unplannable": unplannable,
+        "transfer_orders": transfer_orders,
+    }
+
+
+def _emit_transfer_orders(conn, groups):
+    warehouse_partner_id = conn.execute("""
+        SELECT c.partner_id
+        FROM warehouse w
+        JOIN company c ON c.id = w.company_id
+        ORDER BY w.id
+        LIMIT 1
+    """).fetchone()[0]
+
+    transfer_orders = []
+    for group in groups:
+        code = f"RPL-{uuid.uuid4().hex[:8].upper()}"
+        transfer_order_id = conn.execute("""
+            INSERT INTO transfer_order (status, origin, partner_id, code)
+            VALUES ('draft', ?, ?, ?)
+        """, (
+            f"Replenishment from zone {group['source_zone_id']}",
+            group["vendor_id"] or warehouse_partner_id,
+            code,
+        )).lastrowid
+        conn.executemany("""
+            INSERT INTO transfer_order_line (transfer_order_id, item_id, quantity, target_zone_id, route_id)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (transfer_order_id, line["item_id"], line["shortfall"], line["zone_id"], line["route_id"])
+            for line in group["lines"]
+        ])
+        transfer_orders.append({"transfer_order_id": transfer_order_id, "code": code, "lines": len(group["lines"])})
+
+    # Confirm in one statement; trg_transfer_order_confirmed raises the demand triggers
+    placeholders = ",".join("?" for _ in transfer_orders)
+    conn.execute(
+        f"UPDATE transfer_order SET status = 'confirmed' WHERE id IN ({placeholders})",
+        [to["transfer_order_id"] for to in transfer_orders]
+    )
+    return transfer_orders
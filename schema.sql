@@ -3,9 +3,11 @@ PRAGMA recursive_triggers = ON;
 -- Create Bill of Material
 CREATE TABLE IF NOT EXISTS bom (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
-    file BLOB,
+    file BLOB,                 -- legacy inline content, moved to the attachment store on startup
     file_name TEXT,
     file_type TEXT,
+    file_sha256 TEXT,          -- content address in the attachment store
+    file_size INTEGER,
     instructions TEXT NOT NULL
 );
 
@@ -92,6 +94,14 @@ CREATE TABLE IF NOT EXISTS unit_conversion (
     FOREIGN KEY(to_unit_id) REFERENCES unit(id)
 );
 
+-- Reference data versions: one counter per cached reference table group, bumped by triggers
+CREATE TABLE IF NOT EXISTS reference_version (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO reference_version (name, version) VALUES ('unit', 0), ('reference', 0);
+
 -- Discount Table
 CREATE TABLE IF NOT EXISTS discount (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -125,6 +135,51 @@ CREATE TABLE IF NOT EXISTS price_list_item (
     FOREIGN KEY(unit_id) REFERENCES unit(id)
 );
 
+-- Catalog version: bumped by triggers whenever data behind the /items catalog changes
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0);
+
+-- Price matrix: net, tax and gross price per (price list, country, item, unit), kept current per item by the trg_price_matrix_* triggers
+CREATE TABLE IF NOT EXISTS price_matrix (
+    price_list_id INTEGER NOT NULL,
+    country_id INTEGER, -- NULL for price lists without a country
+    item_id INTEGER NOT NULL,
+    unit_id INTEGER NOT NULL,
+    currency_id INTEGER NOT NULL,
+    net_price REAL NOT NULL,
+    tax_percent REAL NOT NULL DEFAULT 0, -- sum of the percent taxes
+    tax_fixed_amount REAL NOT NULL DEFAULT 0, -- sum of the fixed taxes
+    gross_price REAL NOT NULL,
+    FOREIGN KEY(price_list_id) REFERENCES price_list(id),
+    FOREIGN KEY(country_id) REFERENCES country(id),
+    FOREIGN KEY(item_id) REFERENCES item(id),
+    FOREIGN KEY(unit_id) REFERENCES unit(id),
+    FOREIGN KEY(currency_id) REFERENCES currency(id)
+);
+
+-- Tax components behind each price_matrix row
+CREATE TABLE IF NOT EXISTS price_matrix_tax (
+    price_list_id INTEGER NOT NULL,
+    country_id INTEGER,
+    item_id INTEGER NOT NULL,
+    tax_id INTEGER NOT NULL,
+    percent REAL NOT NULL,
+    label TEXT,
+    fixed_amount REAL,
+    fixed_currency_code TEXT,
+    fixed_unit_symbol TEXT,
+    FOREIGN KEY(tax_id) REFERENCES tax(id)
+);
+
+-- Items whose price_matrix rows must be rebuilt; a row is processed and removed by trg_price_matrix_refresh
+CREATE TABLE IF NOT EXISTS price_matrix_refresh (
+    item_id INTEGER PRIMARY KEY
+);
+
 -- Create item
 CREATE TABLE IF NOT EXISTS item (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -152,7 +207,9 @@ CREATE TABLE IF NOT EXISTS item (
     is_assemblable INTEGER DEFAULT 0 CHECK(is_assemblable IN (0,1)),
     is_disassemblable INTEGER DEFAULT 0 CHECK(is_disassemblable IN (0,1)),
     service_window_id INTEGER,
+    unit_id INTEGER,                  -- stock unit: stock and line quantities are in it; NULL = Piece
     FOREIGN KEY(route_id) REFERENCES route(id),
+    FOREIGN KEY(unit_id) REFERENCES unit(id),
     FOREIGN KEY(vendor_id) REFERENCES partner(id),
     FOREIGN KEY(cost_currency_id) REFERENCES currency(id),
     FOREIGN KEY(purchase_currency_id) REFERENCES currency(id),
@@ -160,6 +217,15 @@ CREATE TABLE IF NOT EXISTS item (
     FOREIGN KEY(service_window_id) REFERENCES service_window(id)
 );
 
+-- Full-text index over item name, sku, barcode and description (external content, kept in sync by triggers)
+CREATE VIRTUAL TABLE IF NOT EXISTS item_fts USING fts5(
+    name, sku, barcode, description,
+    content='item',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
 -- Create lot
 CREATE TABLE IF NOT EXISTS lot (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -173,6 +239,32 @@ CREATE TABLE IF NOT EXISTS lot (
     FOREIGN KEY(item_id) REFERENCES item(id)
 );
 
+-- Lot genealogy: direct parent -> child links from consumption/production events
+CREATE TABLE IF NOT EXISTS lot_genealogy (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_lot_id INTEGER NOT NULL,
+    child_lot_id INTEGER NOT NULL,
+    event_model TEXT NOT NULL CHECK (event_model IN ('manufacturing_order', 'unbuild_order', 'return_order', 'purchase_order', 'stock_adjustment')),
+    event_id INTEGER,
+    quantity REAL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(parent_lot_id, child_lot_id, event_model, event_id),
+    CHECK (parent_lot_id != child_lot_id),
+    FOREIGN KEY(parent_lot_id) REFERENCES lot(id),
+    FOREIGN KEY(child_lot_id) REFERENCES lot(id)
+);
+
+-- Lot closure: every (ancestor, descendant) pair with its shortest distance,
+-- maintained on lot_genealogy insert so traces are a single indexed lookup
+CREATE TABLE IF NOT EXISTS lot_closure (
+    ancestor_lot_id INTEGER NOT NULL,
+    descendant_lot_id INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor_lot_id, descendant_lot_id),
+    FOREIGN KEY(ancestor_lot_id) REFERENCES lot(id),
+    FOREIGN KEY(descendant_lot_id) REFERENCES lot(id)
+) WITHOUT ROWID;
+
 -- Add this to your schema.sql
 CREATE TABLE IF NOT EXISTS carrier_label (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -180,6 +272,8 @@ CREATE TABLE IF NOT EXISTS carrier_label (
     lot_id INTEGER, -- lot linking quotation line to label
     label_pdf BLOB,
     label_url TEXT,
+    label_sha256 TEXT, -- label file in the local label store (file_store.py), fetched once from label_url
+    label_size INTEGER,
     tracking_number TEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     carrier_id INTEGER,
@@ -335,6 +429,17 @@ CREATE TABLE IF NOT EXISTS user (
     FOREIGN KEY(company_id) REFERENCES company(id)
 );
 
+-- Refresh tokens: only the SHA-256 of the token is stored; rotated on every use
+CREATE TABLE IF NOT EXISTS refresh_token (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    token_hash TEXT UNIQUE NOT NULL,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(user_id) REFERENCES user(id) ON DELETE CASCADE
+);
+
 DROP TABLE IF EXISTS subscription;
 CREATE TABLE IF NOT EXISTS subscription (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -344,7 +449,11 @@ CREATE TABLE IF NOT EXISTS subscription (
     service_window_id INTEGER NOT NULL,
     start_date DATE NOT NULL,
     end_date DATE NOT NULL,
-    terms_conditions BLOB,     -- terms and conditions as a BLOB (e.g. PDF)
+    terms_conditions BLOB,     -- legacy inline terms, moved to the attachment store on startup
+    terms_name TEXT,
+    terms_type TEXT,
+    terms_sha256 TEXT,         -- terms and conditions (e.g. PDF) in the attachment store
+    terms_size INTEGER,
     FOREIGN KEY(item_id) REFERENCES item(id),
     FOREIGN KEY(partner_id) REFERENCES partner(id),
     FOREIGN KEY(lot_id) REFERENCES lot(id),
@@ -438,12 +547,27 @@ CREATE TABLE IF NOT EXISTS stock_adjustment (
     reason TEXT,
     route_id INTEGER, -- optional route for this adjustment
     partner_id INTEGER,
+    batch_id INTEGER, -- set when posted through a stock adjustment batch
+    origin_model TEXT, -- the document that consumed or produced the stock, e.g. 'manufacturing_order'
+    origin_id INTEGER,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY(item_id) REFERENCES item(id),
     FOREIGN KEY(location_id) REFERENCES location(id),
     FOREIGN KEY(lot_id) REFERENCES lot(id),
     FOREIGN KEY(partner_id) REFERENCES partner(id),
-    FOREIGN KEY(route_id) REFERENCES route(id)
+    FOREIGN KEY(route_id) REFERENCES route(id),
+    FOREIGN KEY(batch_id) REFERENCES stock_adjustment_batch(id)
+);
+
+-- Stock adjustment batch: while a batch is 'open', the per-row intervention
+-- resolution on stock and supply triggers is paused; see inventory.py
+CREATE TABLE IF NOT EXISTS stock_adjustment_batch (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL CHECK (status IN ('open','done')) DEFAULT 'open',
+    reason TEXT,
+    created_by TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    done_at DATETIME
 );
 
 -- Create picking
@@ -517,6 +641,15 @@ CREATE TABLE IF NOT EXISTS move_line (
     FOREIGN KEY(lot_id) REFERENCES lot(id)
 );
 
+-- Documents to pre-render into the PDF cache, queued by triggers on picking and move_line status changes.
+-- One row per document: a document queued again before it is rendered is only re-stamped.
+CREATE TABLE IF NOT EXISTS document_prerender (
+    kind TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    queued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (kind, doc_id)
+);
+
 CREATE TABLE IF NOT EXISTS quotation (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     code TEXT UNIQUE NOT NULL,
@@ -535,11 +668,19 @@ CREATE TABLE IF NOT EXISTS quotation (
 
     notes TEXT,
     priority INTEGER NOT NULL DEFAULT 0,
+    amount_untaxed REAL,              -- totals engine (totals.py): net after discount
+    amount_discount REAL,
+    amount_tax REAL,
+    amount_total REAL,
+    totals_currency_id INTEGER,
+    totals_stale INTEGER NOT NULL DEFAULT 1 CHECK (totals_stale IN (0,1)),
+    totals_catalog_version INTEGER,   -- catalog_version the totals were computed at
     FOREIGN KEY(partner_id) REFERENCES partner(id),
     FOREIGN KEY(currency_id) REFERENCES currency(id),
     FOREIGN KEY(tax_id) REFERENCES tax(id),
     FOREIGN KEY(discount_id) REFERENCES discount(id),
     FOREIGN KEY(price_list_id) REFERENCES price_list(id),
+    FOREIGN KEY(totals_currency_id) REFERENCES currency(id),
     FOREIGN KEY(partner_id) REFERENCES partner(id)
 );
 
@@ -558,6 +699,10 @@ CREATE TABLE IF NOT EXISTS quotation_line (
     cost_currency_id INTEGER,         -- NEW: currency for cost
     returned_quantity REAL DEFAULT 0,
     description TEXT,
+    amount_net REAL,                  -- totals engine (totals.py), in the document's totals currency
+    amount_discount REAL,
+    amount_tax REAL,
+    amount_total REAL,
     FOREIGN KEY(quotation_id) REFERENCES quotation(id),
     FOREIGN KEY(item_id) REFERENCES item(id),
     FOREIGN KEY(route_id) REFERENCES route(id),
@@ -580,6 +725,14 @@ CREATE TABLE IF NOT EXISTS sale_order (
     price_list_id INTEGER,            -- NEW: price list for this order
     quotation_id INTEGER NOT NULL,
     priority INTEGER NOT NULL DEFAULT 0,
+    amount_untaxed REAL,              -- totals engine (totals.py): net after discount
+    amount_discount REAL,
+    amount_tax REAL,
+    amount_total REAL,
+    totals_currency_id INTEGER,
+    totals_stale INTEGER NOT NULL DEFAULT 1 CHECK (totals_stale IN (0,1)),
+    totals_catalog_version INTEGER,   -- catalog_version the totals were computed at
+    FOREIGN KEY(totals_currency_id) REFERENCES currency(id),
     FOREIGN KEY(partner_id) REFERENCES partner(id),
     FOREIGN KEY(currency_id) REFERENCES currency(id),
     FOREIGN KEY(tax_id) REFERENCES tax(id),
@@ -603,6 +756,10 @@ CREATE TABLE IF NOT EXISTS order_line (
     cost_currency_id INTEGER,         -- NEW: currency for cost
     returned_quantity REAL DEFAULT 0,
     description TEXT,
+    amount_net REAL,                  -- totals engine (totals.py), in the document's totals currency
+    amount_discount REAL,
+    amount_tax REAL,
+    amount_total REAL,
     FOREIGN KEY(order_id) REFERENCES sale_order(id),
     FOREIGN KEY(item_id) REFERENCES item(id),
     FOREIGN KEY(route_id) REFERENCES route(id),
@@ -856,6 +1013,19 @@ CREATE TABLE IF NOT EXISTS intervention (
     FOREIGN KEY(move_id) REFERENCES move(id)
 );
 
+-- Registry of unresolved interventions, maintained by triggers on intervention
+CREATE TABLE IF NOT EXISTS open_intervention (
+    intervention_id INTEGER PRIMARY KEY,
+    move_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    zone_id INTEGER NOT NULL, -- source zone of the blocked move
+    lot_id INTEGER,
+    priority INTEGER NOT NULL DEFAULT 0,
+    created_at DATETIME,
+    FOREIGN KEY(intervention_id) REFERENCES intervention(id),
+    FOREIGN KEY(move_id) REFERENCES move(id)
+);
+
 -- Debug log table for tracking events
 CREATE TABLE IF NOT EXISTS debug_log (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1255,17 +1425,54 @@ CREATE TRIGGER trg_manufacturing_order_done_consume_and_produce
 AFTER UPDATE OF status ON manufacturing_order
 WHEN NEW.status = 'done' AND OLD.status != 'done'
 BEGIN
-    -- 1. Consume BOM components
-    INSERT INTO stock_adjustment (item_id, location_id, lot_id, delta, reason)
+    -- 1. Consume BOM components. Lines without a fixed lot take lot-tracked stock at the
+    --    production location oldest lot first, up to the needed quantity; whatever that
+    --    stock does not cover (untracked items) is consumed without a lot
+    INSERT INTO stock_adjustment (item_id, location_id, lot_id, delta, reason, origin_model, origin_id)
     SELECT
-        bl.item_id,
+        item_id,
         NEW.manufacturing_location_id,
-        bl.lot_id,
-        -1 * bl.quantity * NEW.quantity,
-        'Consumed for MO ' || NEW.code
-    FROM bom_line bl
-    JOIN item i ON i.bom_id = bl.bom_id
-    WHERE i.id = NEW.item_id;
+        lot_id,
+        -1 * quantity,
+        'Consumed for MO ' || NEW.code,
+        'manufacturing_order',
+        NEW.id
+    FROM (
+        SELECT item_id, lot_id, MIN(available, needed - allocated_before) AS quantity
+        FROM (
+            SELECT
+                bl.item_id,
+                s.lot_id,
+                s.quantity AS available,
+                bl.quantity * NEW.quantity AS needed,
+                COALESCE(SUM(s.quantity) OVER (
+                    PARTITION BY bl.id ORDER BY s.lot_id, s.id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                ), 0) AS allocated_before
+            FROM bom_line bl
+            JOIN item i ON i.bom_id = bl.bom_id
+            JOIN stock s ON s.item_id = bl.item_id
+                AND s.location_id = NEW.manufacturing_location_id
+                AND s.lot_id IS NOT NULL
+                AND s.quantity > 0
+            WHERE i.id = NEW.item_id AND bl.lot_id IS NULL
+        )
+        WHERE allocated_before < needed
+        UNION ALL
+        SELECT
+            bl.item_id,
+            bl.lot_id,
+            bl.quantity * NEW.quantity - CASE WHEN bl.lot_id IS NULL THEN IFNULL((
+                SELECT SUM(s.quantity) FROM stock s
+                WHERE s.item_id = bl.item_id
+                  AND s.location_id = NEW.manufacturing_location_id
+                  AND s.lot_id IS NOT NULL
+                  AND s.quantity > 0
+            ), 0) ELSE 0 END AS quantity
+        FROM bom_line bl
+        JOIN item i ON i.bom_id = bl.bom_id
+        WHERE i.id = NEW.item_id
+    )
+    WHERE quantity > 0;
 
     -- 2. Create a new lot for the finished product
     INSERT INTO lot (item_id, lot_number, origin_model, origin_id, quality_control_status, notes)
@@ -1279,14 +1486,16 @@ BEGIN
     );
 
     -- 3. Stock adjustment for finished product at production location with new lot and route_id
-    INSERT INTO stock_adjustment (item_id, location_id, lot_id, delta, reason, route_id)
+    INSERT INTO stock_adjustment (item_id, location_id, lot_id, delta, reason, route_id, origin_model, origin_id)
     VALUES (
         NEW.item_id,
         NEW.manufacturing_location_id,
         (SELECT id FROM lot WHERE origin_model = 'manufacturing_order' AND origin_id = NEW.id ORDER BY id DESC LIMIT 1),
         NEW.quantity,
         'Produced by MO ' || NEW.code,
-        (SELECT id FROM route WHERE name = 'Manufacturing Output')
+        (SELECT id FROM route WHERE name = 'Manufacturing Output'),
+        'manufacturing_order',
+        NEW.id
     );
 END;
 
@@ -1319,6 +1528,84 @@ BEGIN
 END;
 
 
+-- Trigger: on a genealogy link, connect all ancestors of the parent with all descendants of the child
+DROP TRIGGER IF EXISTS trg_lot_genealogy_closure;
+CREATE TRIGGER trg_lot_genealogy_closure
+AFTER INSERT ON lot_genealogy
+BEGIN
+    INSERT INTO lot_closure (ancestor_lot_id, descendant_lot_id, depth)
+    SELECT a.lot_id, d.lot_id, a.depth + d.depth + 1
+    FROM (
+        SELECT ancestor_lot_id AS lot_id, depth FROM lot_closure WHERE descendant_lot_id = NEW.parent_lot_id
+        UNION ALL
+        SELECT NEW.parent_lot_id, 0
+    ) a
+    CROSS JOIN (
+        SELECT descendant_lot_id AS lot_id, depth FROM lot_closure WHERE ancestor_lot_id = NEW.child_lot_id
+        UNION ALL
+        SELECT NEW.child_lot_id, 0
+    ) d
+    WHERE a.lot_id != d.lot_id
+    ON CONFLICT(ancestor_lot_id, descendant_lot_id) DO UPDATE SET depth = MIN(depth, excluded.depth);
+END;
+
+-- Trigger: a lot produced by an MO descends from the component lots its consumption took
+DROP TRIGGER IF EXISTS trg_lot_genealogy_manufacturing_order;
+CREATE TRIGGER trg_lot_genealogy_manufacturing_order
+AFTER INSERT ON lot
+WHEN NEW.origin_model = 'manufacturing_order'
+BEGIN
+    INSERT OR IGNORE INTO lot_genealogy (parent_lot_id, child_lot_id, event_model, event_id, quantity)
+    SELECT sa.lot_id, NEW.id, 'manufacturing_order', NEW.origin_id, -1 * SUM(sa.delta)
+    FROM stock_adjustment sa
+    WHERE sa.origin_model = 'manufacturing_order'
+      AND sa.origin_id = NEW.origin_id
+      AND sa.lot_id IS NOT NULL
+      AND sa.delta < 0
+    GROUP BY sa.lot_id;
+END;
+
+-- Trigger: a returned lot descends from the lots shipped for the originating sale order
+DROP TRIGGER IF EXISTS trg_lot_genealogy_return_order;
+CREATE TRIGGER trg_lot_genealogy_return_order
+AFTER INSERT ON lot
+WHEN NEW.origin_model = 'return_order'
+BEGIN
+    INSERT OR IGNORE INTO lot_genealogy (parent_lot_id, child_lot_id, event_model, event_id)
+    SELECT DISTINCT shipped.lot_id, NEW.id, 'return_order', ro.id
+    FROM return_order ro
+    JOIN (
+        SELECT ol.order_id AS sale_order_id, ol.lot_id
+        FROM order_line ol
+        WHERE ol.item_id = NEW.item_id AND ol.lot_id IS NOT NULL
+        UNION
+        SELECT t.origin_id, ml.lot_id
+        FROM trigger t
+        JOIN move m ON m.trigger_id = t.id
+        JOIN move_line ml ON ml.move_id = m.id
+        WHERE t.origin_model = 'sale_order' AND ml.item_id = NEW.item_id AND ml.lot_id IS NOT NULL
+    ) shipped ON shipped.sale_order_id = ro.origin_id
+    WHERE ro.id = NEW.origin_id
+      AND ro.origin_model = 'sale_order'
+      AND shipped.lot_id != NEW.id;
+END;
+
+-- Trigger: components recovered by an unbuild order descend from the unbuilt lot
+DROP TRIGGER IF EXISTS trg_lot_genealogy_unbuild_order;
+CREATE TRIGGER trg_lot_genealogy_unbuild_order
+AFTER UPDATE OF status ON unbuild_order
+WHEN NEW.status = 'done' AND OLD.status != 'done' AND NEW.lot_id IS NOT NULL
+BEGIN
+    INSERT OR IGNORE INTO lot_genealogy (parent_lot_id, child_lot_id, event_model, event_id, quantity)
+    SELECT NEW.lot_id, bl.lot_id, 'unbuild_order', NEW.id, bl.quantity * NEW.quantity
+    FROM bom_line bl
+    JOIN item i ON i.bom_id = bl.bom_id
+    WHERE i.id = NEW.item_id
+      AND bl.lot_id IS NOT NULL
+      AND bl.lot_id != NEW.lot_id;
+END;
+
+
 DROP TRIGGER IF EXISTS trg_return_order_confirmed_create_unbuild_or_trigger;
 CREATE TRIGGER trg_return_order_confirmed_create_unbuild_or_trigger
 AFTER UPDATE OF status ON return_order
@@ -1511,7 +1798,61 @@ BEGIN
         'draft'
     FROM location_zone lz
     WHERE lz.location_id = NEW.location_id
-      AND NEW.delta > 0;
+      AND NEW.delta > 0
+      AND NEW.batch_id IS NULL; -- batched rows get their supply triggers when the batch is closed
+END;
+
+
+-- Open-intervention registry: one row per unresolved intervention, keyed by
+-- (item_id, zone_id, lot_id) of its move so stock changes find blocked moves
+-- through an index instead of scanning intervention/move
+DROP TRIGGER IF EXISTS trg_open_intervention_insert;
+CREATE TRIGGER trg_open_intervention_insert
+AFTER INSERT ON intervention
+WHEN NEW.resolved = 0
+BEGIN
+    INSERT OR REPLACE INTO open_intervention (intervention_id, move_id, item_id, zone_id, lot_id, priority, created_at)
+    SELECT NEW.id, m.id, m.item_id, m.source_id, m.lot_id, IFNULL(NEW.priority, 0), NEW.created_at
+    FROM move m
+    WHERE m.id = NEW.move_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_open_intervention_resolve;
+CREATE TRIGGER trg_open_intervention_resolve
+AFTER UPDATE OF resolved ON intervention
+WHEN NEW.resolved = 1
+BEGIN
+    DELETE FROM open_intervention WHERE intervention_id = NEW.id;
+END;
+
+DROP TRIGGER IF EXISTS trg_open_intervention_reopen;
+CREATE TRIGGER trg_open_intervention_reopen
+AFTER UPDATE OF resolved ON intervention
+WHEN NEW.resolved = 0 AND OLD.resolved = 1
+BEGIN
+    INSERT OR REPLACE INTO open_intervention (intervention_id, move_id, item_id, zone_id, lot_id, priority, created_at)
+    SELECT NEW.id, m.id, m.item_id, m.source_id, m.lot_id, IFNULL(NEW.priority, 0), NEW.created_at
+    FROM move m
+    WHERE m.id = NEW.move_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_open_intervention_delete;
+CREATE TRIGGER trg_open_intervention_delete
+AFTER DELETE ON intervention
+BEGIN
+    DELETE FROM open_intervention WHERE intervention_id = OLD.id;
+END;
+
+-- Keep the registry key in sync if a blocked move is re-targeted
+DROP TRIGGER IF EXISTS trg_open_intervention_move_update;
+CREATE TRIGGER trg_open_intervention_move_update
+AFTER UPDATE OF item_id, source_id, lot_id ON move
+BEGIN
+    UPDATE open_intervention
+    SET item_id = NEW.item_id,
+        zone_id = NEW.source_id,
+        lot_id = NEW.lot_id
+    WHERE move_id = NEW.id;
 END;
 
 
@@ -1519,23 +1860,21 @@ END;
 CREATE TRIGGER trg_resolve_intervention_on_stock
 AFTER UPDATE OF quantity ON stock
 WHEN NEW.quantity - NEW.reserved_quantity > 0
+    AND NOT EXISTS (SELECT 1 FROM stock_adjustment_batch WHERE status = 'open')
 BEGIN
     -- Find the highest priority unresolved intervention for this location and item
     UPDATE move
     SET status = 'confirmed'
     WHERE id = (
-        SELECT i.move_id
-        FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
-            AND m.item_id = NEW.item_id
+        SELECT oi.move_id
+        FROM open_intervention oi
+        WHERE oi.zone_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
+            AND oi.item_id = NEW.item_id
             AND (
-                m.lot_id = NEW.lot_id
-                OR (m.lot_id IS NULL)
+                oi.lot_id = NEW.lot_id
+                OR (oi.lot_id IS NULL)
             )
-            AND i.resolved = 0
-            -- AND m.quantity <= NEW.quantity - NEW.reserved_quantity
-        ORDER BY i.priority DESC, i.created_at ASC
+        ORDER BY oi.priority DESC, oi.created_at ASC
         LIMIT 1
     );
 
@@ -1543,20 +1882,19 @@ BEGIN
     UPDATE intervention
     SET resolved = 1
     WHERE move_id = (
-        SELECT i.move_id
-        FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
-            AND m.item_id = NEW.item_id
+        SELECT oi.move_id
+        FROM open_intervention oi
+        JOIN move m ON m.id = oi.move_id
+        WHERE oi.zone_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
+            AND oi.item_id = NEW.item_id
             AND (
-                m.lot_id = NEW.lot_id
-                OR (m.lot_id IS NULL)
+                oi.lot_id = NEW.lot_id
+                OR (oi.lot_id IS NULL)
             )
-            AND i.resolved = 0
             AND (
                 (SELECT IFNULL(SUM(quantity), 0) FROM move_line WHERE move_id = m.id) = m.quantity
             )
-        ORDER BY i.priority DESC, i.created_at ASC
+        ORDER BY oi.priority DESC, oi.created_at ASC
         LIMIT 1
     );
     -- Only create a supply trigger if there is no unresolved intervention for this item/zone/lot
@@ -1585,15 +1923,13 @@ BEGIN
     WHERE lz.location_id = NEW.location_id
     AND (NEW.quantity - NEW.reserved_quantity) > 0
     AND NOT EXISTS (
-        SELECT 1 FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
-        AND m.item_id = NEW.item_id
+        SELECT 1 FROM open_intervention oi
+        WHERE oi.zone_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
+        AND oi.item_id = NEW.item_id
         AND (
-            m.lot_id = NEW.lot_id
-            OR (m.lot_id IS NULL)
+            oi.lot_id = NEW.lot_id
+            OR (oi.lot_id IS NULL)
         )
-        AND i.resolved = 0
     )
     AND NOT EXISTS (
         SELECT 1 FROM move m
@@ -1611,23 +1947,21 @@ END;
 CREATE TRIGGER trg_resolve_intervention_on_stock_insert
 AFTER INSERT ON stock
 WHEN NEW.quantity - NEW.reserved_quantity > 0
+    AND NOT EXISTS (SELECT 1 FROM stock_adjustment_batch WHERE status = 'open')
 BEGIN
     -- Find the highest priority unresolved intervention for this location and item
     UPDATE move
     SET status = 'confirmed'
     WHERE id = (
-        SELECT i.move_id
-        FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
-            AND m.item_id = NEW.item_id
+        SELECT oi.move_id
+        FROM open_intervention oi
+        WHERE oi.zone_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
+            AND oi.item_id = NEW.item_id
             AND (
-                m.lot_id = NEW.lot_id
-                OR (m.lot_id IS NULL)
+                oi.lot_id = NEW.lot_id
+                OR (oi.lot_id IS NULL)
             )
-            AND i.resolved = 0
-            -- AND m.quantity <= NEW.quantity - NEW.reserved_quantity
-        ORDER BY i.priority DESC, i.created_at ASC
+        ORDER BY oi.priority DESC, oi.created_at ASC
         LIMIT 1
     );
 
@@ -1635,18 +1969,17 @@ BEGIN
     UPDATE intervention
     SET resolved = 1
     WHERE move_id = (
-        SELECT i.move_id
-        FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
-            AND m.item_id = NEW.item_id
+        SELECT oi.move_id
+        FROM open_intervention oi
+        JOIN move m ON m.id = oi.move_id
+        WHERE oi.zone_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
+            AND oi.item_id = NEW.item_id
             AND (
-                m.lot_id = NEW.lot_id
-                OR (m.lot_id IS NULL)
+                oi.lot_id = NEW.lot_id
+                OR (oi.lot_id IS NULL)
             )
-            AND i.resolved = 0
             AND (SELECT IFNULL(SUM(quantity), 0) FROM move_line WHERE move_id = m.id) = m.quantity
-        ORDER BY i.priority DESC, i.created_at ASC
+        ORDER BY oi.priority DESC, oi.created_at ASC
         LIMIT 1
     );
 
@@ -1676,16 +2009,13 @@ BEGIN
     WHERE lz.location_id = NEW.location_id
     AND (NEW.quantity - NEW.reserved_quantity) > 0
     AND NOT EXISTS (
-        SELECT 1 FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
-        AND m.item_id = NEW.item_id
+        SELECT 1 FROM open_intervention oi
+        WHERE oi.zone_id IN (SELECT zone_id FROM location_zone WHERE location_id = NEW.location_id)
+        AND oi.item_id = NEW.item_id
         AND (
-            m.lot_id = NEW.lot_id
-            OR (m.lot_id IS NULL)
+            oi.lot_id = NEW.lot_id
+            OR (oi.lot_id IS NULL)
         )
-        AND i.resolved = 0
-
     )
     AND NOT EXISTS (
         SELECT 1 FROM move m
@@ -1704,28 +2034,18 @@ END;
 CREATE TRIGGER trg_supply_trigger_intervene_resolve
 AFTER UPDATE OF status ON trigger
 WHEN NEW.status = 'intervene' AND NEW.trigger_type = 'supply'
+    AND NOT EXISTS (SELECT 1 FROM stock_adjustment_batch WHERE status = 'open')
 BEGIN
     -- Find the highest priority unresolved intervention for this zone/item
     UPDATE move
     SET status = 'confirmed'
     WHERE id = (
-        SELECT i.move_id
-        FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id = NEW.trigger_zone_id
-            AND m.item_id = NEW.trigger_item_id
-            AND (m.lot_id = NEW.trigger_lot_id OR m.lot_id IS NULL)
-            AND i.resolved = 0
-            -- AND m.quantity <= (
-            --     SELECT IFNULL(SUM(quantity - reserved_quantity), 0)
-            --     FROM stock
-            --     WHERE item_id = m.item_id
-            --     AND location_id IN (
-            --         SELECT location_id FROM location_zone WHERE zone_id = NEW.trigger_zone_id
-            --     )
-            --     AND (m.lot_id = NEW.trigger_lot_id OR m.lot_id IS NULL)
-            -- )
-        ORDER BY i.priority DESC, i.created_at ASC
+        SELECT oi.move_id
+        FROM open_intervention oi
+        WHERE oi.zone_id = NEW.trigger_zone_id
+            AND oi.item_id = NEW.trigger_item_id
+            AND (oi.lot_id = NEW.trigger_lot_id OR oi.lot_id IS NULL)
+        ORDER BY oi.priority DESC, oi.created_at ASC
         LIMIT 1
     );
 
@@ -1733,23 +2053,12 @@ BEGIN
     UPDATE intervention
     SET resolved = 1
     WHERE move_id = (
-        SELECT i.move_id
-        FROM intervention i
-        JOIN move m ON m.id = i.move_id
-        WHERE m.source_id = NEW.trigger_zone_id
-            AND m.item_id = NEW.trigger_item_id
-            AND (m.lot_id = NEW.trigger_lot_id OR m.lot_id IS NULL)
-            AND i.resolved = 0
-            -- AND m.quantity <= (
-            --     SELECT IFNULL(SUM(quantity - reserved_quantity), 0)
-            --     FROM stock
-            --     WHERE item_id = m.item_id
-            --     AND location_id IN (
-            --         SELECT location_id FROM location_zone WHERE zone_id = NEW.trigger_zone_id
-            --     )
-            --     AND (m.lot_id = NEW.trigger_lot_id OR m.lot_id IS NULL)
-            -- )
-        ORDER BY i.priority DESC, i.created_at ASC
+        SELECT oi.move_id
+        FROM open_intervention oi
+        WHERE oi.zone_id = NEW.trigger_zone_id
+            AND oi.item_id = NEW.trigger_item_id
+            AND (oi.lot_id = NEW.trigger_lot_id OR oi.lot_id IS NULL)
+        ORDER BY oi.priority DESC, oi.created_at ASC
         LIMIT 1
     );
 END;
@@ -3217,6 +3526,615 @@ BEGIN
 END;
 
 
+-- Catalog version: any change to catalog tables invalidates cached /items responses
+
+DROP TRIGGER IF EXISTS trg_catalog_version_item_insert;
+CREATE TRIGGER trg_catalog_version_item_insert
+AFTER INSERT ON item
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_item_update;
+CREATE TRIGGER trg_catalog_version_item_update
+AFTER UPDATE ON item
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_item_delete;
+CREATE TRIGGER trg_catalog_version_item_delete
+AFTER DELETE ON item
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_price_list_insert;
+CREATE TRIGGER trg_catalog_version_price_list_insert
+AFTER INSERT ON price_list
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_price_list_update;
+CREATE TRIGGER trg_catalog_version_price_list_update
+AFTER UPDATE ON price_list
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_price_list_delete;
+CREATE TRIGGER trg_catalog_version_price_list_delete
+AFTER DELETE ON price_list
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_price_list_item_insert;
+CREATE TRIGGER trg_catalog_version_price_list_item_insert
+AFTER INSERT ON price_list_item
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_price_list_item_update;
+CREATE TRIGGER trg_catalog_version_price_list_item_update
+AFTER UPDATE ON price_list_item
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_price_list_item_delete;
+CREATE TRIGGER trg_catalog_version_price_list_item_delete
+AFTER DELETE ON price_list_item
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_tax_insert;
+CREATE TRIGGER trg_catalog_version_tax_insert
+AFTER INSERT ON tax
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_tax_update;
+CREATE TRIGGER trg_catalog_version_tax_update
+AFTER UPDATE ON tax
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_tax_delete;
+CREATE TRIGGER trg_catalog_version_tax_delete
+AFTER DELETE ON tax
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_currency_insert;
+CREATE TRIGGER trg_catalog_version_currency_insert
+AFTER INSERT ON currency
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_currency_update;
+CREATE TRIGGER trg_catalog_version_currency_update
+AFTER UPDATE ON currency
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_currency_delete;
+CREATE TRIGGER trg_catalog_version_currency_delete
+AFTER DELETE ON currency
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_item_hs_country_insert;
+CREATE TRIGGER trg_catalog_version_item_hs_country_insert
+AFTER INSERT ON item_hs_country
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_item_hs_country_update;
+CREATE TRIGGER trg_catalog_version_item_hs_country_update
+AFTER UPDATE ON item_hs_country
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_item_hs_country_delete;
+CREATE TRIGGER trg_catalog_version_item_hs_country_delete
+AFTER DELETE ON item_hs_country
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_hs_country_tax_insert;
+CREATE TRIGGER trg_catalog_version_hs_country_tax_insert
+AFTER INSERT ON hs_country_tax
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_hs_country_tax_update;
+CREATE TRIGGER trg_catalog_version_hs_country_tax_update
+AFTER UPDATE ON hs_country_tax
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_hs_country_tax_delete;
+CREATE TRIGGER trg_catalog_version_hs_country_tax_delete
+AFTER DELETE ON hs_country_tax
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_discount_insert;
+CREATE TRIGGER trg_catalog_version_discount_insert
+AFTER INSERT ON discount
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_discount_update;
+CREATE TRIGGER trg_catalog_version_discount_update
+AFTER UPDATE ON discount
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS trg_catalog_version_discount_delete;
+CREATE TRIGGER trg_catalog_version_discount_delete
+AFTER DELETE ON discount
+BEGIN
+    UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;
+END;
+
+-- PRICE MATRIX
+-- Every (price list, country) a price applies to: the price list's own country
+-- plus every other country the item has an HS code mapping for. UNION ALL (not
+-- UNION) so an item_id filter reaches the indexes of both arms.
+DROP VIEW IF EXISTS price_matrix_target;
+CREATE VIEW price_matrix_target AS
+SELECT pli.price_list_id, pl.country_id, pli.item_id, pli.unit_id, pl.currency_id, pli.price
+FROM price_list_item pli
+JOIN price_list pl ON pl.id = pli.price_list_id
+UNION ALL
+SELECT pli.price_list_id, ihc.country_id, pli.item_id, pli.unit_id, pl.currency_id, pli.price
+FROM price_list_item pli
+JOIN price_list pl ON pl.id = pli.price_list_id
+JOIN item_hs_country ihc ON ihc.item_id = pli.item_id
+WHERE ihc.country_id IS NOT pl.country_id;
+
+-- Rebuild the matrix rows of one item
+DROP TRIGGER IF EXISTS trg_price_matrix_refresh;
+CREATE TRIGGER trg_price_matrix_refresh
+AFTER INSERT ON price_matrix_refresh
+BEGIN
+    DELETE FROM price_matrix_tax WHERE item_id = NEW.item_id;
+    DELETE FROM price_matrix WHERE item_id = NEW.item_id;
+    INSERT INTO price_matrix_tax (
+        price_list_id, country_id, item_id, tax_id, percent, label,
+        fixed_amount, fixed_currency_code, fixed_unit_symbol
+    )
+    SELECT t.price_list_id, t.country_id, t.item_id, tx.id, tx.percent, tx.label,
+           tx.fixed_amount, cur.code, u.symbol
+    FROM (SELECT DISTINCT price_list_id, country_id, item_id
+          FROM price_matrix_target WHERE item_id = NEW.item_id) t
+    JOIN item_hs_country ihc ON ihc.item_id = t.item_id AND ihc.country_id = t.country_id
+    JOIN hs_country_tax hct ON hct.hs_code_id = ihc.hs_code_id AND hct.country_id = t.country_id
+    JOIN tax tx ON tx.id = hct.tax_id
+    LEFT JOIN currency cur ON cur.id = tx.fixed_currency_id
+    LEFT JOIN unit u ON u.id = tx.fixed_unit_id;
+    INSERT INTO price_matrix (
+        price_list_id, country_id, item_id, unit_id, currency_id,
+        net_price, tax_percent, tax_fixed_amount, gross_price
+    )
+    SELECT t.price_list_id, t.country_id, t.item_id, t.unit_id, t.currency_id,
+           t.price,
+           IFNULL(tt.percent, 0),
+           IFNULL(tt.fixed_amount, 0),
+           t.price + t.price * IFNULL(tt.percent, 0) / 100 + IFNULL(tt.fixed_amount, 0)
+    FROM (SELECT DISTINCT * FROM price_matrix_target WHERE item_id = NEW.item_id) t
+    LEFT JOIN (
+        SELECT price_list_id, country_id, SUM(percent) AS percent, SUM(fixed_amount) AS fixed_amount
+        FROM price_matrix_tax
+        WHERE item_id = NEW.item_id
+        GROUP BY price_list_id, country_id
+    ) tt ON tt.price_list_id = t.price_list_id AND tt.country_id IS t.country_id;
+    DELETE FROM price_matrix_refresh WHERE item_id = NEW.item_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_price_list_item_insert;
+CREATE TRIGGER trg_price_matrix_price_list_item_insert
+AFTER INSERT ON price_list_item
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id) VALUES (NEW.item_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_price_list_item_update;
+CREATE TRIGGER trg_price_matrix_price_list_item_update
+AFTER UPDATE ON price_list_item
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id) SELECT OLD.item_id UNION SELECT NEW.item_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_price_list_item_delete;
+CREATE TRIGGER trg_price_matrix_price_list_item_delete
+AFTER DELETE ON price_list_item
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id) VALUES (OLD.item_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_price_list_update;
+CREATE TRIGGER trg_price_matrix_price_list_update
+AFTER UPDATE OF currency_id, country_id ON price_list
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT DISTINCT item_id FROM price_list_item WHERE price_list_id = NEW.id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_price_list_delete;
+CREATE TRIGGER trg_price_matrix_price_list_delete
+AFTER DELETE ON price_list
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT DISTINCT item_id FROM price_matrix WHERE price_list_id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_item_hs_country_insert;
+CREATE TRIGGER trg_price_matrix_item_hs_country_insert
+AFTER INSERT ON item_hs_country
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id) VALUES (NEW.item_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_item_hs_country_update;
+CREATE TRIGGER trg_price_matrix_item_hs_country_update
+AFTER UPDATE ON item_hs_country
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id) SELECT OLD.item_id UNION SELECT NEW.item_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_item_hs_country_delete;
+CREATE TRIGGER trg_price_matrix_item_hs_country_delete
+AFTER DELETE ON item_hs_country
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id) VALUES (OLD.item_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_hs_country_tax_insert;
+CREATE TRIGGER trg_price_matrix_hs_country_tax_insert
+AFTER INSERT ON hs_country_tax
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT item_id FROM item_hs_country WHERE hs_code_id = NEW.hs_code_id AND country_id = NEW.country_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_hs_country_tax_update;
+CREATE TRIGGER trg_price_matrix_hs_country_tax_update
+AFTER UPDATE ON hs_country_tax
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT item_id FROM item_hs_country WHERE hs_code_id = OLD.hs_code_id AND country_id = OLD.country_id
+    UNION
+    SELECT item_id FROM item_hs_country WHERE hs_code_id = NEW.hs_code_id AND country_id = NEW.country_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_hs_country_tax_delete;
+CREATE TRIGGER trg_price_matrix_hs_country_tax_delete
+AFTER DELETE ON hs_country_tax
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT item_id FROM item_hs_country WHERE hs_code_id = OLD.hs_code_id AND country_id = OLD.country_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_tax_update;
+CREATE TRIGGER trg_price_matrix_tax_update
+AFTER UPDATE OF percent, label, fixed_amount, fixed_currency_id, fixed_unit_id ON tax
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT DISTINCT item_id FROM price_matrix_tax WHERE tax_id = NEW.id;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_currency_update;
+CREATE TRIGGER trg_price_matrix_currency_update
+AFTER UPDATE OF code ON currency
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT DISTINCT item_id FROM price_matrix_tax WHERE fixed_currency_code = OLD.code;
+END;
+
+DROP TRIGGER IF EXISTS trg_price_matrix_unit_update;
+CREATE TRIGGER trg_price_matrix_unit_update
+AFTER UPDATE OF symbol ON unit
+BEGIN
+    INSERT OR IGNORE INTO price_matrix_refresh (item_id)
+    SELECT DISTINCT item_id FROM price_matrix_tax WHERE fixed_unit_symbol = OLD.symbol;
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_unit_insert;
+CREATE TRIGGER trg_reference_version_unit_insert
+AFTER INSERT ON unit
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'unit';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_unit_update;
+CREATE TRIGGER trg_reference_version_unit_update
+AFTER UPDATE ON unit
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'unit';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_unit_delete;
+CREATE TRIGGER trg_reference_version_unit_delete
+AFTER DELETE ON unit
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'unit';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_unit_conversion_insert;
+CREATE TRIGGER trg_reference_version_unit_conversion_insert
+AFTER INSERT ON unit_conversion
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'unit';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_unit_conversion_update;
+CREATE TRIGGER trg_reference_version_unit_conversion_update
+AFTER UPDATE ON unit_conversion
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'unit';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_unit_conversion_delete;
+CREATE TRIGGER trg_reference_version_unit_conversion_delete
+AFTER DELETE ON unit_conversion
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'unit';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_country_insert;
+CREATE TRIGGER trg_reference_version_country_insert
+AFTER INSERT ON country
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_country_update;
+CREATE TRIGGER trg_reference_version_country_update
+AFTER UPDATE ON country
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_country_delete;
+CREATE TRIGGER trg_reference_version_country_delete
+AFTER DELETE ON country
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_currency_insert;
+CREATE TRIGGER trg_reference_version_currency_insert
+AFTER INSERT ON currency
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_currency_update;
+CREATE TRIGGER trg_reference_version_currency_update
+AFTER UPDATE ON currency
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_currency_delete;
+CREATE TRIGGER trg_reference_version_currency_delete
+AFTER DELETE ON currency
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_language_insert;
+CREATE TRIGGER trg_reference_version_language_insert
+AFTER INSERT ON language
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_language_update;
+CREATE TRIGGER trg_reference_version_language_update
+AFTER UPDATE ON language
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_language_delete;
+CREATE TRIGGER trg_reference_version_language_delete
+AFTER DELETE ON language
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_zone_insert;
+CREATE TRIGGER trg_reference_version_zone_insert
+AFTER INSERT ON zone
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_zone_update;
+CREATE TRIGGER trg_reference_version_zone_update
+AFTER UPDATE ON zone
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_zone_delete;
+CREATE TRIGGER trg_reference_version_zone_delete
+AFTER DELETE ON zone
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_company_insert;
+CREATE TRIGGER trg_reference_version_company_insert
+AFTER INSERT ON company
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_company_update;
+CREATE TRIGGER trg_reference_version_company_update
+AFTER UPDATE ON company
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_company_delete;
+CREATE TRIGGER trg_reference_version_company_delete
+AFTER DELETE ON company
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_company_partner_update;
+CREATE TRIGGER trg_reference_version_company_partner_update
+AFTER UPDATE ON partner
+WHEN OLD.id IN (SELECT partner_id FROM company) OR NEW.id IN (SELECT partner_id FROM company)
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_reference_version_company_partner_delete;
+CREATE TRIGGER trg_reference_version_company_partner_delete
+AFTER DELETE ON partner
+WHEN OLD.id IN (SELECT partner_id FROM company)
+BEGIN
+    UPDATE reference_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = 'reference';
+END;
+
+DROP TRIGGER IF EXISTS trg_item_fts_insert;
+CREATE TRIGGER trg_item_fts_insert
+AFTER INSERT ON item
+BEGIN
+    INSERT INTO item_fts (rowid, name, sku, barcode, description)
+    VALUES (NEW.id, NEW.name, NEW.sku, NEW.barcode, NEW.description);
+END;
+
+DROP TRIGGER IF EXISTS trg_item_fts_update;
+CREATE TRIGGER trg_item_fts_update
+AFTER UPDATE OF name, sku, barcode, description ON item
+BEGIN
+    INSERT INTO item_fts (item_fts, rowid, name, sku, barcode, description)
+    VALUES ('delete', OLD.id, OLD.name, OLD.sku, OLD.barcode, OLD.description);
+    INSERT INTO item_fts (rowid, name, sku, barcode, description)
+    VALUES (NEW.id, NEW.name, NEW.sku, NEW.barcode, NEW.description);
+END;
+
+DROP TRIGGER IF EXISTS trg_item_fts_delete;
+CREATE TRIGGER trg_item_fts_delete
+AFTER DELETE ON item
+BEGIN
+    INSERT INTO item_fts (item_fts, rowid, name, sku, barcode, description)
+    VALUES ('delete', OLD.id, OLD.name, OLD.sku, OLD.barcode, OLD.description);
+END;
+
+
+-- Totals of a quotation go stale when its lines or pricing references change
+DROP TRIGGER IF EXISTS trg_quotation_totals_stale_line_insert;
+CREATE TRIGGER trg_quotation_totals_stale_line_insert
+AFTER INSERT ON quotation_line
+BEGIN
+    UPDATE quotation SET totals_stale = 1 WHERE id = NEW.quotation_id AND totals_stale = 0;
+END;
+
+DROP TRIGGER IF EXISTS trg_quotation_totals_stale_line_update;
+CREATE TRIGGER trg_quotation_totals_stale_line_update
+AFTER UPDATE OF quantity, item_id, price, currency_id, price_list_id, quotation_id ON quotation_line
+BEGIN
+    UPDATE quotation SET totals_stale = 1 WHERE id IN (OLD.quotation_id, NEW.quotation_id) AND totals_stale = 0;
+END;
+
+DROP TRIGGER IF EXISTS trg_quotation_totals_stale_line_delete;
+CREATE TRIGGER trg_quotation_totals_stale_line_delete
+AFTER DELETE ON quotation_line
+BEGIN
+    UPDATE quotation SET totals_stale = 1 WHERE id = OLD.quotation_id AND totals_stale = 0;
+END;
+
+DROP TRIGGER IF EXISTS trg_quotation_totals_stale_update;
+CREATE TRIGGER trg_quotation_totals_stale_update
+AFTER UPDATE OF partner_id, currency_id, tax_id, discount_id, price_list_id ON quotation
+BEGIN
+    UPDATE quotation SET totals_stale = 1 WHERE id = NEW.id AND totals_stale = 0;
+END;
+
+-- Totals of a sale_order go stale when its lines or pricing references change
+DROP TRIGGER IF EXISTS trg_sale_order_totals_stale_line_insert;
+CREATE TRIGGER trg_sale_order_totals_stale_line_insert
+AFTER INSERT ON order_line
+BEGIN
+    UPDATE sale_order SET totals_stale = 1 WHERE id = NEW.order_id AND totals_stale = 0;
+END;
+
+DROP TRIGGER IF EXISTS trg_sale_order_totals_stale_line_update;
+CREATE TRIGGER trg_sale_order_totals_stale_line_update
+AFTER UPDATE OF quantity, item_id, price, currency_id, price_list_id, order_id ON order_line
+BEGIN
+    UPDATE sale_order SET totals_stale = 1 WHERE id IN (OLD.order_id, NEW.order_id) AND totals_stale = 0;
+END;
+
+DROP TRIGGER IF EXISTS trg_sale_order_totals_stale_line_delete;
+CREATE TRIGGER trg_sale_order_totals_stale_line_delete
+AFTER DELETE ON order_line
+BEGIN
+    UPDATE sale_order SET totals_stale = 1 WHERE id = OLD.order_id AND totals_stale = 0;
+END;
+
+DROP TRIGGER IF EXISTS trg_sale_order_totals_stale_update;
+CREATE TRIGGER trg_sale_order_totals_stale_update
+AFTER UPDATE OF partner_id, currency_id, tax_id, discount_id, price_list_id ON sale_order
+BEGIN
+    UPDATE sale_order SET totals_stale = 1 WHERE id = NEW.id AND totals_stale = 0;
+END;
+
+-- Pre-render a picking's list (and the delivery notes of its sale orders) once it is ready to be worked
+DROP TRIGGER IF EXISTS trg_picking_prerender_status;
+CREATE TRIGGER trg_picking_prerender_status
+AFTER UPDATE OF status ON picking
+WHEN NEW.status IN ('confirmed', 'assigned') AND OLD.status != NEW.status
+BEGIN
+    INSERT OR REPLACE INTO document_prerender (kind, doc_id) VALUES ('picking_list', NEW.id);
+    INSERT OR REPLACE INTO document_prerender (kind, doc_id)
+    SELECT DISTINCT 'sale_order_delivery', t.origin_id
+    FROM move m
+    JOIN trigger t ON t.id = m.trigger_id
+    WHERE m.picking_id = NEW.id AND NEW.type = 'outbound' AND t.origin_model = 'sale_order';
+END;
+
+-- A move line changing status changes its picking's list
+DROP TRIGGER IF EXISTS trg_move_line_prerender_status;
+CREATE TRIGGER trg_move_line_prerender_status
+AFTER UPDATE OF status ON move_line
+WHEN NEW.status IN ('assigned', 'done') AND OLD.status != NEW.status
+BEGIN
+    INSERT OR REPLACE INTO document_prerender (kind, doc_id)
+    SELECT 'picking_list', m.picking_id
+    FROM move m
+    JOIN picking p ON p.id = m.picking_id
+    WHERE m.id = NEW.move_id AND p.status IN ('confirmed', 'assigned');
+END;
+
+
 -- VIEWS
 -- empty locations view
 CREATE VIEW IF NOT EXISTS empty_locations AS
@@ -3394,6 +4312,12 @@ CREATE INDEX idx_item_bom_id ON item(bom_id);
 CREATE INDEX idx_item_service_window_id ON item(service_window_id);
 
 CREATE INDEX idx_lot_item_id ON lot(item_id);
+CREATE INDEX idx_lot_origin ON lot(origin_model, origin_id);
+CREATE INDEX idx_lot_genealogy_parent_lot_id ON lot_genealogy(parent_lot_id);
+CREATE INDEX idx_lot_genealogy_child_lot_id ON lot_genealogy(child_lot_id);
+CREATE INDEX idx_lot_closure_descendant ON lot_closure(descendant_lot_id, depth);
+CREATE INDEX idx_price_matrix_lookup ON price_matrix(price_list_id, country_id, item_id, unit_id);
+CREATE INDEX idx_price_matrix_tax_lookup ON price_matrix_tax(price_list_id, country_id, item_id, tax_id);
 
 CREATE INDEX idx_carrier_label_mo_id ON carrier_label(mo_id);
 CREATE INDEX idx_carrier_label_lot_id ON carrier_label(lot_id);
@@ -3428,6 +4352,7 @@ CREATE INDEX idx_company_partner_id ON company(partner_id);
 
 CREATE INDEX idx_user_partner_id ON user(partner_id);
 CREATE INDEX idx_user_company_id ON user(company_id);
+CREATE INDEX idx_refresh_token_user_id ON refresh_token(user_id);
 
 CREATE INDEX idx_subscription_item_id ON subscription(item_id);
 CREATE INDEX idx_subscription_lot_id ON subscription(lot_id);
@@ -3454,6 +4379,13 @@ CREATE INDEX idx_stock_adjustment_location_id ON stock_adjustment(location_id);
 CREATE INDEX idx_stock_adjustment_lot_id ON stock_adjustment(lot_id);
 CREATE INDEX idx_stock_adjustment_partner_id ON stock_adjustment(partner_id);
 CREATE INDEX idx_stock_adjustment_route_id ON stock_adjustment(route_id);
+CREATE INDEX idx_stock_adjustment_batch_id ON stock_adjustment(batch_id);
+CREATE INDEX idx_stock_adjustment_origin ON stock_adjustment(origin_model, origin_id);
+CREATE INDEX idx_stock_adjustment_batch_status ON stock_adjustment_batch(status);
+CREATE INDEX idx_stock_adjustment_created_at ON stock_adjustment(created_at, id);
+CREATE INDEX idx_debug_log_created_at ON debug_log(created_at, id);
+CREATE INDEX idx_quotation_totals_stale ON quotation(totals_stale);
+CREATE INDEX idx_sale_order_totals_stale ON sale_order(totals_stale);
 
 CREATE INDEX idx_picking_source_id ON picking(source_id);
 CREATE INDEX idx_picking_target_id ON picking(target_id);
@@ -3470,6 +4402,7 @@ CREATE INDEX idx_move_trigger_id ON move(trigger_id);
 CREATE INDEX idx_move_picking_id ON move(picking_id);
 CREATE INDEX idx_move_route_id ON move(route_id);
 CREATE INDEX idx_move_rule_id ON move(rule_id);
+CREATE INDEX idx_move_item_source ON move(item_id, source_id);
 
 CREATE INDEX idx_move_line_move_id ON move_line(move_id);
 CREATE INDEX idx_move_line_item_id ON move_line(item_id);
@@ -3563,6 +4496,8 @@ CREATE INDEX idx_rule_trigger_trigger_id ON rule_trigger(trigger_id);
 CREATE INDEX idx_rule_trigger_move_id ON rule_trigger(move_id);
 
 CREATE INDEX idx_intervention_move_id ON intervention(move_id);
+CREATE INDEX idx_open_intervention_lookup ON open_intervention(item_id, zone_id, lot_id, priority DESC, created_at);
+CREATE INDEX idx_open_intervention_move_id ON open_intervention(move_id);
 
 CREATE INDEX idx_packing_policy_action ON packing_policy(action);
 CREATE INDEX idx_packing_policy_carrier_id ON packing_policy(carrier_id);
@@ -3945,7 +4880,9 @@ INSERT OR IGNORE INTO unit (name, symbol, category, description) VALUES
 ('Foot', 'ft', 'length', 'Foot');
 
 INSERT OR IGNORE INTO unit (name, symbol, category, description) VALUES
-('Piece', 'pc.', 'units', 'Single item');
+('Piece', 'pc.', 'units', 'Single item'),
+('Pack', 'pk', 'units', 'Pack of 6 pieces'),
+('Carton', 'ctn', 'units', 'Carton of 4 packs');
 
 
 -- Weight conversions
@@ -3957,6 +4894,11 @@ INSERT OR IGNORE INTO unit_conversion (from_unit_id, to_unit_id, conversion_rate
 ((SELECT id FROM unit WHERE symbol='g'), (SELECT id FROM unit WHERE symbol='lb'), 0.00220462),
 ((SELECT id FROM unit WHERE symbol='lb'), (SELECT id FROM unit WHERE symbol='g'), 453.592);
 
+-- Packaging conversions (the reverse and carton -> piece rates are derived by units.py)
+INSERT OR IGNORE INTO unit_conversion (from_unit_id, to_unit_id, conversion_rate) VALUES
+((SELECT id FROM unit WHERE symbol='pk'), (SELECT id FROM unit WHERE symbol='pc.'), 6),
+((SELECT id FROM unit WHERE symbol='ctn'), (SELECT id FROM unit WHERE symbol='pk'), 4);
+
 -- Length conversions
 INSERT OR IGNORE INTO unit_conversion (from_unit_id, to_unit_id, conversion_rate) VALUES
 ((SELECT id FROM unit WHERE symbol='m'), (SELECT id FROM unit WHERE symbol='mm'), 1000),
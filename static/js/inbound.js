@@ -3,10 +3,10 @@ let inboundCart = {};
 let lastConfirmedPOs = []; // Store confirmed PO IDs and vendor info
 
 async function loadInboundItems() {
-    const resp = await fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth('/items');
     const items = await resp.json();
     // Fetch vendors for each item
-    const vendorResp = await fetch('/partners?vendor=1', { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const vendorResp = await fetchWithAuth('/partners?vendor=1');
     const vendors = await vendorResp.json();
     const vendorMap = {};
     vendors.forEach(v => vendorMap[v.id] = v);
@@ -45,9 +45,9 @@ document.getElementById('inbound-buy-btn').onclick = async function() {
     try {
     for (const [vendorId, items] of Object.entries(inboundCart)) {
         // 1. Create purchase order
-        const poResp = await fetch('/purchase-orders/', {
+        const poResp = await fetchWithAuth('/purchase-orders/', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json', Authorization: 'Bearer ' + jwtToken },
+        headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ partner_id: Number(vendorId) })
         });
         const po = await poResp.json();
@@ -64,20 +64,18 @@ document.getElementById('inbound-buy-btn').onclick = async function() {
             cost: item.cost || item.price || 0, // use cost if available, otherwise price
             cost_currency_id: item.cost_currency_id || 1
         }));
-        const lineResp = await fetch(`/purchase-orders/${poId}/lines`, {
+        const lineResp = await fetchWithAuth(`/purchase-orders/${poId}/lines`, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json',
-                Authorization: 'Bearer ' + jwtToken
+                'Content-Type': 'application/json'
             },
             body: JSON.stringify(lines)
         });
         if (!lineResp.ok) throw new Error('Failed to add PO lines');
 
         // 3. Confirm PO
-        const confirmResp = await fetch(`/purchase-orders/${poId}/confirm`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+        const confirmResp = await fetchWithAuth(`/purchase-orders/${poId}/confirm`, {
+        method: 'POST'
         });
         if (!confirmResp.ok) throw new Error('Failed to confirm PO');
         resultHtml += `PO for vendor #${vendorId} created and confirmed!<br>`;
@@ -120,7 +118,7 @@ function renderInboundCart() {
 
 
 async function updatePurchaseOrdersDropdown() {
-    const resp = await fetch('/purchase-orders/draft', { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth('/purchase-orders/draft');
     const data = await resp.json();
     const select = document.getElementById('confirm-po-id');
     select.innerHTML = '';
@@ -135,7 +133,7 @@ async function updatePurchaseOrdersDropdown() {
 };
 
 async function updatePurchaseDownloadDropdown() {
-    const resp = await fetch('/purchase-orders/', { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth('/purchase-orders/');
     const data = await resp.json();
     const select = document.getElementById('download-po-id');
     select.innerHTML = '';
@@ -155,13 +153,13 @@ document.getElementById('download-po-label-btn').onclick = async function() {
     if (!poId) return;
     let code = poId;
     try {
-        const resp = await fetch(`/purchase-orders/${poId}`, { headers: { Authorization: 'Bearer ' + jwtToken } });
+        const resp = await fetchWithAuth(`/purchase-orders/${poId}`);
         if (resp.ok) {
         const order = await resp.json();
         code = order.code || poId;
         }
     } catch (e) {}
-    const resp = await fetch(`/purchase-orders/${poId}/print-label`, { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth(`/purchase-orders/${poId}/print-label`);
     const blob = await resp.blob();
     const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
@@ -177,9 +175,7 @@ document.getElementById('download-po-label-btn').onclick = async function() {
 document.getElementById('download-po-bill-btn').onclick = async function() {
     const poId = document.getElementById('download-po-id').value;
     if (!poId) return;
-    const resp = await fetch(`/purchase-orders/${poId}/print-order`, {
-    headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/purchase-orders/${poId}/print-order`);
     if (!resp.ok) {
     alert('Failed to download purchase order bill');
     return;
@@ -198,9 +194,7 @@ document.getElementById('download-po-bill-btn').onclick = async function() {
 document.getElementById('download-po-shipping-btn').onclick = async function() {
     const poId = document.getElementById('download-po-id').value;
     if (!poId) return;
-    const resp = await fetch(`/purchase-orders/${poId}/print-shipment`, {
-    headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/purchase-orders/${poId}/print-shipment`);
     if (!resp.ok) {
     alert('Failed to download purchase order shipping label');
     return;
@@ -220,9 +214,8 @@ document.getElementById('confirm-po-form').onsubmit = async function(e) {
     e.preventDefault();
     const poId = document.getElementById('confirm-po-id').value;
     try {
-    const resp = await fetch(`/purchase-orders/${poId}/confirm`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+    const resp = await fetchWithAuth(`/purchase-orders/${poId}/confirm`, {
+        method: 'POST'
     });
     const data = await resp.json();
     document.getElementById('po-confirm-result').textContent = resp.ok ? 'Purchase order confirmed!' : data.detail || 'Error';
@@ -238,9 +231,8 @@ document.getElementById('cancel-po-btn').onclick = async function() {
     const poId = document.getElementById('confirm-po-id').value;
     if (!poId) return;
     try {
-    const resp = await fetch(`/purchase-orders/${poId}/cancel`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+    const resp = await fetchWithAuth(`/purchase-orders/${poId}/cancel`, {
+        method: 'POST'
     });
     const data = await resp.json();
     document.getElementById('po-confirm-result').textContent = resp.ok ? 'Purchase order cancelled!' : data.detail || 'Error';
@@ -254,9 +246,7 @@ document.getElementById('cancel-po-btn').onclick = async function() {
 
 // Download function
 window.downloadPO = async function(poId) {
-    const resp = await fetch(`/purchase-orders/${poId}/print-order`, {
-    headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/purchase-orders/${poId}/print-order`);
     if (!resp.ok) {
     alert('Failed to download purchase order');
     return;
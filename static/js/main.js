@@ -16,9 +16,40 @@ async function login(username, password) {
     body: JSON.stringify({username, password})
     });
     if (!resp.ok) throw new Error('Login failed');
-    const data = await resp.json();
+    storeTokens(await resp.json());
+}
+
+function storeTokens(data) {
     jwtToken = data.access_token;
     localStorage.setItem('jwtToken', jwtToken);
+    localStorage.setItem('refreshToken', data.refresh_token);
+}
+
+// Trade the stored refresh token for a new access token (no password needed).
+// Parallel 401s share one refresh: the token rotates on use, so presenting it
+// twice looks like a stolen copy and the server revokes every session.
+let refreshing = null;
+function refreshTokens() {
+    if (!refreshing) {
+        refreshing = requestTokenRefresh().finally(() => { refreshing = null; });
+    }
+    return refreshing;
+}
+
+async function requestTokenRefresh() {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (!refreshToken) return false;
+    const resp = await fetch('/token/refresh', {
+    method: 'POST',
+    headers: {'Content-Type': 'application/json'},
+    body: JSON.stringify({refresh_token: refreshToken})
+    });
+    if (!resp.ok) {
+        localStorage.removeItem('refreshToken');
+        return false;
+    }
+    storeTokens(await resp.json());
+    return true;
 }
 
 // Show login modal if no token
@@ -34,7 +65,13 @@ async function fetchWithAuth(url, options = {}) {
     if (jwtToken) {
         options.headers['Authorization'] = 'Bearer ' + jwtToken;
     }
+    const sentToken = jwtToken;
     let resp = await fetch(url, options);
+    // Another request may already have refreshed the token while this one was in flight
+    if (resp.status === 401 && (jwtToken !== sentToken || await refreshTokens())) {
+        options.headers['Authorization'] = 'Bearer ' + jwtToken;
+        resp = await fetch(url, options);
+    }
     if (resp.status === 401 || resp.status === 403) {
         showLoginModal();
         throw new Error('Not authenticated');
@@ -55,19 +92,12 @@ async function fetchAndRender() {
         showLoginModal();
         return;
     }
-    const authHeader = { Authorization: 'Bearer ' + jwtToken };
     const [stockResp, movesResp, locationsResp, zonesResp] = await Promise.all([
-        fetch('/warehouse-stock', {headers: authHeader}),
-        fetch('/move-lines', {headers: authHeader}),
-        fetch('/locations', {headers: authHeader}),
-        fetch('/zones', {headers: authHeader})
+        fetchWithAuth('/warehouse-stock'),
+        fetchWithAuth('/move-lines'),
+        fetchWithAuth('/locations'),
+        fetchWithAuth('/zones')
     ]);
-    if (stockResp.status === 401 || movesResp.status === 401 || locationsResp.status === 401 || zonesResp.status === 401) {
-        jwtToken = null;
-        localStorage.removeItem('jwtToken');
-        showLoginModal();
-        return;
-    }
     if (!stockResp.ok || !movesResp.ok || !locationsResp.ok || !zonesResp.ok) {
         throw new Error('Failed to fetch API data');
     }
@@ -200,7 +230,7 @@ async function fetchAndRender() {
 
     // Build links (move lines as arrows)
     const interventionMoveIds = new Set(
-    (await fetch('/interventions', { headers: { Authorization: 'Bearer ' + jwtToken } })
+    (await fetchWithAuth('/interventions')
         .then(r => r.json()))
         .filter(i => !i.resolved)
         .map(i => i.move_id)
@@ -354,10 +384,18 @@ document.getElementById('login-btn').onclick = async function() {
 
 // Logout handler
 document.getElementById('logout-btn').onclick = function() {
+    // Revoke the refresh token server side; the access token simply expires
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+        fetch('/logout', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', Authorization: 'Bearer ' + jwtToken },
+        body: JSON.stringify({refresh_token: refreshToken})
+        }).catch(()=>{});
+    }
     jwtToken = null;
-    // Optionally notify backend (not required for JWT stateless logout)
-    fetch('/logout', { method: 'POST', headers: { Authorization: 'Bearer ' + jwtToken } }).catch(()=>{});
     localStorage.removeItem('jwtToken');
+    localStorage.removeItem('refreshToken');
     showLoginModal();
 };
 
@@ -160,19 +160,19 @@ async function loadCustomerReturnOrders() {
 }
 
 window.confirmReturnOrder = async function(id) {
-    await fetch(`/return-orders/${id}/confirm`, { method: 'POST', headers: { Authorization: 'Bearer ' + jwtToken } });
+    await fetchWithAuth(`/return-orders/${id}/confirm`, { method: 'POST' });
     loadReturnOrders();
 };
 window.doneReturnOrder = async function(id) {
-    await fetch(`/return-orders/${id}/done`, { method: 'POST', headers: { Authorization: 'Bearer ' + jwtToken } });
+    await fetchWithAuth(`/return-orders/${id}/done`, { method: 'POST' });
     loadReturnOrders();
 };
 window.cancelReturnOrder = async function(id) {
-    await fetch(`/return-orders/${id}/cancel`, { method: 'POST', headers: { Authorization: 'Bearer ' + jwtToken } });
+    await fetchWithAuth(`/return-orders/${id}/cancel`, { method: 'POST' });
     loadReturnOrders();
 };
 window.downloadReturnOrder = async function(id) {
-    const resp = await fetch(`/return-orders/${id}/print-order`, { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth(`/return-orders/${id}/print-order`);
     const blob = await resp.blob();
     const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
@@ -198,7 +198,7 @@ window.downloadReturnLabel = async function(id, code) {
 };
 
 window.downloadReturnBill = async function(id, code) {
-    const resp = await fetch(`/return-orders/${id}/print-bill`, { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth(`/return-orders/${id}/print-bill`);
     const blob = await resp.blob();
     const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
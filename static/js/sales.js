@@ -2,9 +2,7 @@
 async function updateSaleOrdersDropdown() {
     let url = '/sale-orders/draft';
     try {
-    const resp = await fetch(url, {
-        headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(url);
     const data = await resp.json();
     if (resp.ok) {
         const count = data.length;
@@ -33,7 +31,7 @@ async function updateSaleOrdersDropdown() {
 
 
 async function updateSaleDownloadDropdown() {
-  const resp = await fetch('/sale-orders/', { headers: { Authorization: 'Bearer ' + jwtToken } });
+  const resp = await fetchWithAuth('/sale-orders/');
   const data = await resp.json();
   const select = document.getElementById('download-sale-order-id');
   select.innerHTML = '';
@@ -52,9 +50,7 @@ document.getElementById('sales-query-form').onsubmit = async function(e) {
     updateSaleOrdersDropdown();
     let url = '/sale-orders/draft';
     try {
-    const resp = await fetch(url, {
-        headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(url);
     const data = await resp.json();
     if (resp.ok) {
         const count = data.length;
@@ -86,9 +82,8 @@ document.getElementById('confirm-sale-form').onsubmit = async function(e) {
     e.preventDefault();
     const soId = document.getElementById('confirm-sale-id').value;
     try {
-    const resp = await fetch(`/sale-orders/${soId}/confirm`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+    const resp = await fetchWithAuth(`/sale-orders/${soId}/confirm`, {
+        method: 'POST'
     });
     const data = await resp.json();
     document.getElementById('sales-result').textContent = resp.ok ? 'Sale order confirmed!' : data.detail || 'Error';
@@ -102,9 +97,8 @@ document.getElementById('cancel-sale-btn').onclick = async function() {
     const soId = document.getElementById('confirm-sale-id').value;
     if (!soId) return;
     try {
-    const resp = await fetch(`/sale-orders/${soId}/cancel`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+    const resp = await fetchWithAuth(`/sale-orders/${soId}/cancel`, {
+        method: 'POST'
     });
     const data = await resp.json();
     document.getElementById('sales-result').textContent = resp.ok ? 'Sale order cancelled!' : data.detail || 'Error';
@@ -118,9 +112,7 @@ document.getElementById('cancel-sale-btn').onclick = async function() {
 document.getElementById('download-sale-bill-btn').onclick = async function() {
     const soId = document.getElementById('download-sale-order-id').value;
     if (!soId) return;
-    const resp = await fetch(`/sale-orders/${soId}/print-order`, {
-        headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/sale-orders/${soId}/print-order`);
     if (!resp.ok) {
         alert('Failed to download sale order bill');
         return;
@@ -139,9 +131,7 @@ document.getElementById('download-sale-bill-btn').onclick = async function() {
 document.getElementById('download-sale-shipping-btn').onclick = async function() {
     const soId = document.getElementById('download-sale-order-id').value;
     if (!soId) return;
-    const resp = await fetch(`/sale-orders/${soId}/print-shipment`, {
-        headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/sale-orders/${soId}/print-shipment`);
     if (!resp.ok) {
         alert('Failed to download sale order shipping label');
         return;
@@ -164,7 +154,7 @@ document.getElementById('download-sale-label-btn').onclick = async function() {
     // Optionally fetch the code for a nicer filename
     let code = soId;
     try {
-    const resp = await fetch(`/sale-orders/${soId}`, { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth(`/sale-orders/${soId}`);
     if (resp.ok) {
         const order = await resp.json();
         code = order.code || soId;
@@ -175,9 +165,7 @@ document.getElementById('download-sale-label-btn').onclick = async function() {
 
 
 window.downloadSaleOrder = async function(orderId) {
-    const resp = await fetch(`/sale-orders/${orderId}/print-order`, {
-    headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/sale-orders/${orderId}/print-order`);
     if (!resp.ok) {
     alert('Failed to download sale order');
     return;
@@ -194,7 +182,7 @@ window.downloadSaleOrder = async function(orderId) {
 };
 
 window.downloadSaleOrderLabel = async function(id, code) {
-    const resp = await fetch(`/sale-orders/${id}/print-label`, { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth(`/sale-orders/${id}/print-label`);
     const blob = await resp.blob();
     const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
@@ -3,9 +3,7 @@ let currentTransferOrderId = null;
 let transferOrderLines = [];
 
 async function loadWarehouseItems() {
-    const items = await fetch('/warehouse-items', {
-    headers: { Authorization: 'Bearer ' + jwtToken }
-    }).then(r => r.json());
+    const items = await fetchWithAuth('/warehouse-items').then(r => r.json());
     const select = document.getElementById('transfer-item-select');
     select.innerHTML = '';
     items.forEach(item => {
@@ -19,7 +17,7 @@ async function loadWarehouseItems() {
 
 
 async function loadTargetZones() {
-    const resp = await fetch('/location-zones', { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth('/location-zones');
     const zones = await resp.json();
     const select = document.getElementById('transfer-target-zone');
     select.innerHTML = '';
@@ -41,11 +39,10 @@ async function addTransferOrderLine() {
     const quantity = document.getElementById('transfer-quantity').value;
     const target_zone_id = document.getElementById('transfer-target-zone').value;
     const route_id = 1; // or select as needed
-    await fetch(`/transfer-orders/${transferOrderId}/lines`, {
+    await fetchWithAuth(`/transfer-orders/${transferOrderId}/lines`, {
     method: 'POST',
     headers: {
-        'Content-Type': 'application/json',
-        Authorization: 'Bearer ' + jwtToken
+        'Content-Type': 'application/json'
     },
     body: JSON.stringify([
         { item_id, quantity, target_zone_id }
@@ -64,9 +61,7 @@ async function fetchAndRenderTransferOrderLines() {
     document.getElementById('transfer-order-lines').innerHTML = '<i>No transfer order started.</i>';
     return;
     }
-    const resp = await fetch(`/transfer-orders/${currentTransferOrderId}/lines`, {
-    headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/transfer-orders/${currentTransferOrderId}/lines`);
     if (!resp.ok) {
     document.getElementById('transfer-order-lines').innerHTML = '<i>Error loading lines.</i>';
     return;
@@ -78,8 +73,8 @@ async function fetchAndRenderTransferOrderLines() {
     }
     // Optionally fetch items and zones for better display
     const [items, zones] = await Promise.all([
-    fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-    fetch('/location-zones', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+    fetchWithAuth('/items').then(r => r.json()),
+    fetchWithAuth('/location-zones').then(r => r.json())
     ]);
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
     const zoneMap = Object.fromEntries(zones.map(z => [z.zone_id, z]));
@@ -96,7 +91,7 @@ async function fetchAndRenderTransferOrderLines() {
 
 async function confirmTransferOrder() {
     if (currentTransferOrderId) {
-    await fetch(`/transfer-orders/${currentTransferOrderId}/confirm`, { method: 'POST', headers: { Authorization: 'Bearer ' + jwtToken } });
+    await fetchWithAuth(`/transfer-orders/${currentTransferOrderId}/confirm`, { method: 'POST' });
     // Optionally show a message in the panel instead of alert
     document.getElementById('transfer-order-lines').innerHTML = '<i>Transfer order confirmed!</i>';
     currentTransferOrderId = null;
@@ -110,10 +105,10 @@ async function confirmTransferOrder() {
 async function populateMoveLineSelect() {
     // Add this fetch in parallel with items and locations
     const [moveLines, items, locations, lots] = await Promise.all([
-        fetch('/move-lines', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/locations', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/lots', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth('/move-lines').then(r => r.json()),
+        fetchWithAuth('/items').then(r => r.json()),
+        fetchWithAuth('/locations').then(r => r.json()),
+        fetchWithAuth('/lots').then(r => r.json())
     ]);
     const lotMap = Object.fromEntries(lots.map(l => [l.id, l.lot_number]));
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
@@ -137,8 +132,8 @@ async function populateMoveLineSelect() {
 async function populatePickingSelect() {
     // Fetch pickings and zones in parallel
     const [pickings, zones] = await Promise.all([
-        fetch('/pickings', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/zones', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth('/pickings').then(r => r.json()),
+        fetchWithAuth('/zones').then(r => r.json())
     ]);
     const zoneMap = Object.fromEntries(zones.map(z => [z.id, z.code]));
     const select = document.getElementById('picking-select');
@@ -147,7 +142,7 @@ async function populatePickingSelect() {
     // Fetch move lines for all pickings in parallel
     const moveLinesList = await Promise.all(
         pickings.map(p =>
-            fetch(`/pickings/${p.id}/move-lines`, { headers: { Authorization: 'Bearer ' + jwtToken } })
+            fetchWithAuth(`/pickings/${p.id}/move-lines`)
                 .then(r => r.ok ? r.json() : [])
                 .then(lines => ({
                     picking: p,
@@ -180,9 +175,9 @@ async function populatePickingSelect() {
 
 async function populateMoveLineSelectByPicking(pickingId) {
     const [moveLines, items, locations] = await Promise.all([
-        fetch(`/pickings/${pickingId}/move-lines`, { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/locations', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth(`/pickings/${pickingId}/move-lines`).then(r => r.json()),
+        fetchWithAuth('/items').then(r => r.json()),
+        fetchWithAuth('/locations').then(r => r.json())
     ]);
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
     const locMap = Object.fromEntries(locations.map(l => [l.id, l]));
@@ -204,7 +199,7 @@ async function populateMoveLineSelectByPicking(pickingId) {
 };
 
 async function loadInterventions() {
-    const resp = await fetch('/interventions', { headers: { Authorization: 'Bearer ' + jwtToken } });
+    const resp = await fetchWithAuth('/interventions');
     const interventions = await resp.json();
     const unresolved = interventions.filter(i => !i.resolved);
     const div = document.getElementById('interventions');
@@ -223,21 +218,18 @@ async function loadInterventions() {
 async function getOrCreateTransferOrderId() {
     if (currentTransferOrderId) return currentTransferOrderId;
     // Try to find an existing draft transfer order
-    const resp = await fetch('/transfer-orders?status=draft', {
-    headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth('/transfer-orders?status=draft');
     const orders = await resp.json();
     if (orders.length > 0) {
     currentTransferOrderId = orders[0].id;
     return currentTransferOrderId;
     }
     // Otherwise, create a new one
-    const createResp = await fetch('/transfer-orders/', { 
+    const createResp = await fetchWithAuth('/transfer-orders/', { 
     method: 'POST', 
     body: JSON.stringify({ partner_id: 1 }), 
     headers: { 
-        'Content-Type': 'application/json',
-        Authorization: 'Bearer ' + jwtToken
+        'Content-Type': 'application/json'
     } 
     });
     currentTransferOrderId = (await createResp.json()).transfer_order_id;
@@ -259,9 +251,8 @@ document.getElementById('move-done-form').onsubmit = async function(e) {
     const pickingSelect = document.getElementById('picking-select');
     const selectedPickingId = pickingSelect.value;
     try {
-        const resp = await fetch(`/move-lines/${moveId}/done`, {
-            method: 'POST',
-            headers: { Authorization: 'Bearer ' + jwtToken }
+        const resp = await fetchWithAuth(`/move-lines/${moveId}/done`, {
+            method: 'POST'
         });
         const data = await resp.json();
         document.getElementById('move-result').textContent = resp.ok ? 'Move set to done!' : data.detail || 'Error';
@@ -286,7 +277,7 @@ document.getElementById('move-done-form').onsubmit = async function(e) {
 // Populate items and locations for stock adjustment
 async function loadStockAdjustmentSelectors() {
     // Items
-    const items = await fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json());
+    const items = await fetchWithAuth('/items').then(r => r.json());
     const itemSelect = document.getElementById('adjustment-item-select');
     itemSelect.innerHTML = '';
     items.forEach(item => {
@@ -297,7 +288,7 @@ async function loadStockAdjustmentSelectors() {
     });
 
     // Locations
-    const locations = await fetch('/locations', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json());
+    const locations = await fetchWithAuth('/locations').then(r => r.json());
     const locationSelect = document.getElementById('adjustment-location-select');
     locationSelect.innerHTML = '';
     locations.forEach(loc => {
@@ -316,11 +307,10 @@ document.getElementById('stock-adjustment-form').onsubmit = async function(e) {
     const delta = document.getElementById('adjustment-delta').value;
     const reason = document.getElementById('adjustment-reason').value;
     try {
-        const resp = await fetch('/stock-adjustments/', {
+        const resp = await fetchWithAuth('/stock-adjustments/', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json',
-                Authorization: 'Bearer ' + jwtToken
+                'Content-Type': 'application/json'
             },
             body: JSON.stringify({ item_id, location_id, delta, reason })
         });
@@ -338,10 +328,8 @@ document.getElementById('stock-adjustment-form').onsubmit = async function(e) {
 
 async function fetchManufacturingOrders() {
     const [mos, items] = await Promise.all([
-        fetch('/manufacturing-orders/?status=draft', {
-            headers: { Authorization: 'Bearer ' + jwtToken }
-        }).then(r => r.json()),
-        fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth('/manufacturing-orders/?status=draft').then(r => r.json()),
+        fetchWithAuth('/items').then(r => r.json())
     ]);
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
     const select = document.getElementById('mo-select');
@@ -358,10 +346,8 @@ async function fetchManufacturingOrders() {
 
 async function fetchConfirmedManufacturingOrders() {
     const [mos, items] = await Promise.all([
-        fetch('/manufacturing-orders/?status=confirmed', {
-            headers: { Authorization: 'Bearer ' + jwtToken }
-        }).then(r => r.json()),
-        fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth('/manufacturing-orders/?status=confirmed').then(r => r.json()),
+        fetchWithAuth('/items').then(r => r.json())
     ]);
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
     const select = document.getElementById('mo-select-confirmed');
@@ -378,7 +364,7 @@ async function fetchConfirmedManufacturingOrders() {
 
 // Populate BOM items
 async function loadManufacturingItems() {
-    const items = await fetch('/manufacturing-items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json());
+    const items = await fetchWithAuth('/manufacturing-items').then(r => r.json());
     const select = document.getElementById('mo-item-select');
     select.innerHTML = '';
     items.forEach(item => {
@@ -392,9 +378,9 @@ async function loadManufacturingItems() {
 async function fetchMOsWithCarrierLabel() {
     // Fetch all carrier_label records and join with MO/item for display
     const [labels, mos, items] = await Promise.all([
-        fetch('/carrier-labels', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/manufacturing-orders/', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth('/carrier-labels').then(r => r.json()),
+        fetchWithAuth('/manufacturing-orders/').then(r => r.json()),
+        fetchWithAuth('/items').then(r => r.json())
     ]);
     const moIdsWithLabel = new Set(labels.map(l => l.mo_id));
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
@@ -419,9 +405,9 @@ document.getElementById('mo-create-form').onsubmit = async function(e) {
     let bomFile = fileInput.files[0];
 
     // 1. Create the MO
-    const resp = await fetch('/manufacturing-orders/', {
+    const resp = await fetchWithAuth('/manufacturing-orders/', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json', Authorization: 'Bearer ' + jwtToken },
+        headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ item_id, quantity, planned_start, planned_end })
     });
     const data = await resp.json();
@@ -434,14 +420,13 @@ document.getElementById('mo-create-form').onsubmit = async function(e) {
     // 2. If file selected, upload to BOM
     if (bomFile) {
         // Get BOM id for the selected item
-        const itemResp = await fetch(`/items/${item_id}`, { headers: { Authorization: 'Bearer ' + jwtToken } });
+        const itemResp = await fetchWithAuth(`/items/${item_id}`);
         const itemData = await itemResp.json();
         if (itemData.bom_id) {
             const formData = new FormData();
             formData.append('file', bomFile);
-            const uploadResp = await fetch(`/bom/${itemData.bom_id}/file`, {
+            const uploadResp = await fetchWithAuth(`/bom/${itemData.bom_id}/file`, {
                 method: 'POST',
-                headers: { Authorization: 'Bearer ' + jwtToken },
                 body: formData
             });
             const uploadData = await uploadResp.json();
@@ -455,9 +440,8 @@ document.getElementById('mo-create-form').onsubmit = async function(e) {
 document.getElementById('mo-done-btn').onclick = async function() {
     const moId = document.getElementById('mo-select-confirmed').value;
     if (!moId) return;
-    const resp = await fetch(`/manufacturing-orders/${moId}/done`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+    const resp = await fetchWithAuth(`/manufacturing-orders/${moId}/done`, {
+        method: 'POST'
     });
     document.getElementById('mo-result').textContent = (await resp.json()).message;
     fetchManufacturingOrders();
@@ -468,9 +452,7 @@ document.getElementById('mo-done-btn').onclick = async function() {
 document.getElementById('mo-download-label-btn').onclick = async function() {
     const moId = document.getElementById('mo-select-with-label').value;
     if (!moId) return;
-    const resp = await fetch(`/manufacturing-orders/${moId}/carrier-label`, {
-        headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/manufacturing-orders/${moId}/carrier-label`);
     if (!resp.ok) {
         alert('Carrier label not available');
         return;
@@ -489,9 +471,8 @@ document.getElementById('mo-download-label-btn').onclick = async function() {
 document.getElementById('mo-confirm-btn').onclick = async function() {
     const moId = document.getElementById('mo-select').value;
     if (!moId) return;
-    const resp = await fetch(`/manufacturing-orders/${moId}/confirm`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+    const resp = await fetchWithAuth(`/manufacturing-orders/${moId}/confirm`, {
+        method: 'POST'
     });
     document.getElementById('mo-result').textContent = (await resp.json()).message;
     fetchManufacturingOrders();
@@ -501,9 +482,8 @@ document.getElementById('mo-confirm-btn').onclick = async function() {
 document.getElementById('mo-cancel-btn').onclick = async function() {
     const moId = document.getElementById('mo-select').value;
     if (!moId) return;
-    const resp = await fetch(`/manufacturing-orders/${moId}/cancel`, {
-        method: 'POST',
-        headers: { Authorization: 'Bearer ' + jwtToken }
+    const resp = await fetchWithAuth(`/manufacturing-orders/${moId}/cancel`, {
+        method: 'POST'
     });
     document.getElementById('mo-result').textContent = (await resp.json()).message;
     fetchManufacturingOrders();
@@ -513,9 +493,7 @@ document.getElementById('mo-cancel-btn').onclick = async function() {
 document.getElementById('mo-download-btn').onclick = async function() {
     const moId = document.getElementById('mo-select-all').value;
     if (!moId) return;
-    const resp = await fetch(`/manufacturing-orders/${moId}/download`, {
-        headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/manufacturing-orders/${moId}/download`);
     if (!resp.ok) {
         alert('Failed to download MO document');
         return;
@@ -534,9 +512,7 @@ document.getElementById('mo-download-btn').onclick = async function() {
 document.getElementById('mo-download-receipt-btn').onclick = async function() {
     const moId = document.getElementById('mo-select-done').value;
     if (!moId) return;
-    const resp = await fetch(`/manufacturing-orders/${moId}/receipt`, {
-        headers: { Authorization: 'Bearer ' + jwtToken }
-    });
+    const resp = await fetchWithAuth(`/manufacturing-orders/${moId}/receipt`);
     if (!resp.ok) {
         alert('Failed to download manufacturing receipt');
         return;
@@ -554,8 +530,8 @@ document.getElementById('mo-download-receipt-btn').onclick = async function() {
 
 async function fetchAllManufacturingOrders() {
     const [mos, items] = await Promise.all([
-        fetch('/manufacturing-orders/', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json()),
-        fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth('/manufacturing-orders/').then(r => r.json()),
+        fetchWithAuth('/items').then(r => r.json())
     ]);
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
     const select = document.getElementById('mo-select-all');
@@ -572,10 +548,8 @@ async function fetchAllManufacturingOrders() {
 
 async function fetchDoneManufacturingOrders() {
     const [mos, items] = await Promise.all([
-        fetch('/manufacturing-orders/?status=done', {
-            headers: { Authorization: 'Bearer ' + jwtToken }
-        }).then(r => r.json()),
-        fetch('/items', { headers: { Authorization: 'Bearer ' + jwtToken } }).then(r => r.json())
+        fetchWithAuth('/manufacturing-orders/?status=done').then(r => r.json()),
+        fetchWithAuth('/items').then(r => r.json())
     ]);
     const itemMap = Object.fromEntries(items.map(i => [i.id, i]));
     const select = document.getElementById('mo-select-done');
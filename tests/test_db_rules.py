@@ -681,3 +681,817 @@ def test_fulfillment_flow_until_sale_order_done(db):
 #     move_line_item_ids = {row["item_id"] for row in move_lines}
 #     missing = bom_item_ids - move_line_item_ids
 #     assert not missing, f"Move lines missing for BOM items: {missing}"
+
+
+def test_stock_adjustment_batch_resolves_interventions_by_priority(db):
+    from inventory import apply_stock_adjustments
+
+    zone_id = db.execute("INSERT INTO zone (code, description) VALUES ('ZON_BATCH', 'Batch Test Zone')").lastrowid
+    location_id = db.execute(
+        "INSERT INTO location (code, warehouse_id, description) VALUES ('LOC_BATCH', 1, 'Batch Test Location')"
+    ).lastrowid
+    db.execute("INSERT INTO location_zone (location_id, zone_id) VALUES (?, ?)", (location_id, zone_id))
+    item_id = db.execute("SELECT id FROM item WHERE name = 'Item Small A'").fetchone()["id"]
+    target_zone_id = db.execute("SELECT id FROM zone WHERE code = 'ZON02'").fetchone()["id"]
+    carrier_zone_id = db.execute("SELECT id FROM zone WHERE code = 'ZON11'").fetchone()["id"]
+    trigger_id = db.execute("""
+        INSERT INTO trigger (origin_model, trigger_type, trigger_item_id, trigger_zone_id, trigger_item_quantity, type, status)
+        VALUES ('stock', 'supply', ?, ?, 8, 'internal', 'draft')
+    """, (item_id, carrier_zone_id)).lastrowid
+
+    # Nothing in stock yet: both moves end up in intervention; the low-priority one first
+    move_ids = [
+        db.execute("""
+            INSERT INTO move (item_id, source_id, target_id, trigger_id, quantity, priority)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (item_id, zone_id, target_zone_id, trigger_id, qty, prio)).lastrowid
+        for qty, prio in ((4, 0), (5, 10), (6, 0))
+    ]
+    open_interventions = db.execute(
+        "SELECT COUNT(*) FROM intervention WHERE resolved = 0 AND move_id IN (?, ?, ?)", move_ids
+    ).fetchone()[0]
+    assert open_interventions == 3
+
+    summary = apply_stock_adjustments(db, [
+        {"item_id": item_id, "location_id": location_id, "delta": 5, "reason": "Batch receipt"},
+        {"item_id": item_id, "location_id": location_id, "delta": 4, "reason": "Batch receipt"},
+    ])
+    db.commit()
+
+    assert summary["adjustments"] == 2
+    assert summary["resolved_interventions"] == 2
+    assert db.execute("SELECT COUNT(*) FROM stock_adjustment_batch WHERE status = 'open'").fetchone()[0] == 0
+
+    stock = db.execute("SELECT quantity, reserved_quantity FROM stock WHERE item_id = ? AND location_id = ?",
+                       (item_id, location_id)).fetchone()
+    assert stock["quantity"] == 9 and stock["reserved_quantity"] == 9
+
+    # Highest priority is served first, then the oldest; the rest stays in intervention
+    resolved = {
+        row["move_id"]: row["resolved"]
+        for row in db.execute("SELECT move_id, MIN(resolved) AS resolved FROM intervention WHERE move_id IN (?, ?, ?) GROUP BY move_id", move_ids)
+    }
+    assert resolved == {move_ids[0]: 1, move_ids[1]: 1, move_ids[2]: 0}
+
+
+def test_open_intervention_registry_follows_intervention(db):
+    move = db.execute("SELECT id, item_id, source_id, lot_id FROM move ORDER BY id LIMIT 1").fetchone()
+    intervention_id = db.execute(
+        "INSERT INTO intervention (move_id, priority, reason) VALUES (?, 7, 'Registry test')", (move["id"],)
+    ).lastrowid
+    row = db.execute("SELECT * FROM open_intervention WHERE intervention_id = ?", (intervention_id,)).fetchone()
+    assert row is not None, "Open intervention not registered"
+    assert (row["item_id"], row["zone_id"], row["lot_id"], row["priority"]) == (
+        move["item_id"], move["source_id"], move["lot_id"], 7
+    )
+
+    db.execute("UPDATE intervention SET resolved = 1 WHERE id = ?", (intervention_id,))
+    assert db.execute("SELECT 1 FROM open_intervention WHERE intervention_id = ?", (intervention_id,)).fetchone() is None
+
+    # The registry holds exactly the unresolved interventions
+    db.execute("DELETE FROM intervention WHERE id = ?", (intervention_id,))
+    db.commit()
+    registered = {r[0] for r in db.execute("SELECT intervention_id FROM open_intervention")}
+    unresolved = {r[0] for r in db.execute("SELECT id FROM intervention WHERE resolved = 0")}
+    assert registered == unresolved
+
+
+def test_replenishment_plan_nets_pipeline_and_is_idempotent(db):
+    from replenishment import plan_replenishment
+
+    plan = plan_replenishment(db, dry_run=True)
+    assert plan["compute_ms"] >= 0
+    for group in plan["groups"]:
+        for line in group["lines"]:
+            assert line["shortfall"] == (
+                line["target_quantity"] - line["available_quantity"]
+                - line["inbound_quantity"] - line["pending_quantity"]
+            )
+            assert line["shortfall"] > 0
+
+    emitted = plan_replenishment(db, dry_run=False)
+    db.commit()
+    assert len(emitted["transfer_orders"]) == len(plan["groups"])
+    for to in emitted["transfer_orders"]:
+        status = db.execute("SELECT status FROM transfer_order WHERE id = ?", (to["transfer_order_id"],)).fetchone()[0]
+        assert status == "confirmed"
+
+    # Everything emitted is now in the pipeline, so nothing plannable is left
+    again = plan_replenishment(db, dry_run=True)
+    assert again["groups"] == []
+
+
+def test_lot_genealogy_closure_and_mo_lineage(db):
+    item_id = db.execute("SELECT id FROM item WHERE name = 'Item Small A'").fetchone()["id"]
+    a, b, c, x = [
+        db.execute("INSERT INTO lot (item_id, lot_number, origin_model) VALUES (?, ?, 'purchase_order')",
+                   (item_id, f"GEN-{code}")).lastrowid
+        for code in ("A", "B", "C", "X")
+    ]
+    db.execute("INSERT INTO lot_genealogy (parent_lot_id, child_lot_id, event_model) VALUES (?, ?, 'stock_adjustment')", (a, b))
+    db.execute("INSERT INTO lot_genealogy (parent_lot_id, child_lot_id, event_model) VALUES (?, ?, 'stock_adjustment')", (b, c))
+    # Linking above an existing chain reaches every descendant
+    db.execute("INSERT INTO lot_genealogy (parent_lot_id, child_lot_id, event_model) VALUES (?, ?, 'stock_adjustment')", (x, a))
+    forward = {r["descendant_lot_id"]: r["depth"] for r in db.execute("SELECT * FROM lot_closure WHERE ancestor_lot_id = ?", (x,))}
+    assert forward == {a: 1, b: 2, c: 3}
+    back = {r["ancestor_lot_id"]: r["depth"] for r in db.execute("SELECT * FROM lot_closure WHERE descendant_lot_id = ?", (c,))}
+    assert back == {b: 1, a: 2, x: 3}
+
+    # An MO consuming lot-tracked components links them to the produced lot
+    kit = db.execute("SELECT id, bom_id FROM item WHERE name = 'Kit Alpha'").fetchone()
+    location_id = db.execute("SELECT id FROM location WHERE code = 'LOC_PROD_2'").fetchone()["id"]
+    bom_lines = db.execute("SELECT item_id, quantity FROM bom_line WHERE bom_id = ?", (kit["bom_id"],)).fetchall()
+    # An older lot that is used up at the location is not consumed
+    empty_lot = db.execute("INSERT INTO lot (item_id, lot_number, origin_model) VALUES (?, 'GEN-EMPTY', 'purchase_order')",
+                           (bom_lines[0]["item_id"],)).lastrowid
+    for delta in (3, -3):
+        db.execute("INSERT INTO stock_adjustment (item_id, location_id, lot_id, delta, reason) VALUES (?, ?, ?, ?, 'Genealogy test')",
+                   (bom_lines[0]["item_id"], location_id, empty_lot, delta))
+    component_lots = []
+    for row in bom_lines:
+        lot_id = db.execute("INSERT INTO lot (item_id, lot_number, origin_model) VALUES (?, ?, 'purchase_order')",
+                            (row["item_id"], f"GEN-COMP-{row['item_id']}")).lastrowid
+        db.execute("INSERT INTO stock_adjustment (item_id, location_id, lot_id, delta, reason) VALUES (?, ?, ?, 10, 'Genealogy test')",
+                   (row["item_id"], location_id, lot_id))
+        component_lots.append(lot_id)
+    mo_id = db.execute("""
+        INSERT INTO manufacturing_order (code, partner_id, item_id, quantity, status, manufacturing_location_id)
+        VALUES ('MO_GENEALOGY', 1, ?, 1, 'draft', ?)
+    """, (kit["id"], location_id)).lastrowid
+    db.execute("UPDATE manufacturing_order SET status = 'done' WHERE id = ?", (mo_id,))
+    db.commit()
+
+    produced = db.execute("SELECT id FROM lot WHERE origin_model = 'manufacturing_order' AND origin_id = ?", (mo_id,)).fetchone()["id"]
+    parents = {r["ancestor_lot_id"] for r in db.execute("SELECT ancestor_lot_id FROM lot_closure WHERE descendant_lot_id = ?", (produced,))}
+    assert set(component_lots) <= parents and empty_lot not in parents
+    links = {r["parent_lot_id"]: r["quantity"] for r in db.execute(
+        "SELECT parent_lot_id, quantity FROM lot_genealogy WHERE child_lot_id = ?", (produced,))}
+    assert links == {lot_id: row["quantity"] for lot_id, row in zip(component_lots, bom_lines)}
+
+
+def test_catalog_version_bumps_on_catalog_changes(db):
+    def version():
+        return db.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+
+    before = version()
+    db.execute("UPDATE price_list_item SET price = price WHERE id = (SELECT MIN(id) FROM price_list_item)")
+    after_price = version()
+    assert after_price > before
+    db.execute("UPDATE currency SET rel_to_usd = rel_to_usd WHERE id = (SELECT MIN(id) FROM currency)")
+    assert version() > after_price
+
+    # Stock movements do not touch the catalog
+    unchanged = version()
+    db.execute("UPDATE stock SET target_quantity = target_quantity WHERE id = (SELECT MIN(id) FROM stock)")
+    db.commit()
+    assert version() == unchanged
+
+
+def test_price_matrix_matches_tax_rules_and_follows_catalog(db):
+    from pricing import load_price_matrix, refresh_price_matrix
+
+    price_list = db.execute("SELECT id, country_id FROM price_list WHERE country_id IS NOT NULL ORDER BY id LIMIT 1").fetchone()
+    matrix = load_price_matrix(db, price_list["id"], price_list["country_id"])
+    assert matrix
+
+    for item_id, row in matrix.items():
+        taxes = db.execute("""
+            SELECT t.percent, t.fixed_amount
+            FROM hs_country_tax hct
+            JOIN tax t ON t.id = hct.tax_id
+            WHERE hct.country_id = ?
+              AND hct.hs_code_id = (SELECT hs_code_id FROM item_hs_country WHERE item_id = ? AND country_id = ?)
+        """, (price_list["country_id"], item_id, price_list["country_id"])).fetchall()
+        percent = sum(t["percent"] for t in taxes)
+        fixed = sum(t["fixed_amount"] or 0 for t in taxes)
+        assert len(row["taxes"]) == len(taxes)
+        assert row["gross_price"] == pytest.approx(row["net_price"] * (1 + percent / 100) + fixed)
+
+    # A price change rebuilds that item's rows in the same statement
+    item_id, row = next(iter(matrix.items()))
+    db.execute(
+        "UPDATE price_list_item SET price = price + 1 WHERE price_list_id = ? AND item_id = ? AND unit_id = ?",
+        (price_list["id"], item_id, row["unit_id"])
+    )
+    assert db.execute("SELECT COUNT(*) FROM price_matrix_refresh").fetchone()[0] == 0
+    updated = load_price_matrix(db, price_list["id"], price_list["country_id"], [item_id])[item_id]
+    assert updated["net_price"] == pytest.approx(row["net_price"] + 1)
+    assert updated["gross_price"] == pytest.approx(row["gross_price"] + 1 + row["tax_percent"] / 100)
+
+    # The incremental rows match a full rebuild
+    def snapshot():
+        return sorted(tuple(r) for r in db.execute("SELECT * FROM price_matrix"))
+    incremental = snapshot()
+    refresh_price_matrix(db)
+    assert snapshot() == incremental
+
+
+def test_item_fts_follows_item_changes(db):
+    from item_search import search_items
+
+    db.execute("""
+        INSERT INTO item (name, sku, barcode, description)
+        VALUES ('Quokka Thermos', 'FTS-TEST-1', 'FTS-4006381333931', 'Insulated bottle')
+    """)
+    item_id = db.execute("SELECT id FROM item WHERE sku = 'FTS-TEST-1'").fetchone()[0]
+
+    found = search_items(db, "quok therm")["items"]
+    assert [row["id"] for row in found] == [item_id]
+    scanned = search_items(db, "FTS-4006381333931")["items"]
+    assert scanned[0]["id"] == item_id and scanned[0]["match"] == "exact"
+
+    db.execute("UPDATE item SET name = 'Wombat Flask' WHERE id = ?", (item_id,))
+    assert search_items(db, "quokka")["items"] == []
+    assert [row["id"] for row in search_items(db, "wombat")["items"]] == [item_id]
+
+    db.execute("DELETE FROM item WHERE id = ?", (item_id,))
+    assert search_items(db, "wombat")["items"] == []
+    db.commit()
+
+
+def test_totals_engine_applies_discount_and_tax_and_goes_stale(db):
+    from totals import ensure_totals, load_totals, stale_ids
+
+    partner_id = db.execute("SELECT id FROM partner ORDER BY id LIMIT 1").fetchone()[0]
+    tax_id = db.execute("INSERT INTO tax (name, percent, fixed_amount) VALUES ('Totals test tax', 10.0, 0.5)").lastrowid
+    discount_id = db.execute("INSERT INTO discount (name, percent, amount) VALUES ('Totals test discount', 10.0, 3.0)").lastrowid
+    quotation_id = db.execute("""
+        INSERT INTO quotation (code, partner_id, tax_id, discount_id)
+        VALUES ('Q-TOTALS-TEST', ?, ?, ?)
+    """, (partner_id, tax_id, discount_id)).lastrowid
+    db.executemany(
+        "INSERT INTO quotation_line (quantity, item_id, quotation_id, price) VALUES (?, 1, ?, ?)",
+        [(2, quotation_id, 10.0), (1, quotation_id, 20.0)]
+    )
+
+    totals = load_totals(db, "quotation", quotation_id)
+    # net 40, 10% off -> 36, minus 3 fixed -> 33; tax 10% of 33 plus 0.5 per unit
+    assert totals["amount_discount"] == pytest.approx(7.0)
+    assert totals["amount_untaxed"] == pytest.approx(33.0)
+    assert totals["amount_tax"] == pytest.approx(4.8)
+    assert totals["amount_total"] == pytest.approx(37.8)
+    assert sum(line["amount_total"] for line in totals["lines"]) == pytest.approx(totals["amount_total"])
+    # Reading computed the totals without storing them
+    assert stale_ids(db, "quotation", [quotation_id]) == [quotation_id]
+    assert ensure_totals(db, "quotation", [quotation_id]) == 1
+    assert quotation_id not in stale_ids(db, "quotation", [quotation_id])
+
+    # A new line flags the totals stale; reads see the new line before the next ensure stores it
+    db.execute("INSERT INTO quotation_line (quantity, item_id, quotation_id, price) VALUES (1, 1, ?, 10.0)", (quotation_id,))
+    assert stale_ids(db, "quotation", [quotation_id]) == [quotation_id]
+    assert load_totals(db, "quotation", quotation_id)["amount_untaxed"] == pytest.approx(42.0)
+    assert ensure_totals(db, "quotation", [quotation_id]) == 1
+    stored = db.execute("SELECT amount_untaxed, totals_stale FROM quotation WHERE id = ?", (quotation_id,)).fetchone()
+    assert stored["totals_stale"] == 0
+    assert stored["amount_untaxed"] == pytest.approx(42.0)
+
+
+def test_unit_conversion_matrix_is_transitive_and_follows_unit_changes(db):
+    from units import get_conversion_matrix, stock_quantities
+
+    unit_ids = {row["symbol"]: row["id"] for row in db.execute("SELECT id, symbol FROM unit")}
+    matrix = get_conversion_matrix(db)
+    # Only carton -> pack and pack -> piece are seeded; the rest is derived
+    assert matrix.convert(2, unit_ids["ctn"], unit_ids["pc."]) == pytest.approx(48)
+    assert matrix.convert(48, unit_ids["pc."], unit_ids["ctn"]) == pytest.approx(2)
+    assert matrix.rate(unit_ids["kg"], unit_ids["pc."]) is None
+    assert get_conversion_matrix(db) is matrix
+
+    # A new conversion bumps the unit version and the next read rebuilds the matrix
+    db.execute("INSERT INTO unit (name, symbol, category) VALUES ('Pallet', 'plt-test', 'units')")
+    pallet_id = db.execute("SELECT id FROM unit WHERE symbol = 'plt-test'").fetchone()[0]
+    db.execute("INSERT INTO unit_conversion (from_unit_id, to_unit_id, conversion_rate) VALUES (?, ?, 10)",
+               (pallet_id, unit_ids["ctn"]))
+    rebuilt = get_conversion_matrix(db)
+    assert rebuilt is not matrix
+    assert rebuilt.convert(240, unit_ids["pc."], pallet_id) == pytest.approx(1)
+
+    item_id = db.execute("SELECT item_id FROM stock WHERE quantity > 0 LIMIT 1").fetchone()[0]
+    on_hand = db.execute("SELECT SUM(quantity) FROM stock WHERE item_id = ?", (item_id,)).fetchone()[0]
+    row = stock_quantities(db, [item_id], unit_ids["pk"])[0]
+    assert row["converted_quantity"] == pytest.approx(on_hand / 6)
+
+
+def test_landed_cost_resolves_hs_duties_in_one_batch_and_follows_catalog(db):
+    from landed_cost import compute_landed_cost
+
+    eur = db.execute("SELECT id FROM currency WHERE code = 'EUR'").fetchone()[0]
+    countries = [row[0] for row in db.execute("SELECT id FROM country ORDER BY id LIMIT 2")]
+    hs_code_id = db.execute("INSERT INTO hs_code (code, description) VALUES ('LC0001', 'Landed cost test')").lastrowid
+    duty_id = db.execute("INSERT INTO tax (name, percent, fixed_amount, fixed_currency_id) VALUES ('LC duty', 10, 0.5, ?)", (eur,)).lastrowid
+    db.execute("INSERT INTO hs_country_tax (hs_code_id, country_id, tax_id) VALUES (?, ?, ?)", (hs_code_id, countries[1], duty_id))
+    item_id = db.execute("INSERT INTO item (name, sku, barcode) VALUES ('Landed cost item', 'LC-TEST-1', 'LC-TEST-1')").lastrowid
+    # Classified for the origin country only: the destination reuses that HS code
+    db.execute("INSERT INTO item_hs_country (item_id, hs_code_id, country_id) VALUES (?, ?, ?)", (item_id, hs_code_id, countries[0]))
+    price_list_id = db.execute("INSERT INTO price_list (name, currency_id) VALUES ('LC list', ?)", (eur,)).lastrowid
+    unit_id = db.execute("SELECT id FROM unit WHERE symbol = 'pc.'").fetchone()[0]
+    db.execute("INSERT INTO price_list_item (price_list_id, item_id, unit_id, price) VALUES (?, ?, ?, 20)", (price_list_id, item_id, unit_id))
+
+    result = compute_landed_cost(db, [{"item_id": item_id, "quantity": 3}], countries[1], price_list_id)
+    line = result["lines"][0]
+    assert line["hs_code"] == "LC0001"
+    assert line["goods_value"] == pytest.approx(60)
+    assert line["duty_amount"] == pytest.approx(60 * 0.10 + 3 * 0.5)
+    assert result["landed_cost"] == pytest.approx(67.5)
+
+    # A duty change moves the catalog version, so the cached rates are not reused
+    db.execute("UPDATE tax SET percent = 20 WHERE id = ?", (duty_id,))
+    result = compute_landed_cost(db, [{"item_id": item_id, "quantity": 3}], countries[1], price_list_id)
+    assert result["duty_amount"] == pytest.approx(60 * 0.20 + 3 * 0.5)
+
+
+def test_reference_data_snapshot_is_reused_until_a_reference_table_changes(db):
+    from reference_data import get_reference_data
+
+    data = get_reference_data(db)
+    assert get_reference_data(db) is data
+    country = db.execute("SELECT code, name FROM country ORDER BY id LIMIT 1").fetchone()
+    assert data.country_info(country["code"])["name"] == country["name"]
+    assert data.country_info("??") is None
+
+    db.execute("UPDATE currency SET rel_to_usd = rel_to_usd * 2 WHERE code = 'USD'")
+    reloaded = get_reference_data(db)
+    assert reloaded is not data
+    assert reloaded.currency_rates["USD"] == pytest.approx(data.currency_rates["USD"] * 2)
+    db.execute("UPDATE currency SET rel_to_usd = rel_to_usd / 2 WHERE code = 'USD'")
+
+
+def test_catalog_import_reports_row_errors_and_export_round_trips(db):
+    import io
+    from catalog_io import export_rows, import_rows, read_rows
+
+    existing_barcode = db.execute("SELECT barcode FROM item ORDER BY id LIMIT 1").fetchone()[0]
+    items = (
+        "sku,barcode,name,type,cost,cost_currency_code\n"
+        "IMP-TEST-1,IMP-BC-1,Imported one,product,2.5,EUR\n"
+        "IMP-TEST-2,IMP-BC-2,Imported two,gadget,,\n"
+        f"IMP-TEST-3,{existing_barcode},Duplicate barcode,product,,\n"
+        "IMP-TEST-4,IMP-BC-4,Imported four,,,XXX\n"
+    )
+    report = import_rows(db, "item", read_rows(io.BytesIO(items.encode()), "csv"), chunk_size=2)
+    assert report["rows"] == 4
+    assert report["written"] == 1
+    assert [error["line"] for error in report["errors"]] == [3, 4, 5]
+    assert db.execute("SELECT cost FROM item WHERE sku = 'IMP-TEST-1'").fetchone()[0] == 2.5
+
+    # Re-importing updates in place and blank fields keep their value
+    report = import_rows(db, "item", read_rows(io.BytesIO(b'{"sku": "IMP-TEST-1", "barcode": "IMP-BC-1", "name": "Renamed"}\n'), "jsonl"))
+    assert report["written"] == 1
+    row = db.execute("SELECT name, cost FROM item WHERE sku = 'IMP-TEST-1'").fetchone()
+    assert (row["name"], row["cost"]) == ("Renamed", 2.5)
+
+    price_list_id = db.execute("SELECT id FROM price_list ORDER BY id LIMIT 1").fetchone()[0]
+    prices = f"price_list_id,item_sku,price\n{price_list_id},IMP-TEST-1,9.5\n{price_list_id},IMP-TEST-1,10\n{price_list_id},NOPE,1\n"
+    report = import_rows(db, "price_list_item", read_rows(io.BytesIO(prices.encode()), "csv"))
+    assert report["written"] == 2 and report["error_count"] == 1
+    assert db.execute(
+        "SELECT COUNT(*), MAX(price) FROM price_list_item WHERE item_id = (SELECT id FROM item WHERE sku = 'IMP-TEST-1')"
+    ).fetchone()[:] == (1, 10)
+
+    exported = b"".join(export_rows(db, "item", "csv", batch_size=3)).decode()
+    lines = exported.splitlines()
+    assert lines[0].startswith("sku,barcode,name")
+    assert len(lines) == db.execute("SELECT COUNT(*) FROM item").fetchone()[0] + 1
+    assert any(line.startswith("IMP-TEST-1,IMP-BC-1,Renamed") for line in lines)
+
+
+def test_pdf_cache_keys_on_source_rows_and_evicts_least_recently_used(db, tmp_path):
+    import os
+    import time
+    from pdf_cache import PdfCache, document_key
+
+    item = db.execute("SELECT * FROM item ORDER BY id LIMIT 1").fetchone()
+    key = document_key("item_sheet", item, [dict(item)], "2026-01-01")
+    assert key == document_key("item_sheet", dict(item), [item], "2026-01-01")
+    assert key != document_key("item_sheet", dict(item, name="Renamed"), [item], "2026-01-01")
+
+    cache = PdfCache(str(tmp_path), max_bytes=250)
+    for age, name in ((30, "a"), (20, "b"), (10, "c")):
+        cache.put(name, b"x" * 100)
+        os.utime(tmp_path / f"{name}.pdf", (time.time() - age, time.time() - age))
+    assert cache.get("a") is None  # oldest entry was evicted past 250 bytes
+    assert cache.get("c") == b"x" * 100
+    assert cache.stats()["bytes"] <= 250
+    # Re-putting a key replaces its size instead of adding to it
+    cache.put("c", b"x" * 50)
+    assert cache._size == cache.stats()["bytes"]
+
+    # A failed write leaves no temp file behind
+    class Unreadable:
+        def read(self, size=-1):
+            raise OSError("disk gone")
+    with pytest.raises(OSError):
+        cache.put_file("d", Unreadable())
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+    # Another process writing the same directory is seen on its next rescan
+    other = PdfCache(str(tmp_path), max_bytes=250, rescan_every=1)
+    other.put("e", b"x" * 100)
+    cache.put("f", b"x" * 100)  # this process still thinks the directory holds 250 bytes
+    other.put("g", b"x" * 10)
+    assert other.stats()["bytes"] <= 250
+
+
+def test_render_service_sync_async_and_queue_limit():
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from render_service import RenderQueueFull, RenderService
+
+    documents = {"zeros": ("builtins", "bytes"), "slow": ("time", "sleep")}
+
+    async def scenario():
+        service = RenderService(
+            max_workers=1, max_queue=1, documents=documents,
+            batch_documents={"merged": ("builtins", "dict")}, executor=ThreadPoolExecutor(1),
+        )
+        result = await service.render("zeros", 3)
+        assert (result["status"], result["body"]) == (200, b"\0\0\0")
+        # Builders returning a result dict (a file to stream) pass it through unchanged
+        result = await service.render("merged", [("status", 200), ("path", "batch.pdf")])
+        assert result == {"status": 200, "path": "batch.pdf"}
+
+        job_id = service.submit("zeros", 2)
+        assert service.job(job_id)["status"] in ("queued", "running")
+        while service.job(job_id)["status"] not in ("done", "failed"):
+            await asyncio.sleep(0.01)
+        assert service.job(job_id)["result"]["body"] == b"\0\0"
+
+        # One rendering, one waiting, the third is rejected (sleep returns no document, so both fail)
+        outcomes = await asyncio.gather(*(service.render("slow", 0.05) for _ in range(3)), return_exceptions=True)
+        assert sum(isinstance(outcome, RenderQueueFull) for outcome in outcomes) == 1
+        metrics = service.metrics()
+        assert (metrics["completed"], metrics["failed"], metrics["rejected"]) == (3, 2, 1)
+        assert (metrics["in_flight"], metrics["queued"]) == (0, 0)
+        service.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_document_loader_uses_fixed_query_count(db):
+    from document_data import load_document
+
+    kit = db.execute("SELECT id, bom_id FROM item WHERE bom_id IS NOT NULL ORDER BY id LIMIT 1").fetchone()
+    partner_id = db.execute("SELECT id FROM partner ORDER BY id LIMIT 1").fetchone()[0]
+    zone_id = db.execute("SELECT id FROM zone ORDER BY id LIMIT 1").fetchone()[0]
+    mo_id = db.execute(
+        "INSERT INTO manufacturing_order (code, partner_id, item_id, quantity, manufacturing_zone_id) VALUES ('MO-DOC-TEST', ?, ?, 3, ?)",
+        (partner_id, kit["id"], zone_id),
+    ).lastrowid
+
+    load_document(db, "manufacturing_receipt", mo_id)  # warm the reference snapshot
+    statements = []
+    db.set_trace_callback(statements.append)
+    try:
+        data = load_document(db, "manufacturing_receipt", mo_id)
+    finally:
+        db.set_trace_callback(None)
+
+    bom_line_count = db.execute("SELECT COUNT(*) FROM bom_line WHERE bom_id = ?", (kit["bom_id"],)).fetchone()[0]
+    assert len(data["bom_lines"]) == bom_line_count > 0
+    assert "vendor_name" in data["bom_lines"][0].keys() and "lot_number" in data["bom_lines"][0].keys()
+    assert data["company"]["name"] and data["partner"]["id"] == partner_id
+    # header, partner, reference version, bom, bom lines, lots: independent of the line count
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 6
+    assert load_document(db, "manufacturing_order", -1) is None
+
+
+def test_batch_loader_resolves_waves_and_uses_one_query_per_table(db):
+    from document_data import load_orders, resolve_sale_order_ids
+
+    db.execute("SAVEPOINT batch_loader")
+    try:
+        partner_id = db.execute("SELECT id FROM partner ORDER BY id LIMIT 1").fetchone()[0]
+        source_id, target_id = [row[0] for row in db.execute("SELECT id FROM zone ORDER BY id LIMIT 2")]
+        item_id = db.execute("SELECT id FROM item ORDER BY id LIMIT 1").fetchone()[0]
+        order_ids = []
+        for index in range(3):
+            quotation_id = db.execute(
+                "INSERT INTO quotation (code, partner_id) VALUES (?, ?)", (f"Q-BATCH-{index}", partner_id)
+            ).lastrowid
+            order_ids.append(db.execute(
+                "INSERT INTO sale_order (code, partner_id, quotation_id) VALUES (?, ?, ?)",
+                (f"SO-BATCH-{index}", partner_id, quotation_id),
+            ).lastrowid)
+        db.executemany(
+            "INSERT INTO order_line (quantity, item_id, order_id, price) VALUES (?, ?, ?, 1.0)",
+            [(1, item_id, order_ids[0]), (2, item_id, order_ids[0]), (3, item_id, order_ids[2])],
+        )
+
+        wave = [
+            db.execute(
+                "INSERT INTO picking (type, source_id, target_id, trigger_id) VALUES ('outbound', ?, ?, 0)",
+                (source_id, target_id),
+            ).lastrowid
+            for _ in range(2)
+        ]
+        other_picking = db.execute(
+            "INSERT INTO picking (type, source_id, target_id, trigger_id) VALUES ('outbound', ?, ?, 0)",
+            (source_id, target_id),
+        ).lastrowid
+        # Moves in wave order: order 1, order 0, order 1 again; order 2 only in another picking
+        for order_id, picking_id in ((order_ids[1], wave[0]), (order_ids[0], wave[1]),
+                                     (order_ids[1], wave[1]), (order_ids[2], other_picking)):
+            trigger_id = db.execute("""
+                INSERT INTO trigger (origin_model, origin_id, trigger_type, trigger_item_id, trigger_zone_id,
+                                     trigger_item_quantity, type, status)
+                VALUES ('sale_order', ?, 'demand', ?, ?, 1, 'outbound', 'handled')
+            """, (order_id, item_id, target_id)).lastrowid
+            move_id = db.execute(
+                "INSERT INTO move (item_id, source_id, target_id, trigger_id, quantity) VALUES (?, ?, ?, ?, 1)",
+                (item_id, source_id, target_id, trigger_id),
+            ).lastrowid
+            db.execute("UPDATE move SET picking_id = ? WHERE id = ?", (picking_id, move_id))
+
+        assert resolve_sale_order_ids(db, picking_ids=wave) == [order_ids[1], order_ids[0]]
+        # Orders given directly come first and are not repeated
+        assert resolve_sale_order_ids(db, [order_ids[2], order_ids[0], order_ids[2]], wave) == [
+            order_ids[2], order_ids[0], order_ids[1]
+        ]
+
+        requested = [order_ids[2], -1, order_ids[0], order_ids[1]]
+        load_orders(db, requested)  # warm the reference snapshot
+        statements = []
+        db.set_trace_callback(statements.append)
+        try:
+            batch = load_orders(db, requested, with_lines=True)
+        finally:
+            db.set_trace_callback(None)
+        assert [entry["order"]["id"] for entry in batch] == [order_ids[2], order_ids[0], order_ids[1]]
+        assert [len(entry["lines"]) for entry in batch] == [1, 2, 0]
+        assert all(entry["partner"]["id"] == partner_id and entry["company"] for entry in batch)
+        # reference version, orders, partners, lines: independent of the batch size
+        assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 4
+    finally:
+        db.execute("ROLLBACK TO batch_loader")
+        db.execute("RELEASE batch_loader")
+
+
+def test_picking_lines_are_read_in_keyset_batches(db):
+    from document_data import iter_picking_lines, load_pickings
+
+    db.execute("SAVEPOINT picking_print")
+    try:
+        zones = [row[0] for row in db.execute("SELECT id FROM zone ORDER BY id LIMIT 3")]
+        item_id, location_id = db.execute("SELECT item_id, location_id FROM stock ORDER BY id LIMIT 1").fetchone()
+        picking_ids = []
+        for source_id, target_id, lines in ((zones[0], zones[1], 3), (zones[1], zones[2], 2)):
+            picking_id = db.execute(
+                "INSERT INTO picking (type, source_id, target_id, trigger_id) VALUES ('internal', ?, ?, 0)",
+                (source_id, target_id),
+            ).lastrowid
+            move_id = db.execute(
+                "INSERT INTO move (item_id, source_id, target_id, picking_id, quantity) VALUES (?, ?, ?, ?, ?)",
+                (item_id, source_id, target_id, picking_id, lines),
+            ).lastrowid
+            db.executemany(
+                "INSERT INTO move_line (move_id, item_id, source_id, target_id, quantity) VALUES (?, ?, ?, ?, 1)",
+                [(move_id, item_id, location_id, location_id)] * lines,
+            )
+            picking_ids.append(picking_id)
+
+        statements = []
+        db.set_trace_callback(statements.append)
+        rows = list(iter_picking_lines(db, picking_ids, batch_size=2))
+        db.set_trace_callback(None)
+        assert [row["picking_id"] for row in rows] == [picking_ids[0]] * 3 + [picking_ids[1]] * 2
+        assert len({row["id"] for row in rows}) == 5
+        assert len(statements) == 3  # 2 + 2 + 1 rows
+        assert rows[0]["item_sku"] and rows[0]["source_code"]
+        assert [row["id"] for row in load_pickings(db, reversed(picking_ids))] == picking_ids
+    finally:
+        db.set_trace_callback(None)
+        db.execute("ROLLBACK TO picking_print")
+        db.execute("RELEASE picking_print")
+
+
+def test_file_store_deduplicates_and_serves_ranges(tmp_path):
+    import io
+    from file_store import FileStore, content_headers, serve_file
+
+    store = FileStore(str(tmp_path))
+    digest, size = store.put_chunks([b"%PDF-", b"label", b""])
+    assert store.put_file(io.BytesIO(b"%PDF-label"), chunk_size=3) == (digest, size)
+    assert size == 10 and store.exists(digest)
+    assert sum(len(files) for _, _, files in os.walk(tmp_path)) == 1
+
+    path = store.path(digest)
+    status, headers, body = serve_file(path, size, digest)
+    assert status == 200 and b"".join(body) == b"%PDF-label"
+    status, headers, body = serve_file(path, size, digest, range_header="bytes=5-")
+    assert (status, headers["Content-Range"], b"".join(body)) == (206, "bytes 5-9/10", b"label")
+    status, headers, body = serve_file(path, size, digest, range_header="bytes=-3")
+    assert b"".join(body) == b"bel"
+    assert serve_file(path, size, digest, range_header="bytes=10-")[0] == 416
+    assert serve_file(path, size, digest, if_none_match=headers["ETag"])[0] == 304
+    # A stale If-Range sends the whole file
+    assert serve_file(path, size, digest, range_header="bytes=0-1", if_range='"other"')[0] == 200
+
+    # Only PDFs and images are shown inline; an uploaded HTML page is downloaded, never rendered
+    assert content_headers("application/pdf", "bom.pdf") == ("application/pdf", 'inline; filename="bom.pdf"')
+    assert content_headers("text/html; charset=utf-8", 'x".html') == (
+        "application/octet-stream", 'attachment; filename="x.html"'
+    )
+
+
+def test_inline_attachments_move_to_the_file_store(db, tmp_path):
+    from file_store import FileStore, move_blobs_to_store
+
+    store = FileStore(str(tmp_path))
+    db.execute("SAVEPOINT attachments")
+    try:
+        bom_id = db.execute("SELECT id FROM bom LIMIT 1").fetchone()["id"]
+        db.execute("UPDATE bom SET file = ?, file_type = 'image/jpeg' WHERE id = ?", (b"\xff\xd8jpeg" * 1000, bom_id))
+        assert move_blobs_to_store(db, store) == 1
+        bom = db.execute("SELECT file, file_sha256, file_size FROM bom WHERE id = ?", (bom_id,)).fetchone()
+        assert bom["file"] is None and bom["file_size"] == 6000
+        with open(store.path(bom["file_sha256"]), "rb") as f:
+            assert f.read() == b"\xff\xd8jpeg" * 1000
+        assert move_blobs_to_store(db, store) == 0
+    finally:
+        db.execute("ROLLBACK TO attachments")
+        db.execute("RELEASE attachments")
+
+
+def test_zpl_labels_substitute_escaped_fields(db):
+    from labels import load_label, zpl_label
+
+    partner_id = db.execute("SELECT id FROM partner LIMIT 1").fetchone()["id"]
+    db.execute("SAVEPOINT zpl_labels")
+    try:
+        db.execute(
+            "INSERT INTO return_order (code, origin_model, origin_id, partner_id, status) VALUES ('RET-ZPL', 'sale_order', 1, ?, 'draft')",
+            (partner_id,),
+        )
+        return_id = db.execute("SELECT id FROM return_order WHERE code = 'RET-ZPL'").fetchone()["id"]
+        code, sender, receiver = load_label(db, "return_order", return_id)
+        assert code == "RET-ZPL" and sender["id"] == partner_id and receiver["name"]
+        assert load_label(db, "return_order", -1) is None
+    finally:
+        db.execute("ROLLBACK TO zpl_labels")
+        db.execute("RELEASE zpl_labels")
+
+    zpl = zpl_label("sale_order", "SO_1^", {"name": "A~B", "street": "", "zip": "1010", "city": "Wien"}, None)
+    assert zpl.startswith("^XA") and zpl.rstrip().endswith("^XZ")
+    assert "^FDQA,SO_5F1_5E^FS" in zpl and "^FDA_7EB^FS" in zpl and "^FD1010 Wien^FS" in zpl
+    assert "^FD(Unknown receiver)^FS" in zpl and "Shipping Label" in zpl
+
+
+def test_picking_status_changes_queue_prerendering_with_back_pressure(db):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from prerender import Prerenderer, prerender_backlog
+    from render_service import RenderService
+
+    db.execute("SAVEPOINT prerender")
+    try:
+        source_id, target_id = [row[0] for row in db.execute("SELECT id FROM zone ORDER BY id LIMIT 2")]
+        item_id, location_id = db.execute("SELECT item_id, location_id FROM stock ORDER BY id LIMIT 1").fetchone()
+        picking_id = db.execute(
+            "INSERT INTO picking (type, source_id, target_id, trigger_id) VALUES ('internal', ?, ?, 0)",
+            (source_id, target_id),
+        ).lastrowid
+        move_id = db.execute(
+            "INSERT INTO move (item_id, source_id, target_id, picking_id, quantity) VALUES (?, ?, ?, ?, 1)",
+            (item_id, source_id, target_id, picking_id),
+        ).lastrowid
+        line_id = db.execute(
+            "INSERT INTO move_line (move_id, item_id, source_id, target_id, quantity) VALUES (?, ?, ?, ?, 1)",
+            (move_id, item_id, location_id, location_id),
+        ).lastrowid
+        db.execute("DELETE FROM document_prerender")
+        db.execute("UPDATE picking SET status = 'assigned' WHERE id = ?", (picking_id,))
+        db.execute("UPDATE move_line SET status = 'assigned' WHERE id = ?", (line_id,))
+        queued = db.execute("SELECT kind, doc_id FROM document_prerender").fetchall()
+        assert [tuple(row) for row in queued] == [("picking_list", picking_id)]
+    finally:
+        db.execute("ROLLBACK TO prerender")
+        db.execute("RELEASE prerender")
+
+    db.execute("DELETE FROM document_prerender")
+    db.execute("INSERT INTO document_prerender (kind, doc_id) VALUES ('picking_list', 1)")
+    db.commit()
+    service = RenderService(max_workers=1, documents={"picking_list": ("builtins", "bytes")},
+                            executor=ThreadPoolExecutor(1))
+    prerenderer = Prerenderer(service, max_in_flight=1)
+
+    # A busy render service leaves the document queued
+    service.in_flight = 1
+    assert asyncio.run(prerenderer.run_once(db)) == 0
+    assert prerender_backlog(db) == 1 and prerenderer.deferred == 1
+    service.in_flight = 0
+    assert asyncio.run(prerenderer.run_once(db)) == 1
+    assert prerender_backlog(db) == 0 and prerenderer.rendered == 1
+    # The claim was committed before rendering, so no write transaction is left open
+    assert not db.in_transaction
+    service.shutdown()
+
+
+def test_ttl_cache_expires_entries_and_stays_bounded():
+    import time
+    from cache import TTLCache
+
+    cache = TTLCache(maxsize=2)
+    cache.set("expired", {"id": 1}, time.time() - 1)
+    assert cache.get("expired") is None
+    cache.set("a", {"id": 2}, time.time() + 60)
+    cache.set("b", {"id": 3}, time.time() + 60)
+    assert cache.get("a") == {"id": 2}
+    cache.set("c", {"id": 4}, time.time() + 60)  # evicts "b", the least recently used
+    assert cache.get("b") is None and cache.get("c") == {"id": 4}
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 2}
+
+
+def test_refresh_tokens_rotate_and_revoke_on_reuse(db):
+    from refresh_tokens import create_refresh_token, revoke_refresh_token, rotate_refresh_token
+
+    db.execute("SAVEPOINT refresh_tokens")
+    try:
+        user_id = db.execute("INSERT INTO user (username, password_hash) VALUES ('scanner-7', 'x')").lastrowid
+        first = create_refresh_token(db, user_id)
+        user, second = rotate_refresh_token(db, first)
+        assert user["username"] == "scanner-7" and second != first
+        # Reusing the rotated token revokes the whole family
+        assert rotate_refresh_token(db, first) is None
+        assert rotate_refresh_token(db, second) is None
+        assert rotate_refresh_token(db, "unknown") is None
+
+        # Logout only revokes the caller's own token
+        third = create_refresh_token(db, user_id)
+        other_id = db.execute("INSERT INTO user (username, password_hash) VALUES ('scanner-8', 'x')").lastrowid
+        revoke_refresh_token(db, third, other_id)
+        user, fourth = rotate_refresh_token(db, third)
+        revoke_refresh_token(db, fourth, user_id)
+        assert rotate_refresh_token(db, fourth) is None
+    finally:
+        db.execute("ROLLBACK TO refresh_tokens")
+        db.execute("RELEASE refresh_tokens")
+
+
+def test_password_hasher_bounds_the_queue():
+    import asyncio
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from passwords import LoginBusy, PasswordHasher
+
+    def slow_verify(password, password_hash, rounds):
+        time.sleep(0.05)
+        return password == password_hash, "rehashed" if rounds == 13 else None
+
+    async def scenario():
+        hasher = PasswordHasher(max_workers=1, max_queue=1, rounds=13, executor=ThreadPoolExecutor(1),
+                                verify_func=slow_verify)
+        assert await hasher.verify("secret", "secret") == (True, "rehashed")
+        outcomes = await asyncio.gather(*(hasher.verify("a", "b") for _ in range(3)), return_exceptions=True)
+        assert sum(isinstance(outcome, LoginBusy) for outcome in outcomes) == 1
+        assert hasher.metrics()["rejected"] == 1
+        hasher.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_listing_pages_with_keyset_cursor_projection_and_ndjson():
+    import base64
+    import json
+    pytest.importorskip("fastapi")
+    pytest.importorskip("dotenv")
+    from listing import Listing, _ndjson_stream, decode_cursor, encode_cursor, fetch_page
+
+    def new_conn():
+        conn = sqlite3.connect(":memory:")
+        conn.row_factory = sqlite3.Row
+        conn.execute("CREATE TABLE thing (id INTEGER PRIMARY KEY, grp TEXT, name TEXT)")
+        conn.executemany("INSERT INTO thing (grp, name) VALUES (?, ?)", [("ab"[i % 2], f"thing {i}") for i in range(7)])
+        return conn
+
+    conn = new_conn()
+    listing = Listing("thing", order_by=("grp", "id"), descending=True)
+    expected = [row["id"] for row in conn.execute("SELECT id FROM thing ORDER BY grp DESC, id DESC")]
+
+    # Pages follow each other without gaps or repeats
+    seen, cursor = [], None
+    while True:
+        page = fetch_page(conn, listing, cursor=cursor, limit=3)
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    page = fetch_page(conn, listing, fields="id, name", limit=2)
+    assert [list(item) for item in page["items"]] == [["id", "name"], ["id", "name"]]
+    with pytest.raises(ValueError):
+        fetch_page(conn, listing, fields="id,secret", limit=2)
+
+    # A crafted cursor never reaches the query
+    crafted = base64.urlsafe_b64encode(json.dumps([{}, 1]).encode()).decode()
+    for bad in (crafted, encode_cursor(["a"]), "not base64!"):
+        with pytest.raises(ValueError):
+            decode_cursor(bad, 2)
+    assert decode_cursor(encode_cursor(["a", 3]), 2) == ["a", 3]
+
+    # NDJSON: one object per line, then the cursor of the next page
+    sql, params, names = listing.query(conn, "id", limit=4)
+    lines = [json.loads(line) for line in _ndjson_stream(conn, conn.execute(sql, params), names, 4)]
+    assert [line["id"] for line in lines[:4]] == expected[:4]
+    rest = fetch_page(new_conn(), listing, cursor=lines[4]["next_cursor"], limit=10)
+    assert [item["id"] for item in rest["items"]] == expected[4:]
@@ -0,0 +1,247 @@
+"""Quotation and sale order totals engine.
+
+Line and document totals (net, discount, tax, total) are computed for any
+number of documents in one set-based query and stored on the line and
+document rows. Inputs are:
+
+- the line price, or the price matrix net price when the line has none;
+- the document discount: a percent per line plus a fixed amount spread over
+  the lines pro rata;
+- the document tax, or else the price matrix taxes for the customer's
+  country (falling back to the price list's country);
+- conversion of every line into the document currency.
+
+Triggers flag a document's totals stale when its lines or pricing references
+change. The write endpoints call ensure_totals, which recomputes and stores
+only what is stale, plus drafts priced against an older catalog. Reads never
+write: a document whose stored totals are stale is computed on the fly.
+"""
+import json
+
+# Tax applied when neither the document nor the price matrix provides one
+DEFAULT_TAX_PERCENT = 19.0
+
+DOC_AMOUNTS = ("amount_untaxed", "amount_discount", "amount_tax", "amount_total")
+LINE_AMOUNTS = ("amount_net", "amount_discount", "amount_tax", "amount_total")
+
+MODELS = {
+    "quotation": ("quotation", "quotation_line", "quotation_id"),
+    "sale_order": ("sale_order", "order_line", "order_id"),
+}
+
+TOTALS_QUERY = """
+    WITH doc AS (
+        SELECT d.id, d.tax_id, d.discount_id, d.price_list_id,
+               COALESCE(d.currency_id, pl.currency_id) AS currency_id,
+               COALESCE(p.country_id, pl.country_id) AS country_id
+        FROM {doc} d
+        LEFT JOIN partner p ON p.id = d.partner_id
+        LEFT JOIN price_list pl ON pl.id = d.price_list_id
+        WHERE d.id IN (SELECT value FROM json_each(?))
+    ),
+    line AS (
+        SELECT l.id, l.{fk} AS doc_id, IFNULL(l.quantity, 0) AS quantity,
+               COALESCE(l.price, pm.net_price, 0) AS price,
+               COALESCE(l.currency_id, lpl.currency_id, dd.currency_id) AS currency_id,
+               dd.currency_id AS doc_currency_id,
+               CASE WHEN dd.tax_id IS NOT NULL THEN dt.percent
+                    ELSE COALESCE(pm.tax_percent, {default_tax}) END AS tax_percent,
+               CASE WHEN dd.tax_id IS NOT NULL THEN IFNULL(dt.fixed_amount, 0)
+                    ELSE IFNULL(pm.tax_fixed_amount, 0) END AS tax_fixed_amount,
+               IFNULL(dc.percent, 0) AS discount_percent,
+               IFNULL(dc.amount, 0) AS discount_amount
+        FROM {line} l
+        JOIN doc dd ON dd.id = l.{fk}
+        LEFT JOIN price_list lpl ON lpl.id = COALESCE(l.price_list_id, dd.price_list_id)
+        LEFT JOIN price_matrix pm ON pm.rowid = COALESCE(
+            (SELECT pm2.rowid FROM price_matrix pm2
+             WHERE pm2.price_list_id = lpl.id AND pm2.item_id = l.item_id AND pm2.country_id = dd.country_id
+             ORDER BY pm2.unit_id LIMIT 1),
+            (SELECT pm2.rowid FROM price_matrix pm2
+             WHERE pm2.price_list_id = lpl.id AND pm2.item_id = l.item_id AND pm2.country_id IS lpl.country_id
+             ORDER BY pm2.unit_id LIMIT 1)
+        )
+        LEFT JOIN tax dt ON dt.id = dd.tax_id
+        LEFT JOIN discount dc ON dc.id = dd.discount_id
+    ),
+    net AS (
+        SELECT line.*,
+               line.quantity * line.price * IFNULL(dcur.rel_to_usd, 1.0) / IFNULL(lcur.rel_to_usd, 1.0) AS amount_net,
+               line.quantity * line.tax_fixed_amount * IFNULL(dcur.rel_to_usd, 1.0) / IFNULL(lcur.rel_to_usd, 1.0) AS fixed_tax
+        FROM line
+        LEFT JOIN currency lcur ON lcur.id = line.currency_id
+        LEFT JOIN currency dcur ON dcur.id = line.doc_currency_id
+    ),
+    discounted AS (
+        SELECT net.*,
+               amount_net * discount_percent / 100 AS percent_discount,
+               SUM(amount_net * (1 - discount_percent / 100)) OVER (PARTITION BY doc_id) AS doc_base
+        FROM net
+    ),
+    allocated AS (
+        SELECT discounted.*,
+               percent_discount + CASE WHEN doc_base > 0
+                   THEN MIN(discount_amount, doc_base) * (amount_net - percent_discount) / doc_base
+                   ELSE 0 END AS amount_discount_line
+        FROM discounted
+    )
+    SELECT id, doc_id,
+           ROUND(amount_net, 2) AS amount_net,
+           ROUND(amount_discount_line, 2) AS amount_discount,
+           ROUND((amount_net - amount_discount_line) * tax_percent / 100 + fixed_tax, 2) AS amount_tax,
+           tax_percent
+    FROM allocated
+    ORDER BY doc_id, id
+"""
+
+
+def compute_totals(conn, model, ids):
+    """Compute line and document totals for ``ids`` without storing them."""
+    doc_table, line_table, fk = MODELS[model]
+    ids = list(ids)
+    if not ids:
+        return {}
+
+    docs = {
+        row["id"]: {
+            "id": row["id"],
+            "currency_id": row["currency_id"],
+            "amount_net": 0.0,
+            "amount_discount": 0.0,
+            "amount_untaxed": 0.0,
+            "amount_tax": 0.0,
+            "amount_total": 0.0,
+            "lines": [],
+        }
+        for row in conn.execute(f"""
+            SELECT d.id, COALESCE(d.currency_id, pl.currency_id) AS currency_id
+            FROM {doc_table} d
+            LEFT JOIN price_list pl ON pl.id = d.price_list_id
+            WHERE d.id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(ids),))
+    }
+
+    query = TOTALS_QUERY.format(doc=doc_table, line=line_table, fk=fk, default_tax=DEFAULT_TAX_PERCENT)
+    for row in conn.execute(query, (json.dumps(ids),)):
+        amount_untaxed = round(row["amount_net"] - row["amount_discount"], 2)
+        line = {
+            "id": row["id"],
+            "amount_net": row["amount_net"],
+            "amount_discount": row["amount_discount"],
+            "amount_tax": row["amount_tax"],
+            "amount_total": round(amount_untaxed + row["amount_tax"], 2),
+            "tax_percent": row["tax_percent"],
+        }
+        doc = docs[row["doc_id"]]
+        doc["lines"].append(line)
+        doc["amount_net"] += line["amount_net"]
+        doc["amount_discount"] += line["amount_discount"]
+        doc["amount_untaxed"] += amount_untaxed
+        doc["amount_tax"] += line["amount_tax"]
+        doc["amount_total"] += line["amount_total"]
+
+    for doc in docs.values():
+        for key in ("amount_net", "amount_discount", "amount_untaxed", "amount_tax", "amount_total"):
+            doc[key] = round(doc[key], 2)
+    return docs
+
+
+def refresh_totals(conn, model, ids):
+    """Compute and store totals for ``ids``; the caller commits."""
+    doc_table, line_table, _ = MODELS[model]
+    docs = compute_totals(conn, model, ids)
+    version = conn.execute("SELECT version FROM catalog_version WHERE id = 1").fetchone()[0]
+    conn.executemany(f"""
+        UPDATE {line_table}
+        SET amount_net = ?, amount_discount = ?, amount_tax = ?, amount_total = ?
+        WHERE id = ?
+    """, [
+        (line["amount_net"], line["amount_discount"], line["amount_tax"], line["amount_total"], line["id"])
+        for doc in docs.values() for line in doc["lines"]
+    ])
+    conn.executemany(f"""
+        UPDATE {doc_table}
+        SET amount_untaxed = ?, amount_discount = ?, amount_tax = ?, amount_total = ?,
+            totals_currency_id = ?, totals_stale = 0, totals_catalog_version = ?
+        WHERE id = ?
+    """, [
+        (doc["amount_untaxed"], doc["amount_discount"], doc["amount_tax"], doc["amount_total"],
+         doc["currency_id"], version, doc["id"])
+        for doc in docs.values()
+    ])
+    return docs
+
+
+def stale_ids(conn, model, ids=None):
+    """Ids whose stored totals are stale: flagged by triggers, or drafts priced on an older catalog."""
+    doc_table, _, _ = MODELS[model]
+    sql = f"""
+        SELECT d.id
+        FROM {doc_table} d, catalog_version cv
+        WHERE cv.id = 1
+          AND (d.totals_stale = 1
+               OR (d.status = 'draft' AND d.totals_catalog_version IS NOT cv.version))
+    """
+    params = ()
+    if ids is not None:
+        sql += " AND d.id IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(list(ids)),)
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+def ensure_totals(conn, model, ids=None):
+    """Recompute and store stale totals among ``ids`` (all documents if None); return how many.
+
+    For write paths; the caller commits.
+    """
+    stale = stale_ids(conn, model, ids)
+    if stale:
+        refresh_totals(conn, model, stale)
+    return len(stale)
+
+
+def fresh_totals(conn, model, doc_id):
+    """Totals computed now if the stored ones of ``doc_id`` are stale, else None; nothing is stored."""
+    if not stale_ids(conn, model, [doc_id]):
+        return None
+    totals = compute_totals(conn, model, [doc_id]).get(doc_id)
+    if totals:
+        currency = conn.execute("SELECT code, symbol FROM currency WHERE id = ?", (totals["currency_id"],)).fetchone()
+        totals["currency_code"] = currency["code"] if currency else None
+        totals["currency_symbol"] = currency["symbol"] if currency else None
+    return totals
+
+
+def overlay_totals(doc, lines, totals):
+    """Replace the stored amounts of ``doc`` and its ``lines`` (dicts) with fresh_totals ones."""
+    doc.update({key: totals[key] for key in DOC_AMOUNTS}, currency_symbol=totals["currency_symbol"])
+    computed = {line["id"]: line for line in totals["lines"]}
+    for line in lines:
+        if line["id"] in computed:
+            line.update({key: computed[line["id"]][key] for key in LINE_AMOUNTS if key in line})
+
+
+def load_totals(conn, model, doc_id):
+    """Totals of one document with its lines; computed on the fly while the stored ones are stale."""
+    doc_table, line_table, fk = MODELS[model]
+    doc = conn.execute(f"""
+        SELECT d.id, d.code, d.amount_untaxed, d.amount_discount, d.amount_tax, d.amount_total,
+               d.totals_currency_id AS currency_id, c.code AS currency_code, c.symbol AS currency_symbol
+        FROM {doc_table} d
+        LEFT JOIN currency c ON c.id = d.totals_currency_id
+        WHERE d.id = ?
+    """, (doc_id,)).fetchone()
+    if not doc:
+        return None
+    lines = conn.execute(f"""
+        SELECT id, item_id, quantity, price, amount_net, amount_discount, amount_tax, amount_total
+        FROM {line_table}
+        WHERE {fk} = ?
+        ORDER BY id
+    """, (doc_id,)).fetchall()
+    doc, lines = dict(doc), [dict(line) for line in lines]
+    totals = fresh_totals(conn, model, doc_id)
+    if totals:
+        overlay_totals(doc, lines, totals)
+        doc.update(currency_id=totals["currency_id"], currency_code=totals["currency_code"])
+    return dict(doc, lines=lines)
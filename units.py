@@ -0,0 +1,164 @@
+"""Unit conversion matrix.
+
+unit_conversion only holds the rates someone entered (e.g. carton -> pack and
+pack -> piece). The matrix adds the reverse of every rate and the transitive
+closure within each unit category, so any two units of a category convert
+with one dictionary lookup. It is built once and kept in memory until a
+unit or unit_conversion trigger bumps reference_version 'unit'.
+
+Stock and line quantities are kept in the item's stock unit (item.unit_id,
+Piece when NULL); the bulk helpers below convert them to another unit.
+"""
+import json
+from collections import deque
+
+from cache import VersionedCache, reference_version
+
+STOCK_UNIT_SYMBOL = "pc."
+
+# model -> (line table, parent foreign key)
+LINE_MODELS = {
+    "quotation_line": ("quotation_line", "quotation_id"),
+    "order_line": ("order_line", "order_id"),
+    "purchase_order_line": ("purchase_order_line", "purchase_order_id"),
+    "bom_line": ("bom_line", "bom_id"),
+}
+
+_matrix_cache = VersionedCache(maxsize=1)
+
+
+class UnitConversionError(ValueError):
+    pass
+
+
+class ConversionMatrix:
+    def __init__(self, units, rates):
+        self.units = units  # {unit_id: unit row as dict}
+        self.rates = rates  # {(from_unit_id, to_unit_id): rate}
+        self.default_unit_id = next(
+            (unit["id"] for unit in units.values() if unit["symbol"] == STOCK_UNIT_SYMBOL), None
+        )
+
+    def rate(self, from_unit_id, to_unit_id):
+        if from_unit_id == to_unit_id:
+            return 1.0
+        return self.rates.get((from_unit_id, to_unit_id))
+
+    def convert(self, quantity, from_unit_id, to_unit_id):
+        rate = self.rate(from_unit_id, to_unit_id)
+        if rate is None:
+            raise UnitConversionError(f"No conversion from unit {from_unit_id} to unit {to_unit_id}")
+        return quantity * rate
+
+    def as_list(self):
+        return [
+            {
+                "from_unit_id": from_id,
+                "from_symbol": self.units[from_id]["symbol"],
+                "to_unit_id": to_id,
+                "to_symbol": self.units[to_id]["symbol"],
+                "category": self.units[from_id]["category"],
+                "rate": rate,
+            }
+            for (from_id, to_id), rate in sorted(self.rates.items())
+        ]
+
+
+def build_conversion_matrix(conn):
+    """Transitive closure of unit_conversion, within each category."""
+    units = {row["id"]: dict(row) for row in conn.execute("SELECT id, name, symbol, category FROM unit")}
+
+    # Entered rates win over reverses derived from the opposite direction
+    edges = {unit_id: {} for unit_id in units}
+    derived = []
+    for row in conn.execute("SELECT from_unit_id, to_unit_id, conversion_rate FROM unit_conversion ORDER BY id"):
+        from_id, to_id, rate = row
+        if from_id not in units or to_id not in units or not rate or rate <= 0:
+            continue
+        if units[from_id]["category"] != units[to_id]["category"]:
+            continue
+        edges[from_id][to_id] = rate
+        derived.append((to_id, from_id, 1.0 / rate))
+    for from_id, to_id, rate in derived:
+        edges[from_id].setdefault(to_id, rate)
+
+    # Breadth-first from every unit: the path with the fewest hops loses the least precision
+    rates = {}
+    for source in units:
+        seen = {source: 1.0}
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            for target, rate in edges[current].items():
+                if target not in seen:
+                    seen[target] = seen[current] * rate
+                    queue.append(target)
+        for target, rate in seen.items():
+            if target != source:
+                rates[(source, target)] = rate
+    return ConversionMatrix(units, rates)
+
+
+def get_conversion_matrix(conn):
+    version = reference_version(conn, "unit")
+    matrix = _matrix_cache.get("matrix", version)
+    if matrix is None:
+        matrix = build_conversion_matrix(conn)
+        _matrix_cache.set("matrix", version, matrix)
+    return matrix
+
+
+def convert_quantities(conn, rows):
+    """Convert ``(quantity, from_unit_id, to_unit_id)`` rows; raises UnitConversionError."""
+    matrix = get_conversion_matrix(conn)
+    return [matrix.convert(quantity, from_id, to_id) for quantity, from_id, to_id in rows]
+
+
+def _to_unit(matrix, quantity, stock_unit_id, to_unit_id):
+    """Convert from a stock unit, returning None when the categories differ."""
+    if to_unit_id is None:
+        return quantity
+    rate = matrix.rate(stock_unit_id, to_unit_id)
+    return None if rate is None or quantity is None else quantity * rate
+
+
+def line_quantities(conn, model, parent_id, to_unit_id=None):
+    """Lines of one document (or BOM) with their quantity converted to ``to_unit_id``.
+
+    Lines whose stock unit cannot be converted get ``converted_quantity`` None.
+    """
+    table, fk = LINE_MODELS[model]
+    matrix = get_conversion_matrix(conn)
+    rows = conn.execute(f"""
+        SELECT l.id, l.item_id, i.sku, l.quantity, i.unit_id AS stock_unit_id
+        FROM {table} l
+        JOIN item i ON i.id = l.item_id
+        WHERE l.{fk} = ?
+        ORDER BY l.id
+    """, (parent_id,)).fetchall()
+    return [_with_conversion(matrix, dict(row), ("quantity",), to_unit_id) for row in rows]
+
+
+def stock_quantities(conn, item_ids, to_unit_id=None):
+    """On-hand and reserved stock per item, converted to ``to_unit_id``."""
+    matrix = get_conversion_matrix(conn)
+    rows = conn.execute("""
+        SELECT i.id AS item_id, i.sku, i.unit_id AS stock_unit_id,
+               IFNULL(SUM(s.quantity), 0) AS quantity,
+               IFNULL(SUM(s.reserved_quantity), 0) AS reserved_quantity
+        FROM item i
+        LEFT JOIN stock s ON s.item_id = i.id
+        WHERE i.id IN (SELECT value FROM json_each(?))
+        GROUP BY i.id
+        ORDER BY i.id
+    """, (json.dumps(list(item_ids)),)).fetchall()
+    return [_with_conversion(matrix, dict(row), ("quantity", "reserved_quantity"), to_unit_id) for row in rows]
+
+
+def _with_conversion(matrix, row, keys, to_unit_id):
+    stock_unit_id = row["stock_unit_id"] or matrix.default_unit_id
+    row["stock_unit_id"] = stock_unit_id
+    row["unit_id"] = to_unit_id if to_unit_id is not None else stock_unit_id
+    for key in keys:
+        row["converted_" + key] = _to_unit(matrix, row[key], stock_unit_id, to_unit_id)
+    return row
@@ -1,19 +1,58 @@
-import qrcode
-from reportlab.lib.utils import ImageReader
+import hashlib
+from functools import lru_cache
 from io import BytesIO
+
+import qrcode
 from reportlab.lib.units import mm
-from reportlab.lib.pagesizes import A4
+from reportlab.lib.pagesizes import A4, A7
+from reportlab.pdfgen import canvas as pdf_canvas
 
-def draw_qr_code(canvas, code, page_width, page_height, qr_size=60, margin=20):
-    # Generate QR code image
-    qr = qrcode.QRCode(box_size=2, border=1)
+from labels import address_lines, label_texts
+
+QR_CACHE_SIZE = 1024
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_matrix(code):
+    """Module matrix of ``code`` (with a one-module quiet zone), rows top to bottom."""
+    qr = qrcode.QRCode(border=1)
     qr.add_data(code)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    qr_buffer = BytesIO()
-    img.save(qr_buffer, format="PNG")
-    qr_buffer.seek(0)
-    qr_img = ImageReader(qr_buffer)
+    return tuple(tuple(bool(cell) for cell in row) for row in qr.get_matrix())
+
+def draw_qr(canvas, code, x, y, size):
+    """Draw the QR code of ``code`` as vector rectangles into the square at (x, y).
+
+    The modules are drawn once per document into a form XObject; later pages
+    (and later labels in the same canvas) only reference it.
+    """
+    matrix = qr_matrix(code)
+    n = len(matrix)
+    name = "qr" + hashlib.sha1(code.encode("utf-8")).hexdigest()[:20]
+    if not canvas.hasForm(name):
+        canvas.beginForm(name, 0, 0, n, n)
+        path = canvas.beginPath()
+        for row_index, row in enumerate(matrix):
+            module_y = n - 1 - row_index
+            col = 0
+            while col < n:
+                if not row[col]:
+                    col += 1
+                    continue
+                start = col
+                while col < n and row[col]:
+                    col += 1
+                # one rectangle per horizontal run of dark modules
+                path.rect(start, module_y, col - start, 1)
+        canvas.setFillColorRGB(0, 0, 0)
+        canvas.drawPath(path, stroke=0, fill=1)
+        canvas.endForm()
+    canvas.saveState()
+    canvas.translate(x, y)
+    canvas.scale(size / n, size / n)
+    canvas.doForm(name)
+    canvas.restoreState()
+
+def draw_qr_code(canvas, code, page_width, page_height, qr_size=60, margin=20):
     # Position: right upper corner, with margin
     x = page_width - qr_size - margin
     y = page_height - qr_size - margin
@@ -21,7 +60,7 @@ def draw_qr_code(canvas, code, page_width, page_height, qr_size=60, margin=20):
     canvas.setLineWidth(1.5)
     canvas.rect(x - 4, y - 4, qr_size + 8, qr_size + 8, stroke=1, fill=0)
     # Draw QR code
-    canvas.drawImage(qr_img, x, y, width=qr_size, height=qr_size)
+    draw_qr(canvas, code, x, y, qr_size)
 
 def add_page_number(canvas, doc):
     canvas.setFont("Helvetica", 8)
@@ -32,3 +71,64 @@ def add_page_number_and_qr(canvas, doc, code):
     add_page_number(canvas, doc)
     page_width, page_height = A4
     draw_qr_code(canvas, code, page_width, page_height)
+
+def draw_shipping_label(c, width, height, code, sender, receiver, kind="sale_order"):
+    """Draw one label page (A7) of ``kind`` for ``code``; the caller calls showPage."""
+    texts = label_texts(kind)
+    # Draw dashed cut-out border
+    c.setDash(3, 3)
+    c.rect(5, 5, width - 10, height - 10, stroke=1, fill=0)
+    c.setDash()  # Reset to solid
+
+    y = height - 20  # Start from near top inside border
+
+    def draw_line(text, font="Helvetica", size=8, dy=10, bold=False, center=False):
+        nonlocal y
+        c.setFont(f"{font}-Bold" if bold else font, size)
+        if center:
+            c.drawCentredString(width / 2, y, text)
+        else:
+            c.drawString(10, y, text)
+        y -= dy
+
+    draw_line(texts["title"], size=11, bold=True, dy=14)
+    draw_line(f"{texts['code']}: {code}", size=9, dy=12)
+
+    # --- QR SECTION ---
+    qr_size = 100
+    qr_x = (width - qr_size) / 2
+    qr_y = y - qr_size
+
+    # Draw visual box for QR code
+    c.rect(qr_x - 6, qr_y - 6, qr_size + 12, qr_size + 12, stroke=1, fill=0)
+    draw_qr(c, code, qr_x, qr_y, qr_size)
+    c.setFont("Helvetica", 7)
+    c.drawCentredString(width / 2, qr_y - 15, texts["scan"])
+    y = qr_y - 25
+
+    # --- Address Section ---
+    draw_line(texts["sender"], bold=True)
+    for line in address_lines(sender, "(Unknown sender)"):
+        draw_line(line)
+
+    y -= 6
+
+    draw_line(texts["receiver"], bold=True)
+    for line in address_lines(receiver, "(Unknown receiver)"):
+        draw_line(line)
+
+    # Draw final sentence near bottom, centered, but inside the dashed border
+    final_y = 10  # Inside bottom border (5px border + ~5px padding)
+    c.setFont("Helvetica-Oblique", 6)
+    c.drawCentredString(width / 2, final_y, texts["footer"])
+
+
+def shipping_label_pdf(kind, code, sender, receiver):
+    """One A7 label of ``kind`` as PDF bytes."""
+    buffer = BytesIO()
+    c = pdf_canvas.Canvas(buffer, pagesize=A7)
+    width, height = A7
+    draw_shipping_label(c, width, height, code, sender, receiver, kind)
+    c.showPage()
+    c.save()
+    return buffer.getvalue()